@@ -0,0 +1,234 @@
+"""
+Benchmark della normalizzazione per fasi, su file sintetici (vedi genera_dati.py).
+
+Uso:
+    python benchmark/benchmark_normalizzazione.py [--righe 10000 100000 1000000] [--fogli 1] [--distinti 0.1]
+        [--mix iso=3,...] [--formato-file xlsx] [--ripetizioni 1] [--output risultati.json]
+        [--confronta baseline.json] [--soglia 0.1]
+
+Per ogni numero di righe genera (una volta, nella cartella --cartella) un file sintetico e ne
+misura le fasi:
+
+    lettura           leggi_fogli_file
+    conversione       converti_colonne (riconoscimento delle date)
+    formattazione     formatta_date sulle date convertite
+    ordinamento       ordinamento stabile per data e riordino delle righe
+    statistiche       MappaErrori: conteggi e righe con errori
+    normalizza_foglio normalizza_foglio completo (formattazione, statistiche e ordinamento insieme)
+    export_xlsx       scrivi_file_normalizzato in .xlsx
+
+con secondi, righe al secondo e picco di memoria del processo (RSS) alla fine della fase. Ogni
+ripetizione gira in un processo nuovo, così il picco di memoria è quello della sola
+configurazione e nessuna cache resta calda tra una ripetizione e l'altra; per ogni fase si
+tiene il tempo migliore. I risultati possono essere salvati in JSON e confrontati con una
+baseline: il codice di uscita è 1 se qualche fase è più lenta della baseline oltre la soglia.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from genera_dati import MIX_PREDEFINITO, genera_file, leggi_mix
+from normalizza_core import (
+    FORMATI_OUTPUT, MappaErrori, converti_colonne, formatta_date, leggi_fogli_file, normalizza_foglio,
+    picco_memoria_processo_mb, scrivi_file_normalizzato
+)
+
+FASI = ('lettura', 'conversione', 'formattazione', 'ordinamento', 'statistiche', 'normalizza_foglio', 'export_xlsx')
+COLONNE = ['Data']
+FORMATO = FORMATI_OUTPUT["gg-mm-aaaa"]
+
+# Fasi più brevi di così non vengono considerate nel confronto con la baseline: sono rumore
+SECONDI_MINIMI_CONFRONTO = 0.02
+
+
+def misura_fasi(percorso):
+    """
+    Esegue tutte le fasi sul file (in un processo dedicato).
+
+    Returns:
+        dizionario con 'righe', 'date_convertite' e 'fasi': fase -> {'secondi', 'picco_memoria_mb'}
+    """
+    fasi = {}
+
+    def misura(fase, funzione):
+        inizio = time.perf_counter()
+        risultato = funzione()
+        fasi[fase] = {'secondi': time.perf_counter() - inizio, 'picco_memoria_mb': picco_memoria_processo_mb()}
+        return risultato
+
+    letti = misura('lettura', lambda: leggi_fogli_file(percorso))
+    cache_valori = {}
+    conversioni = misura('conversione', lambda: {nome: converti_colonne(df, COLONNE, cache_valori) for nome, df in letti.items()})
+
+    def formatta():
+        for conversioni_foglio in conversioni.values():
+            for date, _, _ in conversioni_foglio.values():
+                formatta_date(date.to_numpy(), FORMATO)
+
+    def ordina():
+        for nome, df in letti.items():
+            date = conversioni[nome][COLONNE[0]][0]
+            ordine = date.reset_index(drop=True).sort_values(na_position='last', kind='stable').index.to_numpy()
+            df.iloc[ordine]
+
+    def calcola_statistiche():
+        for nome, df in letti.items():
+            errori = MappaErrori.da_maschere({colonna: ~convertite.to_numpy(dtype=bool)
+                                              for colonna, (_, convertite, _) in conversioni[nome].items()}, len(df))
+            errori.conteggi()
+            errori.righe_con_errori()
+
+    misura('formattazione', formatta)
+    misura('ordinamento', ordina)
+    misura('statistiche', calcola_statistiche)
+    elaborati = misura('normalizza_foglio', lambda: {
+        nome: normalizza_foglio(df, conversioni[nome], COLONNE[0], True, FORMATO, nome) for nome, df in letti.items()
+    })
+
+    with tempfile.TemporaryDirectory(prefix='normalizza_benchmark_') as cartella:
+        misura('export_xlsx', lambda: scrivi_file_normalizzato(
+            os.path.join(cartella, 'normalizzato.xlsx'),
+            {nome: (df_elaborato, df_date) for nome, (df_elaborato, _, df_date, _) in elaborati.items()}, COLONNE
+        ))
+
+    return {
+        'righe': sum(len(df) for df in letti.values()),
+        'date_convertite': int(sum(stats['convertiti'] for _, statistiche, _, _ in elaborati.values() for stats in statistiche.values())),
+        'fasi': fasi,
+    }
+
+
+def esegui_configurazione(percorso, ripetizioni):
+    """Ripete le misure in processi nuovi e tiene, per ogni fase, il tempo migliore e il picco massimo"""
+    misure = []
+    contesto = multiprocessing.get_context('spawn')
+    for _ in range(ripetizioni):
+        with ProcessPoolExecutor(max_workers=1, mp_context=contesto) as pool:
+            misure.append(pool.submit(misura_fasi, percorso).result())
+
+    righe = misure[0]['righe']
+    fasi = {}
+    for fase in FASI:
+        secondi = min(misura['fasi'][fase]['secondi'] for misura in misure)
+        picchi = [misura['fasi'][fase]['picco_memoria_mb'] for misura in misure]
+        fasi[fase] = {
+            'secondi': secondi,
+            'righe_al_secondo': righe / secondi if secondi > 0 else None,
+            'picco_memoria_mb': None if None in picchi else max(picchi),
+        }
+    picchi = [fasi[fase]['picco_memoria_mb'] for fase in FASI]
+    return {
+        'righe': righe,
+        'date_convertite': misure[0]['date_convertite'],
+        'secondi_totali': sum(fasi[fase]['secondi'] for fase in FASI if fase != 'normalizza_foglio'),
+        'picco_memoria_mb': None if None in picchi else max(picchi),
+        'fasi': fasi,
+    }
+
+
+def chiave_risultato(risultato):
+    return (risultato['righe'], risultato['fogli'], risultato['rapporto_distinti'], risultato['formato_file'], risultato['mix'])
+
+
+def confronta(risultati, baseline, soglia):
+    """
+    Stampa il rapporto tra i tempi attuali e quelli della baseline per le configurazioni comuni.
+
+    Returns:
+        elenco delle regressioni (configurazione, fase, rapporto) oltre la soglia
+    """
+    riferimenti = {chiave_risultato(risultato): risultato for risultato in baseline['risultati']}
+    regressioni = []
+    print(f"\nConfronto con la baseline del {baseline.get('data', '?')} (soglia {soglia:.0%}):")
+    for risultato in risultati:
+        riferimento = riferimenti.get(chiave_risultato(risultato))
+        if riferimento is None:
+            print(f"  {risultato['righe']} righe: nessuna configurazione corrispondente nella baseline")
+            continue
+        for fase in FASI:
+            attuale, precedente = risultato['fasi'][fase]['secondi'], riferimento['fasi'][fase]['secondi']
+            rapporto = attuale / precedente if precedente > 0 else float('inf')
+            regressione = rapporto > 1 + soglia and max(attuale, precedente) >= SECONDI_MINIMI_CONFRONTO
+            if regressione:
+                regressioni.append((risultato['righe'], fase, rapporto))
+            print(f"  {risultato['righe']:>9} righe  {fase:<18} {precedente:8.3f} s -> {attuale:8.3f} s  "
+                  f"{rapporto:6.2f}x{'  ⚠️ più lento' if regressione else ''}")
+    return regressioni
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per fasi della normalizzazione su file sintetici.")
+    parser.add_argument('--righe', type=int, nargs='+', default=[10000, 100000],
+                        help="Numeri di righe da misurare, ognuno con il proprio file (default: %(default)s)")
+    parser.add_argument('--fogli', type=int, default=1, help="Fogli di ogni file .xlsx (default: %(default)s)")
+    parser.add_argument('--distinti', type=float, default=0.1,
+                        help="Rapporto tra valori distinti e righe (default: %(default)s)")
+    parser.add_argument('--mix', type=leggi_mix, default=MIX_PREDEFINITO, help="Pesi delle categorie di valori (vedi genera_dati.py)")
+    parser.add_argument('--formato-file', choices=('xlsx', 'csv', 'parquet', 'feather'), default='xlsx',
+                        help="Formato dei file sintetici letti (default: %(default)s)")
+    parser.add_argument('--ripetizioni', type=int, default=1, help="Ripetizioni per configurazione (default: %(default)s)")
+    parser.add_argument('--seme', type=int, default=0, help="Seme dei file sintetici (default: %(default)s)")
+    parser.add_argument('--cartella', default=os.path.join(tempfile.gettempdir(), 'normalizza_benchmark'),
+                        help="Cartella dei file sintetici, riutilizzati tra un'esecuzione e l'altra (default: %(default)s)")
+    parser.add_argument('--output', help="File JSON in cui salvare i risultati")
+    parser.add_argument('--confronta', metavar='BASELINE', help="File JSON di una esecuzione precedente da confrontare")
+    parser.add_argument('--soglia', type=float, default=0.1,
+                        help="Rallentamento oltre il quale una fase è una regressione (default: %(default)s)")
+    argomenti = parser.parse_args(argv)
+
+    os.makedirs(argomenti.cartella, exist_ok=True)
+    mix = ",".join(f"{categoria}={peso:g}" for categoria, peso in argomenti.mix.items())
+    risultati = []
+    for righe in argomenti.righe:
+        nome = (f"sintetico_{righe}_{argomenti.fogli}f_{argomenti.distinti:g}d_{argomenti.seme}s_"
+                f"{mix.replace('/', '').replace('=', '').replace(',', '_')}.{argomenti.formato_file}")
+        percorso = os.path.join(argomenti.cartella, nome)
+        if not os.path.exists(percorso):
+            print(f"Generazione di {percorso}...")
+            genera_file(percorso, righe, argomenti.fogli, argomenti.distinti, argomenti.mix, argomenti.seme)
+
+        risultato = {'fogli': argomenti.fogli, 'rapporto_distinti': argomenti.distinti,
+                     'formato_file': argomenti.formato_file, 'mix': mix, **esegui_configurazione(percorso, argomenti.ripetizioni)}
+        risultati.append(risultato)
+
+        print(f"\n{risultato['righe']} righe, {argomenti.fogli} fogli, {argomenti.distinti:g} distinti "
+              f"({risultato['date_convertite']} date convertite), picco {risultato['picco_memoria_mb'] or 0:.0f} MB:")
+        for fase in FASI:
+            misura = risultato['fasi'][fase]
+            print(f"  {fase:<18} {misura['secondi']:8.3f} s  {misura['righe_al_secondo'] or 0:>14,.0f} righe/s  "
+                  f"picco {misura['picco_memoria_mb'] or 0:8.0f} MB")
+
+    esecuzione = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                     'piattaforma': platform.platform(), 'cpu': os.cpu_count()},
+        'risultati': risultati,
+    }
+    if argomenti.output:
+        with open(argomenti.output, 'w', encoding='utf-8') as f:
+            json.dump(esecuzione, f, indent=2, ensure_ascii=False)
+        print(f"\nRisultati salvati in {argomenti.output}")
+
+    if argomenti.confronta:
+        with open(argomenti.confronta, encoding='utf-8') as f:
+            regressioni = confronta(risultati, json.load(f), argomenti.soglia)
+        if regressioni:
+            print(f"\n{len(regressioni)} fasi più lente della baseline oltre il {argomenti.soglia:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
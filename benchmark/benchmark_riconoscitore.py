@@ -0,0 +1,85 @@
+"""
+Confronto tra il riconoscitore a espressione regolare unica e il vecchio ciclo di strptime.
+
+Uso:
+    python benchmark/benchmark_riconoscitore.py [numero_valori]
+
+Per ogni formato di FORMATI_DATA (più i formati italiani) genera valori di esempio,
+verifica che i due metodi diano lo stesso risultato e misura il tempo per valore.
+"""
+import os
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from normalizza_core import FORMATI_DATA, MESI_IT, GIORNI_IT, riconosci_data
+
+
+def riconosci_con_strptime(testo):
+    """Vecchio metodo: prova i formati in ordine fino al primo che non solleva eccezioni"""
+    for formato in FORMATI_DATA:
+        try:
+            return datetime.strptime(testo, formato)
+        except ValueError:
+            continue
+    return None
+
+
+def genera_valori(numero_valori, seme=0):
+    """Genera valori nei formati supportati, in inglese e in italiano, più qualche valore non valido"""
+    casuale = random.Random(seme)
+    inizio = datetime(1990, 1, 1)
+    valori = []
+    for i in range(numero_valori):
+        data = inizio + timedelta(days=casuale.randrange(15000))
+        scelta = i % (len(FORMATI_DATA) + 3)
+        if scelta < len(FORMATI_DATA):
+            valori.append(data.strftime(FORMATI_DATA[scelta]))
+        elif scelta == len(FORMATI_DATA):
+            valori.append(f"{GIORNI_IT[data.weekday()]} {data.day} {MESI_IT[data.month - 1]} {data.year}")
+        elif scelta == len(FORMATI_DATA) + 1:
+            valori.append(f"{data.day} {MESI_IT[data.month - 1]} {data.year}")
+        else:
+            valori.append("valore non valido")
+    return valori
+
+
+def misura(funzione, valori):
+    """Restituisce i risultati e il tempo medio per valore in microsecondi"""
+    inizio = time.perf_counter()
+    risultati = [funzione(valore) for valore in valori]
+    durata = time.perf_counter() - inizio
+    return risultati, durata / len(valori) * 1e6
+
+
+def main():
+    numero_valori = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    valori = genera_valori(numero_valori)
+
+    risultati_strptime, us_strptime = misura(riconosci_con_strptime, valori)
+    risultati_regex, us_regex = misura(riconosci_data, valori)
+
+    # Sui formati di strptime i risultati devono coincidere
+    differenze = [
+        valore for valore, atteso, ottenuto in zip(valori, risultati_strptime, risultati_regex)
+        if atteso is not None and atteso != ottenuto
+    ]
+    aggiuntivi = sum(1 for atteso, ottenuto in zip(risultati_strptime, risultati_regex)
+                     if atteso is None and ottenuto is not None)
+
+    print(f"Valori analizzati:        {numero_valori}")
+    print(f"strptime (ciclo formati): {us_strptime:8.2f} µs/valore")
+    print(f"Riconoscitore regex:      {us_regex:8.2f} µs/valore")
+    print(f"Speedup:                  {us_strptime / us_regex:8.1f}x")
+    print(f"Differenze sui formati strptime: {len(differenze)}")
+    print(f"Valori riconosciuti solo dalla regex (nomi italiani): {aggiuntivi}")
+    if differenze:
+        print("Esempi di differenze:", differenze[:5])
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
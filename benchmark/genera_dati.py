@@ -0,0 +1,167 @@
+"""
+Generatore di file sintetici per i benchmark, con un mix controllabile dei formati di data supportati.
+
+Uso:
+    python benchmark/genera_dati.py FILE [--righe 100000] [--fogli 1] [--distinti 0.1]
+                                         [--mix iso=3,gg/mm=3,italiano=2,seriale=1,epoch=1,spazzatura=0.5] [--seme 0]
+
+Il formato del file dipende dall'estensione (.xlsx, .csv, .parquet, .feather). Ogni foglio ha una
+colonna "Data" con valori presi da un insieme di valori distinti (righe × distinti), ognuno in
+una delle categorie del mix, più alcune colonne di contorno (ID, Importo, Descrizione):
+
+    iso         2023-01-12
+    gg/mm       12/01/2023
+    italiano    giovedì 12 gennaio 2023, gio, 12 gen 2023
+    seriale     44938 (seriale Excel, numero)
+    epoch       1673481600 oppure 1673481600000 (UNIX secondi o millisecondi, numero)
+    spazzatura  testi che non sono date
+
+CSV, Parquet e Feather non hanno colonne con tipi misti: lì i numeri vengono scritti come testo
+e quindi, come in un file reale esportato così, non vengono interpretati come date.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from normalizza_core import GIORNI_IT, GIORNI_IT_ABBR, MESI_IT, MESI_IT_ABBR
+
+# Quota predefinita di ogni categoria di valori (pesi, non serve che la somma sia 1)
+MIX_PREDEFINITO = {'iso': 3, 'gg/mm': 3, 'italiano': 2, 'seriale': 1, 'epoch': 1, 'spazzatura': 0.5}
+
+# Intervallo delle date generate
+INIZIO_DATE = np.datetime64('1990-01-01')
+GIORNI_DATE = 40 * 365
+
+# Righe di dati massime di un foglio .xlsx (la prima riga è l'intestazione)
+MAX_RIGHE_FOGLIO_XLSX = 1048575
+
+SPAZZATURA = np.array(['n/d', '??', '-', 'da definire', 'ABC123', '31/02/2023', '2023-13-45', 'ieri', 'TBD', '00/00/0000'],
+                      dtype=object)
+
+
+def leggi_mix(testo):
+    """Mix di categorie da un testo come "iso=3,gg/mm=1": categoria -> peso"""
+    mix = {}
+    for parte in filter(None, (parte.strip() for parte in testo.split(','))):
+        categoria, _, peso = parte.partition('=')
+        if categoria not in MIX_PREDEFINITO:
+            raise ValueError(f"Categoria sconosciuta '{categoria}': usa una tra {', '.join(MIX_PREDEFINITO)}")
+        mix[categoria] = float(peso or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Il mix deve avere almeno una categoria con peso positivo")
+    return mix
+
+
+def genera_valori_distinti(numero, mix, casuale):
+    """Valori distinti della colonna di date, ognuno in una categoria scelta secondo i pesi del mix"""
+    categorie = list(mix)
+    pesi = np.array([mix[categoria] for categoria in categorie], dtype=float)
+    scelte = casuale.choice(len(categorie), size=numero, p=pesi / pesi.sum())
+    date = INIZIO_DATE + casuale.integers(0, GIORNI_DATE, numero).astype('timedelta64[D]')
+    indice = pd.DatetimeIndex(date)
+
+    valori = np.empty(numero, dtype=object)
+    for posizione, categoria in enumerate(categorie):
+        maschera = scelte == posizione
+        if not maschera.any():
+            continue
+        scelte_date = indice[maschera]
+        if categoria == 'iso':
+            valori[maschera] = scelte_date.strftime('%Y-%m-%d')
+        elif categoria == 'gg/mm':
+            valori[maschera] = scelte_date.strftime('%d/%m/%Y')
+        elif categoria == 'italiano':
+            # Metà con i nomi completi ("giovedì 12 gennaio 2023"), metà abbreviati ("gio, 12 gen 2023")
+            giorni, mesi = scelte_date.weekday.to_numpy(), scelte_date.month.to_numpy() - 1
+            numeri = scelte_date.day.astype(str).to_numpy(dtype=object)
+            anni = scelte_date.year.astype(str).to_numpy(dtype=object)
+            completi = np.array(GIORNI_IT, dtype=object)[giorni] + ' ' + numeri + ' ' + np.array(MESI_IT, dtype=object)[mesi] + ' ' + anni
+            abbreviati = np.array(GIORNI_IT_ABBR, dtype=object)[giorni] + ', ' + numeri + ' ' + np.array(MESI_IT_ABBR, dtype=object)[mesi] + ' ' + anni
+            valori[maschera] = np.where(casuale.random(len(giorni)) < 0.5, completi, abbreviati)
+        elif categoria == 'seriale':
+            valori[maschera] = ((scelte_date - pd.Timestamp('1899-12-30')).days).to_numpy().astype(object)
+        elif categoria == 'epoch':
+            secondi = (scelte_date - pd.Timestamp('1970-01-01')).total_seconds().to_numpy().astype(np.int64)
+            valori[maschera] = np.where(casuale.random(len(secondi)) < 0.5, secondi, secondi * 1000).astype(object)
+        else:
+            valori[maschera] = SPAZZATURA[casuale.integers(0, len(SPAZZATURA), maschera.sum())]
+    return valori
+
+
+def genera_foglio(righe, rapporto_distinti=0.1, mix=None, seme=0):
+    """
+    Foglio sintetico: la colonna "Data" ha circa righe × rapporto_distinti valori distinti (meno
+    se due valori generati coincidono, come i testi di spazzatura), in ordine casuale, più le
+    colonne ID, Importo e Descrizione.
+    """
+    casuale = np.random.default_rng(seme)
+    distinti = min(righe, max(1, round(righe * rapporto_distinti)))
+    valori = genera_valori_distinti(distinti, mix or MIX_PREDEFINITO, casuale)
+    # Ogni valore distinto compare almeno una volta, gli altri ripetuti a caso
+    posizioni = np.concatenate([np.arange(distinti), casuale.integers(0, distinti, righe - distinti)]) if righe else np.arange(0)
+    casuale.shuffle(posizioni)
+    return pd.DataFrame({
+        'ID': np.arange(1, righe + 1),
+        'Data': valori[posizioni],
+        'Importo': np.round(casuale.random(righe) * 1000, 2),
+        'Descrizione': np.array(['Ordine', 'Reso', 'Fattura', 'Nota di credito'], dtype=object)[casuale.integers(0, 4, righe)],
+    })
+
+
+def genera_file(percorso, righe, fogli=1, rapporto_distinti=0.1, mix=None, seme=0):
+    """
+    Scrive un file sintetico con righe divise tra i fogli; il formato dipende dall'estensione.
+    CSV, Parquet e Feather hanno un solo foglio.
+
+    Raises:
+        ValueError: per un formato sconosciuto, più fogli fuori da .xlsx o troppe righe per un foglio .xlsx
+    """
+    estensione = os.path.splitext(os.fspath(percorso))[1].lower()
+    if estensione not in ('.xlsx', '.csv', '.parquet', '.feather'):
+        raise ValueError(f"Formato non supportato: '{estensione}' (usa .xlsx, .csv, .parquet o .feather)")
+    if fogli > 1 and estensione != '.xlsx':
+        raise ValueError(f"I file {estensione} hanno un solo foglio")
+    righe_fogli = [righe // fogli + (i < righe % fogli) for i in range(fogli)]
+    if estensione == '.xlsx' and max(righe_fogli) > MAX_RIGHE_FOGLIO_XLSX:
+        raise ValueError(f"{max(righe_fogli)} righe non stanno in un foglio .xlsx: aumenta i fogli o usa .csv/.parquet")
+
+    generati = {f"Foglio{i + 1}": genera_foglio(righe_foglio, rapporto_distinti, mix, seme + i)
+                for i, righe_foglio in enumerate(righe_fogli)}
+    if estensione == '.xlsx':
+        with pd.ExcelWriter(percorso, engine='xlsxwriter') as writer:
+            for nome, df in generati.items():
+                df.to_excel(writer, sheet_name=nome, index=False)
+        return
+    df = next(iter(generati.values()))
+    df['Data'] = df['Data'].astype(str)
+    if estensione == '.csv':
+        df.to_csv(percorso, index=False)
+    elif estensione == '.parquet':
+        df.to_parquet(percorso, index=False)
+    else:
+        df.to_feather(percorso)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un file sintetico con date in formati misti.")
+    parser.add_argument('percorso', help="File da scrivere (.xlsx, .csv, .parquet o .feather)")
+    parser.add_argument('--righe', type=int, default=100000, help="Righe totali, divise tra i fogli (default: %(default)s)")
+    parser.add_argument('--fogli', type=int, default=1, help="Fogli del file .xlsx (default: %(default)s)")
+    parser.add_argument('--distinti', type=float, default=0.1,
+                        help="Rapporto tra valori distinti e righe della colonna Data (default: %(default)s)")
+    parser.add_argument('--mix', type=leggi_mix, default=MIX_PREDEFINITO,
+                        help="Pesi delle categorie, es. iso=3,gg/mm=1,spazzatura=0.2 (default: "
+                             + ",".join(f"{categoria}={peso:g}" for categoria, peso in MIX_PREDEFINITO.items()) + ")")
+    parser.add_argument('--seme', type=int, default=0, help="Seme del generatore casuale (default: %(default)s)")
+    argomenti = parser.parse_args(argv)
+    genera_file(argomenti.percorso, argomenti.righe, argomenti.fogli, argomenti.distinti, argomenti.mix, argomenti.seme)
+    print(f"Scritto {argomenti.percorso}: {argomenti.righe} righe in {argomenti.fogli} fogli")
+
+
+if __name__ == '__main__':
+    main()
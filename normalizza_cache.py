@@ -0,0 +1,240 @@
+"""
+Cache persistente su disco delle date riconosciute valore per valore, senza Streamlit.
+
+Gli stessi testi di data ("giovedì 12 giugno 2025", "12 gen 2023", ...) tornano in ogni
+nuovo file: la cache ricorda, tra sessioni e riavvii, il risultato di normalizza_data per le
+stringhe che non vengono convertite in blocco (le più lente, perché passano anche per il
+fallback di dateutil), compreso il fatto che un testo non è una data. I testi che dateutil
+completa con la data di oggi ("12/06", "giugno 2020") non vengono memorizzati, perché la loro
+data cambia nel tempo (vedi dipende_da_oggi).
+
+La cache è un database SQLite con un numero massimo di voci, oltre il quale vengono scartate
+quelle usate meno di recente. La chiave comprende la versione delle regole di riconoscimento
+(vedi versione_regole): se cambiano formati, nomi o dateutil le vecchie voci non vengono più
+usate e, non essendo più lette, sono le prime a essere scartate. Le stringhe vengono
+interpretate sempre allo stesso modo (gli intervalli numerici valgono solo per i numeri, che
+non entrano in cache), quindi le regole sono le uniche opzioni che fanno parte della chiave.
+
+    cache = CacheDatePersistente("date.sqlite3")
+    normalizza_colonna(serie, {}, cache_persistente=cache)
+    cache.statistiche()
+
+Un errore del database non interrompe mai la conversione: viene registrato nel log e i
+valori vengono convertiti come se non fossero in cache.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import dateutil
+import numpy as np
+
+from normalizza_core import (
+    FORMATI_DATA, FORMATI_DATA_IT, MESI_EN, GIORNI_EN, MESI_IT, MESI_IT_ABBR, GIORNI_IT, GIORNI_IT_ABBR,
+    VERSIONE_NORMALIZZAZIONE
+)
+
+logger = logging.getLogger(__name__)
+
+# Percorso e numero massimo di voci predefiniti della cache
+PERCORSO_PREDEFINITO = os.path.join(os.path.expanduser('~'), '.cache', 'normalizza_date', 'date.sqlite3')
+MAX_VOCI_PREDEFINITO = 500000
+
+# Superato il massimo, le voci meno recenti vengono scartate fino a questa quota del massimo,
+# così lo scarto avviene a lotti e non a ogni nuova voce
+QUOTA_DOPO_SCARTO = 0.9
+
+# Valori per query (SQLite limita il numero di parametri) e secondi entro cui l'uso di una
+# voce già aggiornata non viene riscritto
+VALORI_PER_QUERY = 500
+RISOLUZIONE_ULTIMO_USO = 60
+
+# Secondi di attesa quando un altro processo sta scrivendo nel database
+ATTESA_BLOCCO = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS date (
+    versione TEXT NOT NULL,
+    valore TEXT NOT NULL,
+    data INTEGER,
+    ultimo_uso REAL NOT NULL,
+    PRIMARY KEY (versione, valore)
+);
+CREATE INDEX IF NOT EXISTS date_ultimo_uso ON date (ultimo_uso);
+CREATE TABLE IF NOT EXISTS contatori (nome TEXT PRIMARY KEY, valore INTEGER NOT NULL);
+INSERT OR IGNORE INTO contatori VALUES ('richiesti', 0), ('trovati', 0);
+"""
+
+
+def versione_regole():
+    """Impronta delle regole con cui normalizza_data interpreta i testi: cambia se cambia una di esse"""
+    regole = (VERSIONE_NORMALIZZAZIONE, FORMATI_DATA, FORMATI_DATA_IT, MESI_EN, GIORNI_EN,
+              MESI_IT, MESI_IT_ABBR, GIORNI_IT, GIORNI_IT_ABBR, dateutil.__version__)
+    return hashlib.sha256(repr(regole).encode('utf-8')).hexdigest()[:16]
+
+
+class CacheDatePersistente:
+    """
+    Cache SQLite testo -> data (oppure "non è una data"), condivisa tra thread, processi e sessioni.
+
+    Ogni processo apre la propria connessione alla prima richiesta: l'oggetto può essere passato
+    ai processi paralleli, che ricevono solo percorso e opzioni. I contatori richiesti/trovati
+    sono quelli di questo oggetto; il database tiene anche i totali di tutti i processi.
+
+    Args:
+        percorso: file SQLite (la cartella viene creata se manca)
+        max_voci: voci oltre le quali vengono scartate quelle usate meno di recente
+    """
+
+    def __init__(self, percorso=PERCORSO_PREDEFINITO, max_voci=MAX_VOCI_PREDEFINITO):
+        self.percorso = os.fspath(percorso)
+        self.max_voci = max_voci
+        self.versione = versione_regole()
+        self.richiesti = 0
+        self.trovati = 0
+        self.connessione = None
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        stato = self.__dict__.copy()
+        stato.update(connessione=None, lock=None, richiesti=0, trovati=0)
+        return stato
+
+    def __setstate__(self, stato):
+        self.__dict__.update(stato)
+        self.lock = threading.Lock()
+
+    def connetti(self):
+        """Connessione del processo al database, aperta (e inizializzata) alla prima richiesta; da chiamare con il lock"""
+        if self.connessione is None:
+            cartella = os.path.dirname(self.percorso)
+            if cartella:
+                os.makedirs(cartella, exist_ok=True)
+            connessione = sqlite3.connect(self.percorso, timeout=ATTESA_BLOCCO, check_same_thread=False)
+            # Con il journal WAL le letture di un processo non attendono le scritture degli altri
+            connessione.execute("PRAGMA journal_mode=WAL")
+            connessione.execute("PRAGMA synchronous=NORMAL")
+            with connessione:
+                connessione.executescript(SCHEMA)
+            self.connessione = connessione
+        return self.connessione
+
+    def cerca(self, valori):
+        """
+        Date già note dei valori indicati (stringhe), che diventano le voci usate più di recente.
+
+        Returns:
+            dizionario valore -> datetime64[ns] (NaT se il valore non è una data) dei soli valori trovati
+        """
+        valori = list(dict.fromkeys(valori))
+        if not valori:
+            return {}
+
+        trovati = {}
+        adesso = time.time()
+        try:
+            with self.lock:
+                connessione = self.connetti()
+                with connessione:
+                    for inizio in range(0, len(valori), VALORI_PER_QUERY):
+                        parte = valori[inizio:inizio + VALORI_PER_QUERY]
+                        trovati.update(connessione.execute(
+                            f"SELECT valore, data FROM date WHERE versione = ? AND valore IN ({','.join('?' * len(parte))})",
+                            [self.versione] + parte
+                        ))
+                    connessione.executemany(
+                        "UPDATE date SET ultimo_uso = ? WHERE versione = ? AND valore = ? AND ultimo_uso < ?",
+                        ((adesso, self.versione, valore, adesso - RISOLUZIONE_ULTIMO_USO) for valore in trovati)
+                    )
+                    connessione.executemany("UPDATE contatori SET valore = valore + ? WHERE nome = ?",
+                                            ((len(valori), 'richiesti'), (len(trovati), 'trovati')))
+                self.richiesti += len(valori)
+                self.trovati += len(trovati)
+        except (sqlite3.Error, UnicodeError) as e:
+            logger.warning("Cache persistente delle date non disponibile (%s): %s", self.percorso, e)
+            return {}
+
+        nat = np.datetime64('NaT', 'ns')
+        return {valore: nat if data is None else np.datetime64(data, 'ns') for valore, data in trovati.items()}
+
+    def salva(self, valori, date):
+        """
+        Memorizza le date dei valori indicati (stringhe; NaT se il valore non è una data) e,
+        oltre max_voci, scarta le voci usate meno di recente.
+        """
+        if len(valori) == 0:
+            return
+        date = np.asarray(date, dtype='datetime64[ns]')
+        interi = [None if mancante else intero for intero, mancante in zip(date.view('i8').tolist(), np.isnat(date).tolist())]
+        adesso = time.time()
+        try:
+            with self.lock:
+                connessione = self.connetti()
+                with connessione:
+                    connessione.executemany("INSERT OR REPLACE INTO date VALUES (?, ?, ?, ?)",
+                                            ((self.versione, valore, intero, adesso) for valore, intero in zip(valori, interi)))
+                    voci = connessione.execute("SELECT COUNT(*) FROM date").fetchone()[0]
+                    if voci > self.max_voci:
+                        da_scartare = voci - int(self.max_voci * QUOTA_DOPO_SCARTO)
+                        connessione.execute("DELETE FROM date WHERE rowid IN (SELECT rowid FROM date ORDER BY ultimo_uso LIMIT ?)",
+                                            (da_scartare,))
+                        logger.info("Cache persistente delle date: scartate %d voci usate meno di recente", da_scartare)
+        except (sqlite3.Error, UnicodeError) as e:
+            logger.warning("Cache persistente delle date non aggiornata (%s): %s", self.percorso, e)
+
+    def statistiche(self):
+        """
+        Stato della cache: voci (di questa versione delle regole e totali), dimensione del file e
+        valori cercati/trovati da questo oggetto e, nel database, da tutti i processi.
+        Restituisce None se il database non è leggibile.
+        """
+        try:
+            with self.lock:
+                connessione = self.connetti()
+                voci_versione = connessione.execute("SELECT COUNT(*) FROM date WHERE versione = ?", (self.versione,)).fetchone()[0]
+                voci = connessione.execute("SELECT COUNT(*) FROM date").fetchone()[0]
+                contatori = dict(connessione.execute("SELECT nome, valore FROM contatori"))
+                pagine = connessione.execute("PRAGMA page_count").fetchone()[0] * connessione.execute("PRAGMA page_size").fetchone()[0]
+                richiesti, trovati = self.richiesti, self.trovati
+        except (sqlite3.Error, UnicodeError) as e:
+            logger.warning("Cache persistente delle date non leggibile (%s): %s", self.percorso, e)
+            return None
+
+        return {
+            'percorso': self.percorso,
+            'versione': self.versione,
+            'voci': voci,
+            'voci_versione': voci_versione,
+            'max_voci': self.max_voci,
+            'dimensione_mb': pagine / 1024 / 1024,
+            'richiesti': richiesti,
+            'trovati': trovati,
+            'percentuale': trovati / richiesti * 100 if richiesti else 0.0,
+            'richiesti_totali': contatori.get('richiesti', 0),
+            'trovati_totali': contatori.get('trovati', 0),
+            'percentuale_totale': contatori.get('trovati', 0) / contatori['richiesti'] * 100 if contatori.get('richiesti') else 0.0,
+        }
+
+    def svuota(self):
+        """Elimina tutte le voci e azzera i contatori; restituisce False se il database non è scrivibile"""
+        try:
+            with self.lock:
+                connessione = self.connetti()
+                with connessione:
+                    connessione.execute("DELETE FROM date")
+                    connessione.execute("UPDATE contatori SET valore = 0")
+                connessione.execute("VACUUM")
+                self.richiesti = self.trovati = 0
+        except (sqlite3.Error, UnicodeError) as e:
+            logger.warning("Cache persistente delle date non svuotata (%s): %s", self.percorso, e)
+            return False
+        return True
+
+    def chiudi(self):
+        with self.lock:
+            if self.connessione is not None:
+                self.connessione.close()
+                self.connessione = None
@@ -0,0 +1,193 @@
+"""
+Normalizzazione delle date da riga di comando, senza Streamlit.
+
+Uso:
+    python normalizza_cli.py FILE_O_CARTELLA [...] -c COLONNA [COLONNA ...] [opzioni]
+
+Esempi:
+    python normalizza_cli.py vendite.xlsx -c Data
+    python normalizza_cli.py archivio/ -r -c "Data ordine" "Data consegna" -o "Data ordine" -f aaaa-mm-gg -j 4 -d normalizzati/
+    python normalizza_cli.py ordini_*.xlsx -c Data --cache-date
+    python normalizza_cli.py esportazione.csv -c Data --formato-file parquet
+    python normalizza_cli.py archivio/ -c Data --prestazioni prestazioni.json
+    python normalizza_cli.py anagrafiche.xlsx -c "Data nascita" --categorie
+
+Oltre ai file Excel vengono letti CSV, Parquet e Feather. Per ogni file viene scritto
+FILE_normalizzato.xlsx (nella cartella del file o in quella indicata con -d), oppure nel
+formato scelto con --formato-file: in CSV, Parquet e Feather un file Excel diventa uno ZIP
+con un file per foglio. Codici di uscita: 0 se tutte le date sono state convertite, 1 se alcune
+date non sono state convertite, 2 se qualche file non è stato letto o elaborato.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from normalizza_cache import MAX_VOCI_PREDEFINITO, PERCORSO_PREDEFINITO, CacheDatePersistente
+from normalizza_core import (
+    FORMATI_FILE_OUTPUT, FORMATI_OUTPUT, INTERVALLI_NUMERICI, MOTORI_LETTURA, Prestazioni, estensione_file_normalizzato,
+    inizio_sorgente, normalizza_file, tipo_file
+)
+
+ESTENSIONI_LETTURA = ('.xlsx', '.xls', '.csv', '.parquet', '.feather')
+SUFFISSO_OUTPUT = '_normalizzato'
+
+
+def trova_file(percorsi, ricorsivo=False):
+    """
+    Espande file e cartelle nell'elenco dei file da elaborare (Excel, CSV, Parquet, Feather), senza duplicati.
+    Vengono saltati i file temporanei di Excel (~$...) e i file già normalizzati.
+    """
+    trovati = []
+    for percorso in map(Path, percorsi):
+        if percorso.is_dir():
+            candidati = sorted(percorso.rglob('*') if ricorsivo else percorso.iterdir())
+        else:
+            candidati = [percorso]
+        for candidato in candidati:
+            if (candidato.is_file() and candidato.suffix.lower() in ESTENSIONI_LETTURA
+                    and not candidato.name.startswith('~$') and not candidato.stem.endswith(SUFFISSO_OUTPUT)
+                    and candidato not in trovati):
+                trovati.append(candidato)
+    return trovati
+
+
+def elabora_file(percorso, cartella_output, opzioni):
+    """
+    Normalizza un file (eseguito anche nei processi paralleli).
+
+    Returns:
+        tupla (percorso, percorso_output, statistiche, errore, prestazioni) con statistiche None in
+        caso di errore e prestazioni il riepilogo delle fasi eseguite (vedi Prestazioni.riepilogo)
+    """
+    cartella = Path(cartella_output) if cartella_output else percorso.parent
+    percorso_output = cartella / f"{percorso.stem}{SUFFISSO_OUTPUT}.xlsx"
+    prestazioni = Prestazioni()
+    try:
+        estensione = estensione_file_normalizzato(opzioni.get('formato_file', 'xlsx'), tipo_file(inizio_sorgente(percorso)),
+                                                  opzioni.get('unisci_fogli', False))
+        percorso_output = percorso_output.with_suffix(estensione)
+        statistiche = normalizza_file(percorso, percorso_output=percorso_output, prestazioni=prestazioni, **opzioni)
+        return percorso, percorso_output, statistiche, None, prestazioni.riepilogo()
+    except Exception as e:
+        return percorso, percorso_output, None, str(e), prestazioni.riepilogo()
+
+
+def crea_parser():
+    parser = argparse.ArgumentParser(
+        description="Normalizza le colonne di date di uno o più file Excel, CSV, Parquet o Feather.",
+        epilog="Codici di uscita: 0 tutte le date convertite, 1 date non convertite, 2 errori sui file."
+    )
+    parser.add_argument('percorsi', nargs='+', help="File (Excel, CSV, Parquet, Feather) o cartelle che li contengono")
+    parser.add_argument('-c', '--colonne', nargs='+', required=True, help="Colonne di date da normalizzare")
+    parser.add_argument('-f', '--formato', choices=list(FORMATI_OUTPUT), default="gg-mm-aaaa",
+                        help="Formato delle date nel file normalizzato (default: %(default)s)")
+    parser.add_argument('--formato-file', choices=list(FORMATI_FILE_OUTPUT), default='xlsx',
+                        help="Formato dei file normalizzati (default: %(default)s)")
+    parser.add_argument('-o', '--ordina-per', help="Colonna per l'ordinamento cronologico (default: la prima colonna)")
+    parser.add_argument('--non-ordinare', action='store_true', help="Mantiene l'ordine originale delle righe")
+    parser.add_argument('-s', '--foglio', action='append', dest='fogli',
+                        help="Foglio da elaborare, ripetibile (default: tutti i fogli)")
+    parser.add_argument('-n', '--numeri', nargs='*', choices=list(INTERVALLI_NUMERICI), default=list(INTERVALLI_NUMERICI),
+                        help="Numeri da interpretare come date (default: tutti; senza valori: nessuno)")
+    parser.add_argument('-m', '--motore', choices=list(MOTORI_LETTURA),
+                        help="Motore di lettura (default: il più veloce installato per il tipo di file)")
+    parser.add_argument('-d', '--output-dir', help="Cartella dei file normalizzati (default: quella di ogni file)")
+    parser.add_argument('-r', '--ricorsivo', action='store_true', help="Cerca i file anche nelle sottocartelle")
+    parser.add_argument('-j', '--processi', type=int, default=min(4, os.cpu_count() or 1),
+                        help="File elaborati in parallelo (default: %(default)s)")
+    parser.add_argument('--cache-date', nargs='?', const=PERCORSO_PREDEFINITO, metavar='FILE',
+                        help="Ricorda su disco, tra un'esecuzione e l'altra, le date riconosciute valore per valore "
+                             f"(senza FILE: {PERCORSO_PREDEFINITO})")
+    parser.add_argument('--cache-max-voci', type=int, default=MAX_VOCI_PREDEFINITO,
+                        help="Voci della cache oltre le quali si scartano quelle usate meno di recente (default: %(default)s)")
+    parser.add_argument('--categorie', action='store_true',
+                        help="Legge come categoriche le colonne di testo con molti valori ripetuti, per usare meno memoria")
+    parser.add_argument('--unisci-fogli', action='store_true',
+                        help="Scrive le righe di tutti i fogli in un unico foglio in ordine cronologico (con "
+                             "--non-ordinare uno dopo l'altro), con una colonna che indica il foglio di provenienza")
+    parser.add_argument('--chiavi-secondarie', nargs='+', default=[], metavar='COLONNA',
+                        help="Con --unisci-fogli, colonne per ordinare le righe con la stessa data")
+    parser.add_argument('--prestazioni', metavar='FILE',
+                        help="Salva in JSON, per ogni file, i tempi per fase e foglio, i valori convertiti da ogni "
+                             "percorso e il picco di memoria")
+    return parser
+
+
+def main(argv=None):
+    argomenti = crea_parser().parse_args(argv)
+
+    file_da_elaborare = trova_file(argomenti.percorsi, argomenti.ricorsivo)
+    if not file_da_elaborare:
+        print("Nessun file da elaborare trovato.", file=sys.stderr)
+        return 2
+    if argomenti.output_dir:
+        os.makedirs(argomenti.output_dir, exist_ok=True)
+
+    opzioni = {
+        'colonne': argomenti.colonne,
+        'formato': FORMATI_OUTPUT[argomenti.formato],
+        'colonna_ordinamento': argomenti.ordina_per or argomenti.colonne[0],
+        'ordina_date': not argomenti.non_ordinare,
+        'fogli': argomenti.fogli,
+        'intervalli_numerici': {nome: INTERVALLI_NUMERICI[nome] for nome in argomenti.numeri},
+        'motore': argomenti.motore,
+        'cache_persistente': CacheDatePersistente(argomenti.cache_date, argomenti.cache_max_voci) if argomenti.cache_date else None,
+        'formato_file': argomenti.formato_file,
+        'compatta': argomenti.categorie,
+        'unisci_fogli': argomenti.unisci_fogli,
+        'chiavi_secondarie': argomenti.chiavi_secondarie,
+    }
+    stato_cache = opzioni['cache_persistente'].statistiche() if opzioni['cache_persistente'] else None
+
+    processi = max(1, min(argomenti.processi, len(file_da_elaborare)))
+    if processi == 1:
+        risultati = [elabora_file(percorso, argomenti.output_dir, opzioni) for percorso in file_da_elaborare]
+    else:
+        with ProcessPoolExecutor(max_workers=processi) as pool:
+            risultati = list(pool.map(elabora_file, file_da_elaborare,
+                                      [argomenti.output_dir] * len(file_da_elaborare),
+                                      [opzioni] * len(file_da_elaborare)))
+
+    # Riepilogo nell'ordine dei file
+    file_con_errori = file_incompleti = 0
+    for percorso, percorso_output, statistiche, errore, _ in risultati:
+        if errore is not None:
+            file_con_errori += 1
+            print(f"ERRORE {percorso}: {errore}", file=sys.stderr)
+            continue
+        non_convertite = sum(stats['totali'] - stats['convertiti']
+                             for stats_foglio in statistiche.values() for stats in stats_foglio.values())
+        file_incompleti += non_convertite > 0
+        print(f"{'OK' if non_convertite == 0 else 'INCOMPLETO'} {percorso} -> {percorso_output}")
+        for nome_foglio, stats_foglio in statistiche.items():
+            for colonna, stats in stats_foglio.items():
+                formati = f" [{', '.join(stats['formati_inferiti'])}]" if stats['formati_inferiti'] else ""
+                print(f"    {nome_foglio} / {colonna}: {stats['convertiti']} su {stats['totali']} "
+                      f"({stats['percentuale']:.1f}%){formati}")
+
+    print(f"{len(risultati)} file: {len(risultati) - file_con_errori - file_incompleti} completi, "
+          f"{file_incompleti} con date non convertite, {file_con_errori} con errori")
+    picchi = [prestazioni['memoria']['picco_mb'] for _, _, _, _, prestazioni in risultati if prestazioni['memoria']]
+    if picchi:
+        print(f"Picco di memoria: {max(picchi):.0f} MB{' (per processo)' if processi > 1 else ''}")
+    stato_finale = opzioni['cache_persistente'].statistiche() if stato_cache is not None else None
+    if stato_finale is not None:
+        # I valori cercati dai processi paralleli contano solo nei totali del database
+        richiesti = stato_finale['richiesti_totali'] - stato_cache['richiesti_totali']
+        trovati = stato_finale['trovati_totali'] - stato_cache['trovati_totali']
+        print(f"Cache delle date: {trovati} valori trovati su {richiesti}"
+              f"{f' ({trovati / richiesti:.1%})' if richiesti else ''}, {stato_finale['voci_versione']} voci")
+    if argomenti.prestazioni:
+        with open(argomenti.prestazioni, 'w', encoding='utf-8') as f:
+            json.dump([{'file': str(percorso), **prestazioni} for percorso, _, _, _, prestazioni in risultati], f, indent=2, ensure_ascii=False)
+        print(f"Prestazioni salvate in {argomenti.prestazioni}")
+    if file_con_errori:
+        return 2
+    return 1 if file_incompleti else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2173 @@
+"""
+Nucleo della normalizzazione delle date, senza interfaccia: riconoscimento dei formati,
+conversione vettoriale delle colonne, normalizzazione di fogli e file Excel, CSV, Parquet e Feather.
+
+Non importa Streamlit, quindi può essere usato dai processi paralleli, dalla riga di
+comando (normalizza_cli.py) e da altri programmi:
+
+    from normalizza_core import normalizza_dataframe
+    df_elaborato, statistiche, df_date, errori = normalizza_dataframe(df, ['Data'])
+
+Le librerie Excel (openpyxl, xlsxwriter) e pyarrow vengono importate solo quando servono.
+"""
+import io
+import os
+import re
+import csv
+import math
+import time
+import codecs
+import heapq
+import pickle
+import sys
+import zipfile
+import calendar
+import itertools
+import tempfile
+import threading
+import types
+import importlib.util
+from contextlib import contextmanager
+from datetime import datetime
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+from dateutil import parser
+
+# Formati provati in ordine di priorità: il primo che corrisponde vince
+FORMATI_DATA = [
+    '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', 
+    '%d-%m-%Y', '%m-%d-%Y', '%Y/%m/%d',
+    '%d.%m.%Y', '%m.%d.%Y', '%Y.%m.%d',
+    '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y',
+    '%Y%m%d', '%d-%b-%Y', '%d-%B-%Y',
+    '%a, %d %b %Y', '%A, %d %b %Y', '%A, %d %B %Y',
+    '%A %d %B %Y'  # Formato italiano: "giovedì 12 giugno 2025"
+]
+
+# Parametri per l'inferenza del formato a livello di colonna
+DIMENSIONE_CAMPIONE_INFERENZA = 1000
+COPERTURA_MINIMA_INFERENZA = 0.99
+MAX_FORMATI_INFERITI = 3
+
+# Parametri del rilevamento automatico delle colonne di date: valori campionati per colonna,
+# valori analizzati tra due controlli della confidenza, frazione minima di date e confidenza
+# oltre la quale il campionamento di una colonna si ferma in anticipo
+DIMENSIONE_CAMPIONE_RILEVAMENTO = 200
+VALORI_PER_PASSO_RILEVAMENTO = 20
+SOGLIA_RILEVAMENTO = 0.6
+CONFIDENZA_RILEVAMENTO = 0.95
+# I numeri somigliano troppo a quantità e codici: una colonna numerica viene proposta solo se le
+# date che ne risultano cadono in questi anni e il nome contiene una di queste parole
+ANNI_PLAUSIBILI_NUMERI = (1950, 2100)
+PAROLE_DATA = ('data', 'date', 'giorno', 'day', 'scadenza', 'nascita', 'time')
+
+# Formati di visualizzazione delle date: nome -> formato strftime
+FORMATI_OUTPUT = {
+    "gg-mm-aaaa": "%d-%m-%Y",
+    "gg/mm/aaaa": "%d/%m/%Y",
+    "aaaa-mm-gg": "%Y-%m-%d"
+}
+# Formato numerico Excel corrispondente, per le date scritte come date native
+FORMATI_EXCEL = {
+    "%d-%m-%Y": "dd-mm-yyyy",
+    "%d/%m/%Y": "dd/mm/yyyy",
+    "%Y-%m-%d": "yyyy-mm-dd"
+}
+
+# Righe di un foglio .xlsx, compresa l'intestazione
+MAX_RIGHE_EXCEL = 1048576
+
+# Modalità streaming: righe lette ed elaborate per blocco, righe per ogni scrittura
+# su disco delle sequenze ordinate e numero massimo di valori distinti ricordati tra i blocchi
+RIGHE_BLOCCO_STREAMING = 50000
+RIGHE_BLOCCO_FUSIONE = 2000
+MAX_VALORI_CACHE_STREAMING = 200000
+
+# Valori convertiti uno per uno tra una notifica di avanzamento e la successiva
+VALORI_PER_AVANZAMENTO = 5000
+
+# Motori di lettura in ordine di preferenza, dal più veloce:
+# nome del motore -> (modulo richiesto, tipi di file supportati). I motori Excel sono quelli di
+# pd.read_excel; 'pyarrow' legge i CSV a blocchi con più thread, 'pandas' con il lettore C di pandas
+MOTORI_LETTURA = {
+    'calamine': ('python_calamine', ('xlsx', 'xls')),
+    'openpyxl': ('openpyxl', ('xlsx',)),
+    'xlrd': ('xlrd', ('xls',)),
+    'pyarrow': ('pyarrow', ('csv', 'parquet', 'feather')),
+    'pandas': ('pandas', ('csv',)),
+}
+
+# Nome dell'unico foglio dei file CSV, Parquet e Feather
+FOGLIO_TABELLA = "Dati"
+
+# Foglio unico con le righe di tutti i fogli in ordine cronologico e colonna che ne indica il
+# foglio di provenienza (vedi unisci_fogli_cronologici)
+FOGLIO_CRONOLOGIA = "Cronologia"
+COLONNA_FOGLIO_ORIGINE = "Foglio di origine"
+
+# Byte iniziali dei CSV da cui vengono riconosciuti codifica e separatore, e separatori provati
+BYTE_CAMPIONE_CSV = 65536
+SEPARATORI_CSV = ",;\t|"
+
+# Formati dei file normalizzati: nome -> (estensione, tipo MIME, modulo richiesto oppure None).
+# CSV, Parquet e Feather contengono una sola tabella: più fogli vengono scritti in uno ZIP
+FORMATI_FILE_OUTPUT = {
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsxwriter'),
+    'csv': ('.csv', 'text/csv', None),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet', 'pyarrow'),
+    'feather': ('.feather', 'application/vnd.apache.arrow.file', 'pyarrow'),
+}
+
+# Tipi di colonna (pd.api.types.infer_dtype) che Arrow scrive così come sono: le colonne con
+# valori di tipi diversi, frequenti nei fogli Excel, vengono scritte come testo
+TIPI_ARROW = ('empty', 'string', 'bytes', 'integer', 'floating', 'mixed-integer-float', 'decimal',
+              'boolean', 'datetime64', 'datetime', 'date', 'timedelta64', 'timedelta', 'time')
+
+# Intervalli plausibili per interpretare i numeri come date, provati in ordine:
+# nome -> (unità, origine, minimo incluso, massimo escluso)
+INTERVALLI_NUMERICI = {
+    'seriale Excel': ('D', '1899-12-30', 1, 2958466),  # dal 1900-01-01 al 9999-12-31
+    'UNIX secondi': ('s', '1970-01-01', 2958466, 1e11),
+    'UNIX millisecondi': ('ms', '1970-01-01', 1e11, 1e14),
+}
+
+# Colonne di testo con al più questa quota di valori distinti sulle righe che diventano
+# categoriche quando si chiede di compattare i fogli letti (vedi compatta_stringhe)
+RAPPORTO_MASSIMO_CATEGORIE = 0.5
+
+# Secondi tra due letture della memoria del processo (vedi CampionatoreMemoria)
+INTERVALLO_CAMPIONAMENTO_MEMORIA = 0.02
+
+# Percorsi di conversione contati dalla strumentazione (vedi Prestazioni), oltre ai formati di
+# FORMATI_DATA e agli intervalli numerici, che vengono contati con il proprio nome
+PERCORSO_INFERENZA = 'inferenza dei formati'
+PERCORSO_CACHE_VALORI = 'cache dei valori'
+PERCORSO_CACHE_PERSISTENTE = 'cache persistente'
+PERCORSO_DATE_NATIVE = 'date native'
+PERCORSO_RICONOSCITORE = 'riconoscitore'
+PERCORSO_DATEUTIL = 'dateutil'
+PERCORSO_NON_CONVERTITI = 'non convertiti'
+
+# Nomi di mesi e giorni riconosciuti, in inglese e in italiano
+MESI_EN = ['january', 'february', 'march', 'april', 'may', 'june',
+           'july', 'august', 'september', 'october', 'november', 'december']
+GIORNI_EN = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MESI_IT = ['gennaio', 'febbraio', 'marzo', 'aprile', 'maggio', 'giugno',
+           'luglio', 'agosto', 'settembre', 'ottobre', 'novembre', 'dicembre']
+MESI_IT_ABBR = ['gen', 'feb', 'mar', 'apr', 'mag', 'giu', 'lug', 'ago', 'set', 'ott', 'nov', 'dic']
+GIORNI_IT = ['lunedì', 'martedì', 'mercoledì', 'giovedì', 'venerdì', 'sabato', 'domenica']
+GIORNI_IT_ABBR = ['lun', 'mar', 'mer', 'gio', 'ven', 'sab', 'dom']
+
+# Tabelle precalcolate: nome del mese (minuscolo) -> numero, nomi italiani -> inglesi
+NUMERO_MESE = {
+    nome: numero
+    for nomi in (MESI_EN, [m[:3] for m in MESI_EN], MESI_IT, MESI_IT_ABBR)
+    for numero, nome in enumerate(nomi, start=1)
+}
+MESI_IT_TO_EN = {it: en.capitalize() for it, en in zip(MESI_IT, MESI_EN)}
+GIORNI_IT_TO_EN = {it: en.capitalize() for it, en in zip(GIORNI_IT, GIORNI_EN)}
+REGEX_MESI_IT = re.compile('|'.join(MESI_IT_TO_EN))
+REGEX_GIORNI_IT = re.compile('|'.join(GIORNI_IT_TO_EN))
+
+# Formati aggiuntivi con nomi italiani (intero o abbreviato), provati dopo FORMATI_DATA
+FORMATI_DATA_IT = ['%d %B %Y', '%d-%B-%Y', '%B %d, %Y', '%A, %d %B %Y', '%A %d %B %Y']
+
+# Versione delle regole di normalizza_data: va incrementata quando cambia il modo in cui un
+# testo viene interpretato, così la cache persistente delle date non riusa i vecchi risultati
+VERSIONE_NORMALIZZAZIONE = 2
+
+# Analizzatore di dateutil per sapere quali campi della data indica un testo (vedi dipende_da_oggi)
+PARSER_DATEUTIL = parser.parser()
+
+class FileNonValido(ValueError):
+    """Il file o le opzioni richieste non permettono di normalizzarlo (colonne o fogli assenti, troppe righe...)"""
+
+def alternativa_nomi(nomi):
+    """Espressione regolare che riconosce uno dei nomi, provando prima i più lunghi (come strptime)"""
+    return '|'.join(sorted((re.escape(nome) for nome in nomi), key=len, reverse=True))
+
+def regex_formato(formato, prefisso, nomi_mesi, nomi_giorni):
+    """
+    Traduce un formato strptime nell'espressione regolare equivalente, con gruppi
+    nominati <prefisso>Y, <prefisso>m, <prefisso>b e <prefisso>d.
+    Le direttive replicano quelle del modulo _strptime, così le corrispondenze sono le stesse.
+    """
+    direttive = {
+        'd': rf'(?P<{prefisso}d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])',
+        'm': rf'(?P<{prefisso}m>1[0-2]|0[1-9]|[1-9])',
+        'Y': rf'(?P<{prefisso}Y>\d\d\d\d)',
+        'b': rf'(?P<{prefisso}b>{nomi_mesi[0]})',
+        'B': rf'(?P<{prefisso}b>{nomi_mesi[1]})',
+        'a': rf'(?:{nomi_giorni[0]})',
+        'A': rf'(?:{nomi_giorni[1]})',
+    }
+    parti = []
+    for token in re.findall(r'%.|\s+|.', formato):
+        if token.startswith('%'):
+            parti.append(direttive[token[1]])
+        elif token.isspace():
+            parti.append(r'\s+')
+        else:
+            parti.append(re.escape(token))
+    return f"(?P<{prefisso}>{''.join(parti)})"
+
+def costruisci_riconoscitore():
+    """
+    Costruisce l'espressione regolare unica che riconosce tutti i formati supportati.
+
+    Returns:
+        tupla (regex_unica, regex_singole, gruppi) dove regex_unica è l'alternativa di tutti
+        i formati in ordine di priorità, regex_singole le espressioni dei singoli formati e
+        gruppi i nomi dei gruppi (anno, mese, nome mese, giorno) per ogni formato
+    """
+    nomi_en = ((alternativa_nomi(m[:3] for m in MESI_EN), alternativa_nomi(MESI_EN)),
+               (alternativa_nomi(g[:3] for g in GIORNI_EN), alternativa_nomi(GIORNI_EN)))
+    giorni_it = GIORNI_IT + [g.replace('ì', 'i') for g in GIORNI_IT] + GIORNI_IT_ABBR
+    nomi_it = ((None, alternativa_nomi(MESI_IT + MESI_IT_ABBR)),
+               (None, alternativa_nomi(giorni_it)))
+
+    espressioni = []
+    gruppi = []
+    for formati, (nomi_mesi, nomi_giorni) in ((FORMATI_DATA, nomi_en), (FORMATI_DATA_IT, nomi_it)):
+        for formato in formati:
+            prefisso = f'f{len(espressioni)}_'
+            espressioni.append(regex_formato(formato, prefisso, nomi_mesi, nomi_giorni))
+            gruppi.append((prefisso + 'Y',
+                           prefisso + 'm' if '%m' in formato else None,
+                           prefisso + 'b' if '%b' in formato or '%B' in formato else None,
+                           prefisso + 'd'))
+
+    regex_unica = re.compile('|'.join(espressioni), re.IGNORECASE)
+    regex_singole = [re.compile(espressione, re.IGNORECASE) for espressione in espressioni]
+    return regex_unica, regex_singole, gruppi
+
+# Riconoscitore compilato una sola volta all'avvio
+REGEX_DATE, REGEX_FORMATI, GRUPPI_FORMATI = costruisci_riconoscitore()
+
+def riconosci_data(testo, con_formato=False):
+    """
+    Riconosce una data in uno dei formati supportati con un'unica espressione regolare,
+    senza provare i formati uno alla volta e senza eccezioni.
+
+    Args:
+        testo: Stringa già ripulita dagli spazi
+        con_formato: Se True, restituisce anche il formato che ha prodotto la data
+
+    Returns:
+        Se con_formato=False: oggetto datetime, oppure None se il testo non corrisponde a nessun formato
+        Se con_formato=True: tupla (datetime, indice) dove indice è la posizione del formato in
+        FORMATI_DATA + FORMATI_DATA_IT (None, None se il testo non è una data). Non è sempre il
+        formato della prima corrispondenza: con una data inesistente (es. 31/04) vale il successivo.
+    """
+    corrispondenza = REGEX_DATE.fullmatch(testo)
+    if corrispondenza is None:
+        return (None, None) if con_formato else None
+
+    # Il gruppo esterno che ha trovato la corrispondenza indica il formato
+    indice = int(corrispondenza.lastgroup[1:-1])
+    while True:
+        gruppo_anno, gruppo_mese, gruppo_nome_mese, gruppo_giorno = GRUPPI_FORMATI[indice]
+        anno = int(corrispondenza.group(gruppo_anno))
+        if gruppo_mese is not None:
+            mese = int(corrispondenza.group(gruppo_mese))
+        else:
+            mese = NUMERO_MESE[corrispondenza.group(gruppo_nome_mese).lower()]
+        giorno = int(corrispondenza.group(gruppo_giorno))
+        if anno >= 1 and giorno <= calendar.monthrange(anno, mese)[1]:
+            return (datetime(anno, mese, giorno), indice) if con_formato else datetime(anno, mese, giorno)
+
+        # Data inesistente (es. 31/04): come strptime, passiamo ai formati successivi
+        corrispondenza = None
+        while corrispondenza is None:
+            indice += 1
+            if indice == len(REGEX_FORMATI):
+                return (None, None) if con_formato else None
+            corrispondenza = REGEX_FORMATI[indice].fullmatch(testo)
+
+def traduci_nomi_italiani(testo):
+    """
+    Sostituisce il primo nome di mese e il primo nome di giorno italiani con quelli inglesi,
+    così che dateutil.parser possa interpretare il testo.
+    """
+    testo_tradotto = testo
+    for regex_nomi, traduzioni in ((REGEX_MESI_IT, MESI_IT_TO_EN), (REGEX_GIORNI_IT, GIORNI_IT_TO_EN)):
+        trovato = regex_nomi.search(testo_tradotto.lower())
+        if trovato:
+            testo_tradotto = testo_tradotto.lower().replace(trovato.group(0), traduzioni[trovato.group(0)]).capitalize()
+    return testo_tradotto
+
+def normalizza_data(data, solo_formato=False):
+    """
+    Funzione che normalizza le date in vari formati.
+    
+    Args:
+        data: Il valore da normalizzare
+        solo_formato: Se True, restituisce solo la stringa formattata. 
+                     Se False, restituisce anche l'oggetto datetime per l'ordinamento.
+    
+    Returns:
+        Se solo_formato=True: stringa in formato 'dd-mm-yyyy'
+        Se solo_formato=False: tupla (stringa formattata, oggetto datetime)
+    """
+    try:
+        dt_obj = None
+        
+        # Se è già un datetime o timestamp pandas, lo usiamo direttamente
+        if isinstance(data, (pd.Timestamp, datetime)):
+            dt_obj = data
+            formatted = data.strftime('%d-%m-%Y')
+        
+        # Se è una stringa, proviamo a interpretarla
+        elif isinstance(data, str):
+            # Puliamo la stringa
+            data = data.strip()
+            
+            # Prima proviamo con il riconoscitore dei formati specifici
+            dt_obj = riconosci_data(data)
+            if dt_obj is not None:
+                formatted = dt_obj.strftime('%d-%m-%Y')
+            
+            # Se non funziona, proviamo con dateutil.parser che è più flessibile
+            if dt_obj is None:
+                try:
+                    # Per i formati italiani, sostituiamo i nomi di mesi e giorni con quelli inglesi
+                    data_temp = traduci_nomi_italiani(data)
+                    
+                    # Proviamo prima con la data modificata se è stata fatta una sostituzione
+                    if data_temp != data:
+                        try:
+                            dt_obj = parser.parse(data_temp, dayfirst=True)
+                            formatted = dt_obj.strftime('%d-%m-%Y')
+                        except:
+                            # Se fallisce, proviamo con la data originale
+                            dt_obj = parser.parse(data, dayfirst=True)  # Assumiamo giorno prima del mese per ambiguità
+                            formatted = dt_obj.strftime('%d-%m-%Y')
+                    else:
+                        # Se non ci sono state sostituzioni, usiamo la data originale
+                        dt_obj = parser.parse(data, dayfirst=True)  # Assumiamo giorno prima del mese per ambiguità
+                        formatted = dt_obj.strftime('%d-%m-%Y')
+                except:
+                    pass
+        
+        # Se è un numero, potrebbe essere un seriale Excel o un timestamp UNIX
+        elif isinstance(data, (int, float, np.number)) and not isinstance(data, bool) and not np.isnan(data):
+            date, _ = converti_numeri(np.array([data], dtype='float64'))
+            if not np.isnat(date[0]):
+                dt_obj = pd.Timestamp(date[0])
+                formatted = dt_obj.strftime('%d-%m-%Y')
+        
+        # Se abbiamo trovato un oggetto datetime valido
+        if dt_obj is not None:
+            if solo_formato:
+                return formatted
+            else:
+                return formatted, dt_obj
+        
+        # Se non siamo riusciti a interpretare, restituiamo il valore originale
+        if solo_formato:
+            return data
+        else:
+            return data, None
+            
+    except Exception as e:
+        if solo_formato:
+            return data
+        else:
+            return data, None
+
+def dipende_da_oggi(testo):
+    """
+    Se la data che dateutil ricava dal testo (come in normalizza_data) prende anno, mese o giorno
+    dalla data di oggi perché il testo non li indica, ad esempio "12/06" o "June 2020": il
+    risultato cambia nel tempo e non va ricordato dalla cache persistente. Il testo viene
+    analizzato una volta sola con _parse, la parte di parser.parse che precede il completamento
+    con la data predefinita: i campi che il testo non indica restano None.
+    """
+    testo = testo.strip()
+    for candidato in dict.fromkeys((traduci_nomi_italiani(testo), testo)):
+        try:
+            campi, _ = PARSER_DATEUTIL._parse(candidato, dayfirst=True)
+        except Exception:
+            continue
+        # Come in normalizza_data, se il testo tradotto non è una data si prova quello originale
+        if campi is not None and len(campi) > 0:
+            return campi.year is None or campi.month is None or campi.day is None
+    return False
+
+def conta_percorso(percorsi, percorso, valori, secondi):
+    """Somma valori e secondi al contatore di un percorso di conversione (percorso -> {'valori', 'secondi'})"""
+    voce = percorsi.setdefault(percorso, {'valori': 0, 'secondi': 0.0})
+    voce['valori'] += int(valori)
+    voce['secondi'] += secondi
+
+def date_ns(date):
+    """
+    Converte un array di date in datetime64[ns], l'unità usata in tutta la normalizzazione.
+    pandas 3 restituisce date in microsecondi e un semplice cambio di unità farebbe traboccare
+    quelle fuori dall'intervallo rappresentabile in nanosecondi (1677-2262), trasformando ad
+    esempio il 31/12/9999 in una data del 1816: queste diventano NaT, cioè non convertite.
+    """
+    date = np.asarray(date)
+    if date.dtype == np.dtype('datetime64[ns]'):
+        return date
+    if date.dtype.kind != 'M':
+        date = np.asarray(pd.to_datetime(pd.Series(date, dtype=object), errors='coerce'))
+        if date.dtype == np.dtype('datetime64[ns]'):
+            return date
+    # Limite dell'intervallo in nanosecondi espresso come intero nell'unità delle date, così il
+    # confronto avviene senza convertirle (anche il cambio di unità di numpy trabocca vicino al limite)
+    unita = np.datetime_data(date.dtype)[0]
+    limite = np.iinfo(np.int64).max // int(np.timedelta64(1, unita) // np.timedelta64(1, 'ns'))
+    fuori = np.abs(date.view('i8')) > limite
+    return np.where(fuori, np.datetime64('NaT', unita), date).astype('datetime64[ns]')
+
+def converti_numeri(numeri, intervalli=None, percorsi=None):
+    """
+    Converte in blocco numeri in date secondo gli intervalli plausibili
+    (seriali Excel, secondi o millisecondi UNIX).
+
+    Args:
+        numeri: Array di float (NaN per i valori mancanti)
+        intervalli: Dizionario nome -> (unità, origine, minimo, massimo); di default INTERVALLI_NUMERICI.
+                    Un numero viene interpretato secondo il primo intervallo che lo contiene.
+        percorsi: se indicato, vi vengono contati valori e secondi di ogni intervallo (vedi conta_percorso)
+
+    Returns:
+        tupla (date, tipi) dove date è un array datetime64 (NaT se fuori da ogni intervallo)
+        e tipi la lista dei nomi degli intervalli effettivamente usati
+    """
+    if intervalli is None:
+        intervalli = INTERVALLI_NUMERICI
+
+    numeri = np.asarray(numeri, dtype='float64')
+    date = np.full(len(numeri), np.datetime64('NaT'), dtype='datetime64[ns]')
+    tipi = []
+    for nome, (unita, origine, minimo, massimo) in intervalli.items():
+        inizio = time.perf_counter()
+        # Limitiamo anche all'intervallo rappresentabile in datetime64[ns]
+        ns_origine = pd.Timestamp(origine).value
+        ns_unita = pd.Timedelta(1, unit=unita).value
+        limite_inferiore = max(minimo, (pd.Timestamp.min.value - ns_origine) / ns_unita)
+        limite_superiore = min(massimo, (pd.Timestamp.max.value - ns_origine) / ns_unita)
+
+        mask = np.isnat(date) & (numeri >= limite_inferiore) & (numeri < limite_superiore)
+        if mask.any():
+            convertite = pd.to_datetime(numeri[mask], unit=unita, origin=pd.Timestamp(origine), errors='coerce')
+            date[mask] = date_ns(convertite.to_numpy())
+            tipi.append(nome)
+            if percorsi is not None:
+                conta_percorso(percorsi, nome, mask.sum(), time.perf_counter() - inizio)
+    return date, tipi
+
+def formatta_date(date, formato='%d-%m-%Y'):
+    """
+    Formatta un array datetime64 calcolando strftime una sola volta per ogni giorno distinto.
+    Il formato deve contenere solo giorno, mese e anno; i NaT diventano NaN.
+    """
+    giorni = np.asarray(date, dtype='datetime64[ns]').astype('datetime64[D]').view('int64')
+    codici, giorni_unici = pd.factorize(giorni)
+    testi = np.asarray(pd.DatetimeIndex(giorni_unici.view('datetime64[D]')).strftime(formato), dtype=object)
+    return np.append(testi, np.nan)[codici]
+
+def inferisci_formati_colonna(valori, dimensione_campione=DIMENSIONE_CAMPIONE_INFERENZA,
+                              copertura_minima=COPERTURA_MINIMA_INFERENZA, max_formati=MAX_FORMATI_INFERITI):
+    """
+    Individua i formati dominanti di una colonna analizzando un campione dei suoi valori.
+
+    Args:
+        valori: Serie di stringhe già ripulite dagli spazi
+        dimensione_campione: Numero massimo di valori analizzati
+        copertura_minima: Frazione del campione oltre la quale non si cercano altri formati
+        max_formati: Numero massimo di formati restituiti
+
+    Returns:
+        Lista dei formati scelti, nell'ordine di priorità di FORMATI_DATA
+    """
+    if valori.empty:
+        return []
+
+    campione = valori.sample(n=dimensione_campione, random_state=0) if len(valori) > dimensione_campione else valori
+
+    # Per ogni formato calcoliamo quali valori del campione riconosce
+    corrispondenze = {}
+    for formato in FORMATI_DATA:
+        mask = pd.to_datetime(campione, format=formato, errors='coerce').notna().to_numpy()
+        if mask.any():
+            corrispondenze[formato] = mask
+
+    # Scelta greedy: ad ogni passo il formato che copre più valori non ancora coperti
+    formati_scelti = []
+    coperti = np.zeros(len(campione), dtype=bool)
+    while corrispondenze and len(formati_scelti) < max_formati:
+        formato = max(corrispondenze, key=lambda f: (corrispondenze[f] & ~coperti).sum())
+        nuovi = corrispondenze.pop(formato) & ~coperti
+        if not nuovi.any():
+            break
+        formati_scelti.append(formato)
+        coperti |= nuovi
+        if coperti.mean() >= copertura_minima:
+            break
+
+    return sorted(formati_scelti, key=FORMATI_DATA.index)
+
+def converti_valori(valori, intervalli_numerici=None, avanzamento=None, cache_persistente=None):
+    """
+    Converte una Serie di valori grezzi: i formati dominanti e i numeri vengono convertiti
+    in blocco con pd.to_datetime, solo i valori residui passano per normalizza_data.
+
+    Args:
+        valori: Serie con indice posizionale (0..n-1)
+        intervalli_numerici: Intervalli per interpretare i numeri (vedi converti_numeri)
+        avanzamento: funzione chiamata con (valori elaborati, valori totali) dopo la conversione
+                     in blocco e ogni VALORI_PER_AVANZAMENTO valori convertiti uno per uno
+        cache_persistente: cache su disco delle stringhe residue (vedi normalizza_cache): le
+                           stringhe già note non passano per normalizza_data, le nuove vi vengono salvate
+
+    Returns:
+        tupla (date, info) dove date è un array datetime64 (NaT se non convertita) e info
+        un dizionario con i formati inferiti (compresi i tipi numerici), il numero di valori
+        convertiti in blocco e, in 'percorsi', valori e secondi di ogni percorso di conversione
+        (formati e intervalli in blocco, cache persistente, riconoscitore, dateutil, non convertiti)
+    """
+    date = np.full(len(valori), np.datetime64('NaT'), dtype='datetime64[ns]')
+    percorsi = {}
+
+    # Solo le stringhe partecipano alla conversione vettoriale
+    mask_stringhe = valori.map(lambda x: isinstance(x, str)).to_numpy(dtype=bool)
+    stringhe = valori[mask_stringhe].astype(object).str.strip()
+    inizio = time.perf_counter()
+    formati_inferiti = inferisci_formati_colonna(stringhe)
+    if not stringhe.empty:
+        conta_percorso(percorsi, PERCORSO_INFERENZA, min(len(stringhe), DIMENSIONE_CAMPIONE_INFERENZA), time.perf_counter() - inizio)
+
+    da_convertire = stringhe
+    formati_esclusi = []
+    for formato in FORMATI_DATA:
+        if da_convertire.empty:
+            break
+        if formato not in formati_inferiti:
+            formati_esclusi.append(formato)
+            continue
+
+        inizio = time.perf_counter()
+        convertite = pd.to_datetime(da_convertire, format=formato, errors='coerce')
+        convertite = convertite[convertite.notna()]
+
+        # Se anche un formato precedente non inferito riconosce il valore, vince quello
+        # (come in normalizza_data, dove il primo formato che corrisponde ha la precedenza)
+        da_verificare = convertite.index
+        for formato_escluso in formati_esclusi:
+            if da_verificare.empty:
+                break
+            precedenti = pd.to_datetime(da_convertire[da_verificare], format=formato_escluso, errors='coerce')
+            precedenti = precedenti[precedenti.notna()]
+            convertite[precedenti.index] = precedenti
+            da_verificare = da_verificare.difference(precedenti.index)
+
+        date[convertite.index.to_numpy()] = date_ns(convertite.to_numpy())
+        da_convertire = da_convertire.drop(convertite.index)
+        conta_percorso(percorsi, formato, len(convertite), time.perf_counter() - inizio)
+
+    # I numeri (seriali Excel, timestamp UNIX) vengono separati e convertiti in blocco
+    mask_numeri = valori.map(lambda x: isinstance(x, (int, float, np.number)) and not isinstance(x, bool)).to_numpy(dtype=bool)
+    posizioni_numeri = np.flatnonzero(mask_numeri)
+    date_numeri, tipi_numerici = converti_numeri(valori.iloc[posizioni_numeri].to_numpy(dtype='float64'), intervalli_numerici, percorsi)
+    date[posizioni_numeri] = date_numeri
+
+    convertiti_in_blocco = int((~np.isnat(date)).sum())
+
+    # I valori rimasti (esclusi i numeri fuori dagli intervalli) passano per la normalizzazione valore per valore
+    posizioni_residue = np.flatnonzero(np.isnat(date) & ~mask_numeri)
+    
+    # ...tranne le stringhe già incontrate in sessioni precedenti
+    valori_da_cache_persistente = 0
+    if cache_persistente is not None and len(posizioni_residue) > 0:
+        inizio = time.perf_counter()
+        residui = valori.iloc[posizioni_residue]
+        note = cache_persistente.cerca(valore for valore in residui if isinstance(valore, str))
+        mask_note = np.fromiter((isinstance(valore, str) and valore in note for valore in residui), dtype=bool, count=len(residui))
+        if mask_note.any():
+            date[posizioni_residue[mask_note]] = date_ns(np.array([note[valore] for valore in residui[mask_note]]))
+            posizioni_residue = posizioni_residue[~mask_note]
+        valori_da_cache_persistente = int(mask_note.sum())
+        conta_percorso(percorsi, PERCORSO_CACHE_PERSISTENTE, valori_da_cache_persistente, time.perf_counter() - inizio)
+
+    if avanzamento is not None:
+        avanzamento(len(valori) - len(posizioni_residue), len(valori))
+    if len(posizioni_residue) > 0:
+        # Ogni valore viene attribuito al percorso che lo ha convertito, con il tempo impiegato:
+        # il riconoscitore compilato per i testi, dateutil per quelli che non riconosce
+        percorsi_residui = (PERCORSO_RICONOSCITORE, PERCORSO_DATEUTIL, PERCORSO_DATE_NATIVE, PERCORSO_NON_CONVERTITI)
+        conteggi, secondi = [0] * len(percorsi_residui), [0.0] * len(percorsi_residui)
+        oggetti = []
+        percorsi_valori = []
+        for inizio_blocco in range(0, len(posizioni_residue), VALORI_PER_AVANZAMENTO):
+            for valore in valori.iloc[posizioni_residue[inizio_blocco:inizio_blocco + VALORI_PER_AVANZAMENTO]]:
+                inizio = time.perf_counter()
+                if isinstance(valore, str):
+                    dt = riconosci_data(valore.strip())
+                    percorso = 0
+                    if dt is None:
+                        dt = normalizza_data(valore)[1]
+                        percorso = 1 if dt is not None else 3
+                else:
+                    dt = normalizza_data(valore)[1]
+                    percorso = 2 if dt is not None else 3
+                conteggi[percorso] += 1
+                secondi[percorso] += time.perf_counter() - inizio
+                oggetti.append(dt)
+                percorsi_valori.append(percorso)
+            if avanzamento is not None:
+                avanzamento(len(valori) - len(posizioni_residue) + len(oggetti), len(valori))
+        for percorso, conteggio, secondi_percorso in zip(percorsi_residui, conteggi, secondi):
+            if conteggio:
+                conta_percorso(percorsi, percorso, conteggio, secondi_percorso)
+        oggetti = [dt.replace(tzinfo=None) if dt is not None and dt.tzinfo else dt for dt in oggetti]
+        date[posizioni_residue] = date_ns(pd.to_datetime(pd.Series(oggetti, dtype=object), errors='coerce').to_numpy())
+
+        if cache_persistente is not None:
+            inizio = time.perf_counter()
+            # Le date completate da dateutil con la data di oggi non vengono ricordate
+            mask_stringhe_residue = mask_stringhe[posizioni_residue] & ~np.fromiter(
+                (percorsi_residui[percorso] == PERCORSO_DATEUTIL and dipende_da_oggi(valore)
+                 for percorso, valore in zip(percorsi_valori, valori.iloc[posizioni_residue])),
+                dtype=bool, count=len(posizioni_residue))
+            cache_persistente.salva(valori.iloc[posizioni_residue[mask_stringhe_residue]].tolist(),
+                                    date[posizioni_residue[mask_stringhe_residue]])
+            conta_percorso(percorsi, PERCORSO_CACHE_PERSISTENTE, 0, time.perf_counter() - inizio)
+
+    # I numeri fuori da ogni intervallo non passano per nessun percorso
+    numeri_scartati = int(np.isnat(date[posizioni_numeri]).sum())
+    if numeri_scartati:
+        conta_percorso(percorsi, PERCORSO_NON_CONVERTITI, numeri_scartati, 0.0)
+
+    info = {
+        'formati_inferiti': formati_inferiti + tipi_numerici,
+        'convertiti_in_blocco': convertiti_in_blocco,
+        'valori_da_cache_persistente': valori_da_cache_persistente,
+        'percorsi': percorsi
+    }
+    return date, info
+
+def normalizza_colonna(serie, cache_valori=None, intervalli_numerici=None, avanzamento=None, cache_persistente=None):
+    """
+    Normalizza un'intera colonna convertendo una sola volta ogni valore distinto.
+
+    La colonna viene fattorizzata: si convertono solo i valori distinti non ancora
+    presenti in cache_valori e i risultati vengono propagati alle righe tramite i codici.
+
+    Args:
+        serie: La colonna da normalizzare
+        cache_valori: Dizionario valore grezzo -> datetime64 (NaT se non convertibile) condiviso
+                      tra colonne e fogli; viene aggiornato con i nuovi valori convertiti
+        intervalli_numerici: Intervalli per interpretare i numeri (vedi converti_numeri)
+        avanzamento: funzione chiamata con (righe elaborate, righe totali) durante la conversione;
+                     le righe elaborate sono stimate dalla quota di valori distinti già convertiti
+        cache_persistente: cache su disco dei valori convertiti uno per uno (vedi converti_valori)
+
+    Returns:
+        tupla (date, convertite, info) dove date è una Serie datetime64[ns] (NaT se non convertita),
+        convertite la Serie booleana dei valori convertiti e info un dizionario con i formati
+        inferiti, i conteggi dei valori distinti, i secondi impiegati e i percorsi di conversione
+        (vedi converti_valori; le colonne numeriche non vengono fattorizzate, quindi lì i valori
+        contati sono tutti i numeri e non i soli distinti)
+    """
+    inizio = time.perf_counter()
+    if cache_valori is None:
+        cache_valori = {}
+
+    # Le colonne numeriche vengono convertite direttamente in un'unica operazione
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        numeri = serie.to_numpy(dtype='float64', na_value=np.nan)
+        percorsi = {}
+        date, tipi_numerici = converti_numeri(numeri, intervalli_numerici, percorsi)
+        convertite = ~np.isnat(date)
+        numeri_scartati = int((~convertite & ~np.isnan(numeri)).sum())
+        if numeri_scartati:
+            conta_percorso(percorsi, PERCORSO_NON_CONVERTITI, numeri_scartati, 0.0)
+        info = {
+            'formati_inferiti': tipi_numerici,
+            'convertiti_in_blocco': int(convertite.sum()),
+            'valori_distinti': len(pd.unique(numeri[~np.isnan(numeri)])),
+            'valori_da_cache': 0,
+            'valori_da_cache_persistente': 0,
+            'percorsi': percorsi,
+            'secondi': time.perf_counter() - inizio
+        }
+        return pd.Series(date, index=serie.index), pd.Series(convertite, index=serie.index), info
+
+    # I booleani non sono mai date, ma per factorize e per cache_valori True == 1 e False == 0:
+    # vengono esclusi prima, altrimenti prenderebbero la data del seriale 1 (o la cederebbero)
+    if pd.api.types.is_bool_dtype(serie) or (
+            serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) not in ('string', 'datetime', 'date')):
+        booleani = serie.map(lambda valore: isinstance(valore, (bool, np.bool_))).to_numpy(dtype=bool)
+        if booleani.any():
+            serie = serie.astype(object).mask(booleani)
+
+    codici, valori_unici = pd.factorize(serie, use_na_sentinel=True)
+    valori_unici = pd.Series(np.asarray(valori_unici, dtype=object))
+
+    # Convertiamo solo i valori distinti che non abbiamo già incontrato
+    mask_nuovi = np.fromiter((valore not in cache_valori for valore in valori_unici), dtype=bool, count=len(valori_unici))
+    nuovi = valori_unici[mask_nuovi].reset_index(drop=True)
+    avanzamento_valori = None
+    if avanzamento is not None:
+        avanzamento_valori = lambda elaborati, totali: avanzamento(len(serie) * elaborati // max(totali, 1), len(serie))
+    date_nuove, info = converti_valori(nuovi, intervalli_numerici, avanzamento_valori, cache_persistente)
+    cache_valori.update(zip(nuovi, date_nuove))
+
+    # Propaghiamo i risultati alle righe; i valori mancanti (codice -1) diventano NaT
+    date_uniche = date_ns(np.array([cache_valori[valore] for valore in valori_unici] + [np.datetime64('NaT', 'ns')]))
+    date = date_uniche[codici]
+
+    info['valori_distinti'] = len(valori_unici)
+    info['valori_da_cache'] = int((~mask_nuovi).sum())
+    if info['valori_da_cache']:
+        conta_percorso(info['percorsi'], PERCORSO_CACHE_VALORI, info['valori_da_cache'], 0.0)
+    info['secondi'] = time.perf_counter() - inizio
+    return pd.Series(date, index=serie.index), pd.Series(~np.isnat(date), index=serie.index), info
+
+def date_plausibili(numeri, intervalli_numerici=None):
+    """
+    Maschera dei numeri che, interpretati come in converti_numeri (vale il primo intervallo che
+    li contiene), diventano date negli ANNI_PLAUSIBILI_NUMERI, e numero di date plausibili per
+    ogni intervallo usato (nome -> numeri). Confronta solo i numeri con i limiti degli
+    intervalli, senza convertirli.
+    """
+    if intervalli_numerici is None:
+        intervalli_numerici = INTERVALLI_NUMERICI
+    ns_inizio = pd.Timestamp(ANNI_PLAUSIBILI_NUMERI[0], 1, 1).value
+    ns_fine = pd.Timestamp(ANNI_PLAUSIBILI_NUMERI[1] + 1, 1, 1).value
+
+    numeri = np.asarray(numeri, dtype='float64')
+    plausibili = np.zeros(len(numeri), dtype=bool)
+    assegnati = np.zeros(len(numeri), dtype=bool)
+    conteggi = {}
+    for nome, (unita, origine, minimo, massimo) in intervalli_numerici.items():
+        ns_origine = pd.Timestamp(origine).value
+        ns_unita = pd.Timedelta(1, unit=unita).value
+        nell_intervallo = ~assegnati & (numeri >= minimo) & (numeri < massimo)
+        mask = nell_intervallo & (numeri >= (ns_inizio - ns_origine) / ns_unita) & (numeri < (ns_fine - ns_origine) / ns_unita)
+        assegnati |= nell_intervallo
+        if mask.any():
+            plausibili |= mask
+            conteggi[nome] = int(mask.sum())
+    return plausibili, conteggi
+
+def rileva_colonne_date(df, intervalli_numerici=None, dimensione_campione=DIMENSIONE_CAMPIONE_RILEVAMENTO,
+                        soglia=SOGLIA_RILEVAMENTO, confidenza=CONFIDENZA_RILEVAMENTO):
+    """
+    Individua le colonne che contengono date analizzando un piccolo campione casuale di ogni
+    colonna con i soli riconoscitori veloci (riconosci_data e gli intervalli numerici, senza il
+    fallback di dateutil). Il campione viene analizzato a passi di VALORI_PER_PASSO_RILEVAMENTO
+    valori e ci si ferma appena la frazione di date è sopra o sotto la soglia con la confidenza
+    richiesta (disuguaglianza di Hoeffding), quindi le colonne chiaramente di date o di testo
+    costano poche decine di valori.
+
+    Args:
+        df: Il foglio (anche solo le prime righe)
+        intervalli_numerici: Intervalli per interpretare i numeri (vedi converti_numeri)
+        dimensione_campione: Valori non vuoti analizzati al massimo per colonna
+        soglia: Frazione di date oltre la quale una colonna viene proposta
+        confidenza: Confidenza richiesta per fermarsi prima di aver analizzato tutto il campione
+
+    Returns:
+        dizionario colonna -> {'punteggio', 'formati', 'valori_analizzati', 'probabile'}
+        nell'ordine delle colonne, dove punteggio è la frazione di date tra i valori analizzati,
+        formati i formati riconosciuti (dal più frequente) e probabile indica le colonne da proporre
+    """
+    generatore = np.random.default_rng(0)
+    formati_riconosciuti = FORMATI_DATA + FORMATI_DATA_IT
+    margine = math.log(2 / (1 - confidenza)) / 2
+    rilevate = {}
+    for indice_colonna, colonna in enumerate(df.columns):
+        serie = df.iloc[:, indice_colonna]
+        if pd.api.types.is_bool_dtype(serie):
+            rilevate[colonna] = {'punteggio': 0.0, 'formati': [], 'valori_analizzati': 0, 'probabile': False}
+            continue
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            rilevate[colonna] = {'punteggio': 1.0, 'formati': ['data Excel'], 'valori_analizzati': int(serie.notna().any()),
+                                 'probabile': bool(serie.notna().any())}
+            continue
+        
+        # Posizioni casuali (senza leggere tutta la colonna), di cui si tengono i valori non vuoti
+        if len(serie) > 4 * dimensione_campione:
+            posizioni = generatore.choice(len(serie), size=4 * dimensione_campione, replace=False)
+        else:
+            posizioni = generatore.permutation(len(serie))
+        valori = serie.iloc[posizioni].to_numpy()
+        valori = valori[~pd.isna(valori)][:dimensione_campione]
+        
+        if pd.api.types.is_numeric_dtype(serie):
+            mask, conteggi = date_plausibili(valori.astype('float64'), intervalli_numerici)
+            punteggio = float(mask.mean()) if len(valori) else 0.0
+            nome = str(colonna).lower()
+            rilevate[colonna] = {'punteggio': punteggio, 'formati': sorted(conteggi, key=conteggi.get, reverse=True),
+                                 'valori_analizzati': len(valori),
+                                 'probabile': punteggio >= soglia and any(parola in nome for parola in PAROLE_DATA)}
+            continue
+        
+        date = analizzati = 0
+        conteggio_formati = {}
+        for inizio in range(0, len(valori), VALORI_PER_PASSO_RILEVAMENTO):
+            passo = valori[inizio:inizio + VALORI_PER_PASSO_RILEVAMENTO].tolist()
+            numeri = []
+            for valore in passo:
+                if isinstance(valore, str):
+                    data, indice = riconosci_data(valore.strip(), con_formato=True)
+                    if data is not None:
+                        formato = formati_riconosciuti[indice]
+                        conteggio_formati[formato] = conteggio_formati.get(formato, 0) + 1
+                        date += 1
+                elif isinstance(valore, (datetime, np.datetime64)):
+                    conteggio_formati['data Excel'] = conteggio_formati.get('data Excel', 0) + 1
+                    date += 1
+                elif isinstance(valore, (int, float, np.number)) and not isinstance(valore, bool):
+                    numeri.append(valore)
+            if numeri:
+                mask, conteggi = date_plausibili(np.array(numeri, dtype='float64'), intervalli_numerici)
+                for tipo, numero in conteggi.items():
+                    conteggio_formati[tipo] = conteggio_formati.get(tipo, 0) + numero
+                date += int(mask.sum())
+            analizzati += len(passo)
+            
+            # La frazione osservata dista al più epsilon da quella della colonna, con la confidenza richiesta
+            epsilon = math.sqrt(margine / analizzati)
+            if date / analizzati - epsilon >= soglia or date / analizzati + epsilon < soglia:
+                break
+        
+        punteggio = date / analizzati if analizzati else 0.0
+        rilevate[colonna] = {'punteggio': punteggio, 'formati': sorted(conteggio_formati, key=conteggio_formati.get, reverse=True),
+                             'valori_analizzati': analizzati, 'probabile': punteggio >= soglia}
+    return rilevate
+
+def converti_colonne(df, colonne, cache_valori=None, intervalli_numerici=None, cache_persistente=None):
+    """
+    Converte le colonne indicate di un foglio; quelle assenti dal foglio vengono ignorate.
+    
+    Returns:
+        dizionario colonna -> (date, convertite, info) come restituiti da normalizza_colonna
+    """
+    if cache_valori is None:
+        cache_valori = {}
+    return {colonna: normalizza_colonna(df[colonna], cache_valori, intervalli_numerici, cache_persistente=cache_persistente)
+            for colonna in colonne if colonna in df.columns}
+
+class MappaErrori:
+    """
+    Valori non convertiti di un foglio, calcolati una sola volta dopo la conversione e riusati da
+    statistiche, elenco dei valori problematici ed export degli errori.
+
+    È una mappa di bit (np.packbits, un bit per colonna, 8 colonne per byte) con una riga per
+    ogni riga del foglio originale, nella sua posizione 0..n-1. ordine contiene le posizioni
+    originali nell'ordine del foglio elaborato, così le righe con errori si selezionano per
+    posizione anche dopo l'ordinamento cronologico.
+    """
+
+    def __init__(self, colonne, bit, righe, ordine=None):
+        self.colonne = list(colonne)
+        self.bit = bit
+        self.righe = righe
+        self.ordine = np.arange(righe) if ordine is None else ordine
+
+    @classmethod
+    def da_maschere(cls, non_convertite, righe):
+        """Mappa da un dizionario colonna -> maschera booleana (per posizione) dei valori non convertiti"""
+        if not non_convertite:
+            return cls([], np.zeros((righe, 0), dtype=np.uint8), righe)
+        matrice = np.column_stack([np.asarray(maschera, dtype=bool) for maschera in non_convertite.values()])
+        return cls(non_convertite, np.packbits(matrice, axis=1), righe)
+
+    def matrice(self):
+        """Matrice booleana righe x colonne dei valori non convertiti, per posizione originale"""
+        return np.unpackbits(self.bit, axis=1, count=len(self.colonne)).astype(bool)
+
+    def colonna(self, colonna):
+        """Maschera dei valori non convertiti della colonna, per posizione originale"""
+        indice = self.colonne.index(colonna)
+        return (self.bit[:, indice // 8] & (0x80 >> indice % 8)).astype(bool)
+
+    def righe_con_errori(self, colonne=None):
+        """Maschera delle righe con almeno un valore non convertito nelle colonne indicate (default tutte), per posizione originale"""
+        if colonne is None:
+            # I bit oltre l'ultima colonna sono sempre 0
+            return self.bit.any(axis=1)
+        maschera = np.zeros(self.righe, dtype=bool)
+        for colonna in colonne:
+            maschera |= self.colonna(colonna)
+        return maschera
+
+    def posizioni_elaborate(self, colonne=None):
+        """Posizioni nel foglio elaborato (quindi in ordine cronologico, se ordinato) delle righe con errori"""
+        return np.flatnonzero(self.righe_con_errori(colonne)[self.ordine])
+
+    def conteggi(self):
+        """Numero di valori non convertiti per colonna"""
+        return dict(zip(self.colonne, self.matrice().sum(axis=0).tolist()))
+
+    def colonne_con_errori(self):
+        return [colonna for colonna, errori in self.conteggi().items() if errori]
+
+class Prestazioni:
+    """
+    Strumentazione di un'elaborazione: secondi per fase (lettura, conversione, formattazione,
+    statistiche, ordinamento, unione, export) e foglio, e per la conversione valori e secondi di ogni
+    percorso (i formati e gli intervalli numerici convertiti in blocco, le cache, il
+    riconoscitore e dateutil valore per valore, i valori non convertiti).
+
+    Le funzioni che la ricevono (normalizza_foglio, normalizza_file, ...) vi registrano le
+    proprie fasi; riepilogo() restituisce un dizionario serializzabile in JSON, per
+    l'interfaccia e per i log.
+    """
+
+    def __init__(self):
+        self.fasi = {}
+        self.percorsi = {}
+        # Memoria del processo durante l'elaborazione, se misurata (vedi CampionatoreMemoria)
+        self.memoria = None
+
+    def aggiungi(self, fase, secondi, foglio=""):
+        """Somma i secondi al tempo della fase per il foglio ("" per le fasi dell'intero file)"""
+        self.fasi[(fase, foglio)] = self.fasi.get((fase, foglio), 0.0) + secondi
+
+    @contextmanager
+    def misura(self, fase, foglio=""):
+        """Misura il tempo del blocco with come fase del foglio"""
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.aggiungi(fase, time.perf_counter() - inizio, foglio)
+
+    def aggiungi_statistiche(self, statistiche):
+        """Conversioni delle statistiche per colonna (vedi normalizza_foglio), escluse quelle riutilizzate da una cache"""
+        for stats in statistiche.values():
+            if stats['conversione_riutilizzata']:
+                continue
+            self.aggiungi('conversione', stats['secondi_conversione'], stats['foglio'])
+            for percorso, voce in stats['percorsi'].items():
+                conta_percorso(self.percorsi, percorso, voce['valori'], voce['secondi'])
+
+    def aggiungi_memoria(self, memoria):
+        """Unisce una misura della memoria (vedi CampionatoreMemoria.riepilogo): vale il picco più alto"""
+        if memoria is None:
+            return
+        if self.memoria is not None:
+            iniziale = min(self.memoria['iniziale_mb'], memoria['iniziale_mb'])
+            picco = max(self.memoria['picco_mb'], memoria['picco_mb'])
+            memoria = {'iniziale_mb': iniziale, 'picco_mb': picco, 'aumento_mb': picco - iniziale}
+        self.memoria = memoria
+
+    def unisci(self, altre):
+        """Aggiunge le misure di un'altra Prestazioni (ad esempio di un lavoro in background)"""
+        for (fase, foglio), secondi in altre.fasi.items():
+            self.aggiungi(fase, secondi, foglio)
+        for percorso, voce in altre.percorsi.items():
+            conta_percorso(self.percorsi, percorso, voce['valori'], voce['secondi'])
+        self.aggiungi_memoria(altre.memoria)
+
+    def riepilogo(self):
+        """
+        Dizionario con 'secondi_totali' (somma delle fasi: i fogli elaborati in parallelo si
+        sovrappongono), 'fasi' (fase, foglio, secondi), 'percorsi' (percorso, valori, secondi,
+        microsecondi per valore), questi ultimi dal più costoso, e 'memoria' (vedi
+        CampionatoreMemoria.riepilogo, None se non misurata)
+        """
+        return {
+            'secondi_totali': sum(self.fasi.values()),
+            'memoria': self.memoria,
+            'fasi': [{'fase': fase, 'foglio': foglio, 'secondi': secondi} for (fase, foglio), secondi in self.fasi.items()],
+            'percorsi': [{'percorso': percorso, 'valori': voce['valori'], 'secondi': voce['secondi'],
+                          'microsecondi_per_valore': voce['secondi'] / voce['valori'] * 1e6 if voce['valori'] else None}
+                         for percorso, voce in sorted(self.percorsi.items(), key=lambda elemento: -elemento[1]['secondi'])],
+        }
+
+def memoria_residente_mb():
+    """Memoria residente (RSS) attuale del processo in MB, None dove non è misurabile"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if importlib.util.find_spec('psutil') is None:
+        return None
+    import psutil
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+def picco_memoria_processo_mb():
+    """Picco di memoria residente del processo dal suo avvio in MB, None dove non è misurabile"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    picco = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo riporta in KB, macOS in byte
+    return picco / 1024 / 1024 if sys.platform == 'darwin' else picco / 1024
+
+class CampionatoreMemoria:
+    """
+    Picco di memoria di un'elaborazione: un thread legge la memoria residente del processo ogni
+    INTERVALLO_CAMPIONAMENTO_MEMORIA secondi finché non viene fermato. Se nel frattempo il picco
+    dall'avvio del processo (ru_maxrss) è cresciuto, vale quello, che non perde i picchi più
+    brevi dell'intervallo.
+
+    La misura è del processo intero: comprende le altre elaborazioni in corso nello stesso
+    processo (ad esempio altre sessioni dell'interfaccia) ma non i processi paralleli.
+
+        with CampionatoreMemoria() as memoria:
+            ...
+        memoria.riepilogo()
+    """
+
+    def __init__(self, intervallo=INTERVALLO_CAMPIONAMENTO_MEMORIA):
+        self.intervallo = intervallo
+        self.iniziale = self.picco = None
+        self.picco_processo_iniziale = None
+        self._fermo = threading.Event()
+        self._thread = None
+
+    def _campiona(self):
+        while not self._fermo.wait(self.intervallo):
+            attuale = memoria_residente_mb()
+            if attuale is not None:
+                self.picco = max(self.picco, attuale)
+
+    def avvia(self):
+        self.iniziale = self.picco = memoria_residente_mb()
+        self.picco_processo_iniziale = picco_memoria_processo_mb()
+        if self.iniziale is not None:
+            self._fermo.clear()
+            self._thread = threading.Thread(target=self._campiona, name="campionatore_memoria", daemon=True)
+            self._thread.start()
+        return self
+
+    def ferma(self):
+        if self._thread is not None:
+            self._fermo.set()
+            self._thread.join()
+            self._thread = None
+        if self.iniziale is None:
+            return
+        self.picco = max(self.picco, memoria_residente_mb() or 0.0)
+        picco_processo = picco_memoria_processo_mb()
+        if picco_processo is not None and self.picco_processo_iniziale is not None and picco_processo > self.picco_processo_iniziale:
+            self.picco = max(self.picco, picco_processo)
+
+    def __enter__(self):
+        return self.avvia()
+
+    def __exit__(self, *eccezione):
+        self.ferma()
+
+    def riepilogo(self):
+        """Dizionario con memoria 'iniziale_mb', 'picco_mb' e 'aumento_mb' (None se non misurabile)"""
+        if self.iniziale is None:
+            return None
+        return {'iniziale_mb': self.iniziale, 'picco_mb': self.picco, 'aumento_mb': self.picco - self.iniziale}
+
+def normalizza_foglio(df, conversioni, colonna_ordinamento, ordina_date, formato_selezionato, nome_foglio="", colonne_riutilizzate=(),
+                      prestazioni=None):
+    """
+    Applica a un foglio le colonne già convertite: sostituisce le date con il formato scelto,
+    calcola le statistiche e, se richiesto, ordina le righe cronologicamente.
+    
+    Args:
+        df: Il foglio originale (non viene modificato: la copia è superficiale e con il
+            Copy-on-Write di pandas duplica solo le colonne di date sostituite)
+        conversioni: dizionario colonna -> (date, convertite, info), vedi converti_colonne
+        colonna_ordinamento: colonna da usare per l'ordinamento
+        ordina_date: se ordinare cronologicamente
+        formato_selezionato: formato strftime delle date nel foglio elaborato
+        nome_foglio: nome del foglio riportato nelle statistiche
+        colonne_riutilizzate: colonne la cui conversione è stata ripresa da una cache
+        prestazioni: se indicata, vi vengono registrate conversione, formattazione, statistiche
+                     e ordinamento del foglio (vedi Prestazioni)
+    
+    Returns:
+        df_elaborato, statistiche_conversione, df_date, errori
+        dove df_date contiene le date convertite (datetime64[ns]), con lo stesso indice (e lo
+        stesso ordine) di df_elaborato, ed errori è la MappaErrori dei valori non convertiti
+    """
+    df_temp = df.copy(deep=False)
+    df_date = pd.DataFrame(index=df_temp.index)
+    statistiche_conversione = {}
+    secondi_formattazione = secondi_ordinamento = 0.0
+    
+    # Un solo passaggio sulle maschere di conversione, poi tutti usano la mappa
+    inizio = time.perf_counter()
+    errori = MappaErrori.da_maschere({colonna: ~convertite.to_numpy(dtype=bool)
+                                      for colonna, (_, convertite, _) in conversioni.items()}, len(df))
+    errori_per_colonna = errori.conteggi()
+    secondi_statistiche = time.perf_counter() - inizio
+    
+    for colonna, (date_convertite, convertite, info_formati) in conversioni.items():
+        df_date[colonna] = date_convertite
+        
+        if len(df_temp) > 0:
+            num_convertiti = len(df_temp) - errori_per_colonna[colonna]
+            statistiche_conversione[colonna] = {
+                'convertiti': num_convertiti,
+                'totali': len(df_temp),
+                'percentuale': num_convertiti / len(df_temp) * 100,
+                'foglio': nome_foglio,
+                'formati_inferiti': info_formati['formati_inferiti'],
+                'convertiti_in_blocco': info_formati['convertiti_in_blocco'],
+                'valori_distinti': info_formati['valori_distinti'],
+                'valori_da_cache': info_formati['valori_da_cache'],
+                'valori_da_cache_persistente': info_formati['valori_da_cache_persistente'],
+                'rapporto_distinti': info_formati['valori_distinti'] / len(df_temp),
+                'conversione_riutilizzata': colonna in colonne_riutilizzate,
+                'secondi_conversione': info_formati['secondi'],
+                'percorsi': info_formati['percorsi']
+            }
+            
+            # Applichiamo il formato di output scelto in un'unica operazione vettoriale;
+            # i valori non convertiti restano quelli originali
+            inizio = time.perf_counter()
+            date_testo = pd.Series(formatta_date(date_convertite.to_numpy(), formato_selezionato), index=df_temp.index)
+            df_temp[colonna] = date_testo.where(convertite, df_temp[colonna].astype(object))
+            secondi_formattazione += time.perf_counter() - inizio
+        else:
+            # Foglio vuoto: nessun valore da convertire
+            statistiche_conversione[colonna] = {
+                'convertiti': 0,
+                'totali': 0,
+                'percentuale': 100.0,
+                'foglio': nome_foglio,
+                'formati_inferiti': [],
+                'convertiti_in_blocco': 0,
+                'valori_distinti': 0,
+                'valori_da_cache': 0,
+                'valori_da_cache_persistente': 0,
+                'rapporto_distinti': 0.0,
+                'conversione_riutilizzata': colonna in colonne_riutilizzate,
+                'secondi_conversione': info_formati['secondi'],
+                'percorsi': info_formati['percorsi']
+            }
+    
+    # Ordinamento cronologico stabile: le date mancanti vanno in fondo
+    if ordina_date and colonna_ordinamento in df_date.columns and statistiche_conversione[colonna_ordinamento]['percentuale'] > 0:
+        inizio = time.perf_counter()
+        ordine = df_date[colonna_ordinamento].reset_index(drop=True).sort_values(na_position='last', kind='stable').index.to_numpy()
+        df_temp = df_temp.iloc[ordine]
+        df_date = df_date.iloc[ordine]
+        errori.ordine = ordine
+        secondi_ordinamento = time.perf_counter() - inizio
+    
+    if prestazioni is not None:
+        prestazioni.aggiungi_statistiche(statistiche_conversione)
+        prestazioni.aggiungi('formattazione', secondi_formattazione, nome_foglio)
+        prestazioni.aggiungi('statistiche', secondi_statistiche, nome_foglio)
+        if secondi_ordinamento:
+            prestazioni.aggiungi('ordinamento', secondi_ordinamento, nome_foglio)
+    
+    return df_temp, statistiche_conversione, df_date, errori
+
+# Contenuto del file su cui lavorano i processi paralleli, ricevuto una volta per processo, e
+# valori distinti già convertiti dal processo, condivisi tra tutti i fogli che elabora
+contenuto_processo = None
+cache_valori_processo = {}
+
+# Un solo avvio di processi alla volta in tutto il processo principale: senza_modulo_principale
+# sostituisce un modulo globale e le sessioni di Streamlit girano ognuna nel proprio thread
+BLOCCO_AVVIO_PROCESSI = threading.Lock()
+
+@contextmanager
+def senza_modulo_principale():
+    """
+    I processi avviati con "spawn" reimportano il modulo __main__, che sotto Streamlit è
+    lo script con tutta l'interfaccia: mentre i processi vengono avviati lo sostituiamo
+    con un modulo vuoto, dato che ai processi basta normalizza_core. Il blocco impedisce a due
+    thread di sostituirlo insieme e di ripristinare l'uno il modulo dell'altro.
+    """
+    with BLOCCO_AVVIO_PROCESSI:
+        principale = sys.modules['__main__']
+        sys.modules['__main__'] = types.ModuleType('__main__')
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = principale
+
+def inizializza_processo(contenuto):
+    """Inizializzatore dei processi paralleli: riceve il contenuto del file una sola volta"""
+    global contenuto_processo, cache_valori_processo
+    contenuto_processo = contenuto
+    cache_valori_processo = {}
+
+def prepara_foglio(nome_foglio, motore, df, colonne, intervalli_numerici=None, cache_persistente=None, compatta=False):
+    """
+    Lavoro di un processo parallelo: legge il foglio dal file (se df è None, compattandone le
+    colonne di testo ripetitive se richiesto, vedi compatta_stringhe) e ne converte le colonne
+    indicate. La formattazione e l'ordinamento restano al processo principale; la cache
+    persistente delle date apre nel processo una propria connessione.
+    
+    I valori distinti già convertiti vengono riutilizzati tra i fogli elaborati dallo stesso
+    processo (cache_valori_processo), non tra processi diversi: i fogli convertiti insieme
+    non possono aspettare l'uno i valori dell'altro, quindi un valore presente in fogli
+    assegnati a processi diversi viene convertito una volta per processo.
+    
+    Returns:
+        tupla (df_letto, conversioni, secondi_lettura); df_letto e secondi_lettura sono None
+        se il foglio è stato passato già letto
+    """
+    df_letto = secondi_lettura = None
+    if df is None:
+        inizio = time.perf_counter()
+        df = df_letto = leggi_fogli_file(contenuto_processo, [nome_foglio], motore, compatta=compatta)[nome_foglio]
+        secondi_lettura = time.perf_counter() - inizio
+    return df_letto, converti_colonne(df, colonne, cache_valori_processo, intervalli_numerici, cache_persistente), secondi_lettura
+
+def normalizza_dataframe(df, colonne, formato=FORMATI_OUTPUT["gg-mm-aaaa"], colonna_ordinamento=None,
+                         ordina_date=True, nome_foglio="", cache_valori=None, intervalli_numerici=None, cache_persistente=None,
+                         prestazioni=None):
+    """
+    Normalizza le colonne di date di un DataFrame, senza effetti sull'interfaccia.
+    
+    Args:
+        df: Il DataFrame da normalizzare (non viene modificato)
+        colonne: colonne da normalizzare; quelle assenti vengono ignorate
+        formato: formato strftime delle date nel DataFrame elaborato
+        colonna_ordinamento: colonna per l'ordinamento cronologico (default la prima presente)
+        ordina_date: se ordinare cronologicamente
+        nome_foglio: nome riportato nelle statistiche
+        cache_valori: dizionario dei valori già convertiti, da condividere tra più chiamate
+        intervalli_numerici: intervalli per interpretare i numeri (default INTERVALLI_NUMERICI)
+        cache_persistente: cache su disco delle date riconosciute valore per valore (vedi normalizza_cache)
+        prestazioni: se indicata, vi vengono registrate le fasi del foglio (vedi Prestazioni)
+    
+    Returns:
+        df_elaborato, statistiche_conversione, df_date, errori (vedi normalizza_foglio)
+    """
+    conversioni = converti_colonne(df, colonne, cache_valori, intervalli_numerici, cache_persistente)
+    if colonna_ordinamento is None and conversioni:
+        colonna_ordinamento = next(iter(conversioni))
+    return normalizza_foglio(df, conversioni, colonna_ordinamento, ordina_date, formato, nome_foglio, prestazioni=prestazioni)
+
+def seriali_excel(date):
+    """
+    Date datetime64 come numeri seriali di Excel (giorni dal 31/12/1899 con la parte dell'orario),
+    contando il 29/02/1900 che Excel considera esistente; NaT diventa NaN
+    """
+    giorni = (date.astype('datetime64[ns]') - np.datetime64('1899-12-31', 'ns')).astype('i8') / 86400e9
+    giorni[np.isnat(date)] = np.nan
+    return np.where(giorni > 59, giorni + 1, giorni)
+
+def valori_colonna_excel(serie):
+    """
+    Prepara una colonna per la scrittura diretta con xlsxwriter, una volta sola per tutti i file
+    in cui va scritta: date e orari diventano numeri seriali (da scrivere con il formato di data),
+    numeri, booleani e testi restano come sono. Le colonne con valori di tipi diversi vengono
+    scritte valore per valore (vedi scrivi_valore_excel).
+    
+    Returns:
+        tupla (metodo, valide, valori, date) dove metodo è il nome del metodo del foglio
+        xlsxwriter (None per le colonne miste), valide la maschera delle celle da scrivere (le
+        celle vuote non si scrivono), valori l'array dei valori di tutte le righe e date se i
+        valori sono date
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = pd.Series(np.asarray(serie, dtype=object), index=serie.index)
+    if isinstance(serie.dtype, pd.DatetimeTZDtype):
+        serie = serie.dt.tz_localize(None)
+    if pd.api.types.is_datetime64_dtype(serie):
+        seriali = seriali_excel(serie.to_numpy())
+        return 'write_number', ~np.isnan(seriali), seriali, True
+    if pd.api.types.is_bool_dtype(serie) and not serie.hasnans:
+        return 'write_boolean', np.ones(len(serie), dtype=bool), serie.to_numpy(dtype=bool), False
+    if pd.api.types.is_integer_dtype(serie) and not serie.hasnans:
+        return 'write_number', np.ones(len(serie), dtype=bool), serie.to_numpy(), False
+    if pd.api.types.is_float_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        numeri = serie.to_numpy(dtype='float64', na_value=np.nan)
+        if not np.isinf(numeri).any():
+            return 'write_number', ~np.isnan(numeri), numeri, False
+    valide = serie.notna().to_numpy()
+    if pd.api.types.infer_dtype(serie, skipna=True) == 'string':
+        return 'write_string', valide, serie.to_numpy(dtype=object), False
+    return None, valide, serie.to_numpy(dtype=object), False
+
+def scrivi_valore_excel(foglio, riga, colonna, valore, formato_data):
+    """Scrive una cella di una colonna mista con il metodo xlsxwriter del tipo del valore"""
+    if isinstance(valore, str):
+        foglio.write_string(riga, colonna, valore)
+    elif isinstance(valore, (bool, np.bool_)):
+        foglio.write_boolean(riga, colonna, bool(valore))
+    elif isinstance(valore, (datetime, np.datetime64)):
+        seriale = seriali_excel(np.array([valore], dtype='datetime64[ns]'))[0]
+        if not np.isnan(seriale):
+            foglio.write_number(riga, colonna, seriale, formato_data)
+    elif isinstance(valore, (pd.Timedelta, np.timedelta64)):
+        foglio.write_number(riga, colonna, pd.Timedelta(valore).total_seconds() / 86400)
+    elif isinstance(valore, (int, float, np.number)):
+        numero = float(valore)
+        if math.isinf(numero):
+            # Come pandas: Excel non ha infiniti
+            foglio.write_string(riga, colonna, 'inf' if numero > 0 else '-inf')
+        elif not math.isnan(numero):
+            foglio.write_number(riga, colonna, valore if isinstance(valore, int) else numero)
+    else:
+        foglio.write_string(riga, colonna, str(valore))
+
+def scrivi_valori_excel(foglio, colonna, preparati, formato_data, righe=None):
+    """
+    Scrive sotto l'intestazione i valori preparati da valori_colonna_excel, tutti oppure solo
+    quelli delle posizioni indicate in righe (uno sotto l'altro)
+    """
+    metodo, valide, valori, date = preparati
+    if righe is not None:
+        valide, valori = valide[righe], valori[righe]
+    posizioni = (np.flatnonzero(valide) + 1).tolist()
+    valori = valori[valide].tolist()
+    if metodo is None:
+        for riga, valore in zip(posizioni, valori):
+            scrivi_valore_excel(foglio, riga, colonna, valore, formato_data)
+        return
+    scrivi = getattr(foglio, metodo)
+    formato = formato_data if date else None
+    for riga, valore in zip(posizioni, valori):
+        scrivi(riga, colonna, valore, formato)
+
+def fondi_sequenze_ordinate(sequenze):
+    """
+    Fusione (k-way merge) di sequenze di chiavi int64 già ordinate, a coppie in log2(k) passaggi:
+    nella fusione di due sequenze la posizione di ogni chiave della prima è la sua posizione più
+    quella (np.searchsorted) nella seconda, e le chiavi della seconda occupano in ordine le
+    posizioni rimaste. È stabile: a parità di chiave vengono prima le chiavi delle sequenze
+    precedenti e, in ogni sequenza, quelle precedenti.
+    
+    Returns:
+        posizioni, nella concatenazione delle sequenze, delle chiavi in ordine
+    """
+    inizi = np.cumsum([0] + [len(chiavi) for chiavi in sequenze])
+    livello = [(np.asarray(chiavi, dtype=np.int64), np.arange(inizio, inizio + len(chiavi)))
+               for chiavi, inizio in zip(sequenze, inizi)]
+    if not livello:
+        return np.arange(0)
+    while len(livello) > 1:
+        fusi = []
+        for (chiavi_a, posizioni_a), (chiavi_b, posizioni_b) in zip(livello[0::2], livello[1::2]):
+            destinazioni_a = np.arange(len(chiavi_a)) + np.searchsorted(chiavi_b, chiavi_a, side='left')
+            della_seconda = np.ones(len(chiavi_a) + len(chiavi_b), dtype=bool)
+            della_seconda[destinazioni_a] = False
+            chiavi = np.empty(len(della_seconda), dtype=np.int64)
+            posizioni = np.empty(len(della_seconda), dtype=np.int64)
+            chiavi[destinazioni_a], chiavi[della_seconda] = chiavi_a, chiavi_b
+            posizioni[destinazioni_a], posizioni[della_seconda] = posizioni_a, posizioni_b
+            fusi.append((chiavi, posizioni))
+        if len(livello) % 2:
+            fusi.append(livello[-1])
+        livello = fusi
+    return livello[0][1]
+
+def ranghi_valori(valori):
+    """
+    Rango denso di ogni valore nell'ordine crescente dei valori distinti, con i valori mancanti
+    dopo tutti gli altri; i valori di tipi non confrontabili vengono ordinati come testo.
+    
+    Returns:
+        tupla (ranghi int64, numero di ranghi)
+    """
+    try:
+        codici, unici = pd.factorize(valori, sort=True, use_na_sentinel=True)
+    except TypeError:
+        codici, unici = pd.factorize(pd.Series(valori, dtype=object).map(str, na_action='ignore'), sort=True, use_na_sentinel=True)
+    codici = codici.astype(np.int64)
+    codici[codici < 0] = len(unici)
+    return codici, len(unici) + 1
+
+def unisci_fogli_cronologici(fogli, colonna_ordinamento, chiavi_secondarie=(), colonna_foglio=COLONNA_FOGLIO_ORIGINE):
+    """
+    Unisce i fogli normalizzati in un'unica sequenza cronologica, con una colonna che indica il
+    foglio di provenienza di ogni riga. Le righe non vengono riordinate tutte insieme: ogni
+    foglio, di solito già ordinato da normalizza_foglio, viene ordinato per conto suo (un
+    passaggio lineare se lo è già) e le sequenze vengono fuse con fondi_sequenze_ordinate.
+    
+    A parità di data decidono le chiavi secondarie, in ordine crescente e con i valori mancanti
+    in fondo, poi l'ordine dei fogli e quello delle righe in ogni foglio. Le date mancanti vanno
+    in fondo, come nei fogli che non hanno la colonna di ordinamento.
+    
+    Args:
+        fogli: dizionario nome del foglio -> (df_elaborato, df_date), nell'ordine dei fogli
+        colonna_ordinamento: colonna di date (in df_date) della sequenza cronologica, oppure
+                             dizionario nome del foglio -> colonna se ogni foglio è ordinato per
+                             una colonna diversa; None per accodare i fogli senza riordinare le righe
+        chiavi_secondarie: colonne per ordinare le righe con la stessa data; le colonne di
+                           date convertite vengono confrontate come date
+        colonna_foglio: nome della colonna aggiunta in testa con il foglio di provenienza
+    
+    Returns:
+        tupla (df_unito, df_date_unito, ordine) dove ordine sono le posizioni delle righe del
+        risultato nella concatenazione dei fogli (ad esempio per ritrovarvi le righe con errori)
+    
+    Raises:
+        FileNonValido: se colonna_foglio esiste già in qualche foglio
+    """
+    for nome_foglio, (df_elaborato, _) in fogli.items():
+        if colonna_foglio in df_elaborato.columns:
+            raise FileNonValido(f"Il foglio '{nome_foglio}' ha già una colonna '{colonna_foglio}'")
+    
+    colonne_ordinamento = colonna_ordinamento if isinstance(colonna_ordinamento, dict) else dict.fromkeys(fogli, colonna_ordinamento)
+    
+    # Chiave int64 della data, con le date mancanti in fondo
+    date = []
+    for nome_foglio, (df_elaborato, df_date) in fogli.items():
+        colonna = colonne_ordinamento.get(nome_foglio)
+        if colonna is not None and colonna in df_date.columns:
+            chiavi = date_ns(df_date[colonna].to_numpy()).view('i8').copy()
+            chiavi[chiavi == np.iinfo(np.int64).min] = np.iinfo(np.int64).max
+        else:
+            chiavi = np.full(len(df_elaborato), np.iinfo(np.int64).max, dtype=np.int64)
+        date.append(chiavi)
+    
+    if chiavi_secondarie:
+        # Data e chiavi secondarie diventano un'unica chiave int64 combinando i loro ranghi
+        chiavi, combinazioni = ranghi_valori(np.concatenate(date))
+        for chiave in chiavi_secondarie:
+            valori = []
+            for df_elaborato, df_date in fogli.values():
+                if chiave in df_date.columns:
+                    valori.append(df_date[chiave].astype(object).to_numpy())
+                elif chiave in df_elaborato.columns:
+                    valori.append(df_elaborato[chiave].to_numpy(dtype=object))
+                else:
+                    valori.append(np.full(len(df_elaborato), None, dtype=object))
+            ranghi, numero = ranghi_valori(np.concatenate(valori) if valori else np.array([], dtype=object))
+            if combinazioni * numero >= 2 ** 63:
+                # Ai ranghi della chiave fin qui bastano tanti valori quante sono le righe
+                chiavi, combinazioni = ranghi_valori(chiavi)
+            chiavi = chiavi * numero + ranghi
+            combinazioni *= numero
+        inizi = np.cumsum([0] + [len(chiavi_foglio) for chiavi_foglio in date])
+        date = [chiavi[inizio:fine] for inizio, fine in zip(inizi[:-1], inizi[1:])]
+    
+    # Ogni foglio in ordine (stabile), poi la fusione delle sequenze
+    inizi = np.cumsum([0] + [len(chiavi) for chiavi in date])
+    ordini = [np.argsort(chiavi, kind='stable') for chiavi in date]
+    posizioni = fondi_sequenze_ordinate([chiavi[ordine] for chiavi, ordine in zip(date, ordini)])
+    ordine = np.concatenate([inizio + ordine_foglio for inizio, ordine_foglio in zip(inizi, ordini)] or [np.arange(0)])[posizioni]
+    
+    df_unito = pd.concat([df_elaborato for df_elaborato, _ in fogli.values()], ignore_index=True).iloc[ordine]
+    df_date_unito = pd.concat([df_date for _, df_date in fogli.values()], ignore_index=True).iloc[ordine]
+    # Il foglio di provenienza è una colonna categorica: un codice per riga
+    df_unito.insert(0, colonna_foglio, pd.Categorical.from_codes(np.repeat(np.arange(len(fogli)), np.diff(inizi))[ordine],
+                                                                 categories=pd.Index(list(fogli), dtype=object)))
+    df_unito.index = df_date_unito.index = pd.RangeIndex(len(df_unito))
+    return df_unito, df_date_unito, ordine
+
+def posizioni_unite(posizioni_fogli, righe_fogli, ordine):
+    """
+    Posizioni nel foglio di unisci_fogli_cronologici delle righe indicate per foglio (ad esempio
+    quelle di MappaErrori.posizioni_elaborate), dati il numero di righe di ogni foglio,
+    nell'ordine dei fogli uniti, e l'ordine restituito dall'unione
+    """
+    indicate = np.zeros(len(ordine), dtype=bool)
+    inizio = 0
+    for nome_foglio, righe in righe_fogli.items():
+        if nome_foglio in posizioni_fogli:
+            indicate[inizio + np.asarray(posizioni_fogli[nome_foglio], dtype=np.int64)] = True
+        inizio += righe
+    return np.flatnonzero(indicate[ordine])
+
+def scrivi_excel_normalizzato(destinazione, fogli, colonne, formato_excel="dd/mm/yyyy", rilascia=False, errori=None,
+                              destinazione_errori=None):
+    """
+    Scrive i fogli normalizzati in un file Excel, con le colonne di date come date native, e
+    nella stessa passata il file delle righe con date non convertite.
+    
+    Le celle vengono scritte direttamente con xlsxwriter, colonna per colonna con il metodo del
+    tipo della colonna (vedi valori_colonna_excel), senza passare per DataFrame.to_excel; i
+    formati (intestazione, date) sono creati una volta per file e condivisi da tutte le celle.
+    I testi vengono sempre scritti come testo, anche quando sembrano formule o indirizzi web.
+    
+    Args:
+        destinazione: percorso, buffer o file temporaneo del file .xlsx (None per scrivere solo
+                      il file degli errori)
+        fogli: dizionario nome del foglio -> (df_elaborato, df_date)
+        colonne: colonne di date da scrivere come date
+        formato_excel: formato numerico Excel delle date
+        rilascia: se True ogni foglio viene tolto da fogli appena scritto (vedi scrivi_file_normalizzato)
+        errori: dizionario nome del foglio -> posizioni nel foglio elaborato delle righe con
+                date non convertite (vedi MappaErrori.posizioni_elaborate)
+        destinazione_errori: percorso o buffer del file .xlsx con le righe indicate in errori e
+                             i valori del foglio elaborato, un foglio "Errori_..." per ogni foglio
+                             che ne ha
+    
+    Raises:
+        FileNonValido: se un foglio ha più righe di quante ne stiano in un foglio Excel
+    """
+    import xlsxwriter
+    libri = {}
+    try:
+        if destinazione is not None:
+            libri['normalizzato'] = xlsxwriter.Workbook(destinazione)
+        if destinazione_errori is not None:
+            libri['errori'] = xlsxwriter.Workbook(destinazione_errori)
+        # Formati creati una volta per file e condivisi da tutte le celle: intestazione e date
+        formati = {nome: (libro.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}),
+                          libro.add_format({'num_format': formato_excel}))
+                   for nome, libro in libri.items()}
+        
+        for nome_foglio in list(fogli):
+            df_elaborato, df_date = fogli.pop(nome_foglio) if rilascia else fogli[nome_foglio]
+            if len(df_elaborato) >= MAX_RIGHE_EXCEL:
+                raise FileNonValido(f"Il foglio '{nome_foglio}' ha {len(df_elaborato)} righe: "
+                                 f"un foglio Excel ne contiene al più {MAX_RIGHE_EXCEL - 1}")
+            
+            # Nome foglio limitato a 31 caratteri per Excel
+            fogli_excel = {}
+            if 'normalizzato' in libri:
+                fogli_excel['normalizzato'] = libri['normalizzato'].add_worksheet(str(nome_foglio)[:31])
+            righe_errori = (errori or {}).get(nome_foglio)
+            if 'errori' in libri and righe_errori is not None and len(righe_errori):
+                fogli_excel['errori'] = libri['errori'].add_worksheet(f"Errori_{nome_foglio}"[:31])
+            
+            for i, colonna in enumerate(df_elaborato.columns):
+                # Ogni colonna viene preparata una volta per i due file; nel file normalizzato le
+                # colonne di date prendono le date convertite, in quello degli errori i valori elaborati
+                data = colonna in colonne and colonna in df_date.columns
+                preparati = valori_colonna_excel(df_elaborato.iloc[:, i]) if 'errori' in fogli_excel or not data else None
+                for nome, foglio in fogli_excel.items():
+                    intestazione, formato_data = formati[nome]
+                    foglio.write_string(0, i, str(colonna), intestazione)
+                    if nome == 'errori':
+                        scrivi_valori_excel(foglio, i, preparati, formato_data, righe_errori)
+                    elif data:
+                        scrivi_valori_excel(foglio, i, valori_colonna_excel(df_date[colonna]), formato_data)
+                        foglio.set_column(i, i, 15)
+                    else:
+                        scrivi_valori_excel(foglio, i, preparati, formato_data)
+    finally:
+        for libro in libri.values():
+            libro.close()
+
+def tabella_arrow(df_elaborato, df_date, colonne, formato_file):
+    """
+    Foglio normalizzato come tabella Arrow. In Parquet e Feather le colonne di date sono date
+    native (date32, oppure timestamp se qualche valore ha un orario), vuote dove la data non è
+    stata convertita; in CSV restano il testo nel formato scelto. Le intestazioni diventano
+    testo e le colonne con valori di tipi diversi vengono scritte come testo (vedi TIPI_ARROW).
+    """
+    import pyarrow as pa
+    df_export = df_elaborato.copy(deep=False)
+    colonne_date = [colonna for colonna in colonne if colonna in df_date.columns] if formato_file != 'csv' else []
+    for colonna in colonne_date:
+        df_export[colonna] = df_date[colonna]
+    for colonna in df_export.columns:
+        serie = df_export[colonna]
+        if serie.dtype == object and pd.api.types.infer_dtype(serie, skipna=True) not in TIPI_ARROW:
+            df_export[colonna] = serie.astype(str).where(serie.notna())
+    df_export.columns = [str(colonna) for colonna in df_export.columns]
+    
+    tabella = pa.Table.from_pandas(df_export, preserve_index=False)
+    for colonna in colonne_date:
+        date = df_date[colonna].to_numpy()
+        if np.all(date[~np.isnat(date)].view('i8') % (86400 * 10**9) == 0):
+            posizione = tabella.schema.get_field_index(str(colonna))
+            tabella = tabella.set_column(posizione, str(colonna), tabella.column(posizione).cast(pa.date32()))
+    return tabella
+
+def scrivi_tabella_normalizzata(destinazione, df_elaborato, df_date, colonne, formato_file):
+    """Scrive un foglio normalizzato in un file CSV, Parquet o Feather (vedi tabella_arrow)"""
+    if importlib.util.find_spec('pyarrow') is None:
+        if formato_file != 'csv':
+            raise ValueError(f"Per scrivere file {formato_file} serve pyarrow")
+        df_elaborato.to_csv(destinazione, index=False)
+        return
+    tabella = tabella_arrow(df_elaborato, df_date, colonne, formato_file)
+    if formato_file == 'csv':
+        import pyarrow.csv
+        pyarrow.csv.write_csv(tabella, destinazione)
+    elif formato_file == 'parquet':
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(tabella, destinazione)
+    else:
+        import pyarrow.feather
+        pyarrow.feather.write_feather(tabella, destinazione)
+
+def scrivi_file_normalizzato(destinazione, fogli, colonne, formato_file='xlsx', formato_excel="dd/mm/yyyy", archivio=None,
+                             rilascia=False, errori=None, destinazione_errori=None):
+    """
+    Scrive i fogli normalizzati nel formato indicato (vedi FORMATI_FILE_OUTPUT).
+    
+    Args:
+        destinazione: percorso o buffer del file
+        fogli: dizionario nome del foglio -> (df_elaborato, df_date)
+        colonne: colonne di date
+        formato_file: 'xlsx', 'csv', 'parquet' o 'feather'
+        formato_excel: formato numerico Excel delle colonne di date (solo xlsx)
+        archivio: per CSV, Parquet e Feather, se scrivere uno ZIP con un file per foglio
+                  (default: se i fogli sono più di uno)
+        rilascia: se True ogni foglio viene tolto da fogli appena scritto, così la sua memoria
+                  si libera prima di scrivere i successivi (il dizionario resta vuoto)
+        errori, destinazione_errori: righe con date non convertite da scrivere nel file .xlsx
+                                     degli errori (vedi scrivi_excel_normalizzato), in .xlsx
+                                     nella stessa passata del file normalizzato
+    
+    Raises:
+        FileNonValido: se più fogli vanno scritti in un unico file CSV, Parquet o Feather
+    """
+    if formato_file == 'xlsx':
+        scrivi_excel_normalizzato(destinazione, fogli, colonne, formato_excel, rilascia, errori, destinazione_errori)
+        return
+    if destinazione_errori is not None:
+        scrivi_excel_normalizzato(None, fogli, colonne, formato_excel, errori=errori, destinazione_errori=destinazione_errori)
+    if archivio is None:
+        archivio = len(fogli) > 1
+    if not archivio:
+        if len(fogli) != 1:
+            raise FileNonValido(f"Un file {formato_file} contiene un solo foglio: {len(fogli)} fogli vanno scritti in uno ZIP")
+        df_elaborato, df_date = fogli.popitem()[1] if rilascia else next(iter(fogli.values()))
+        scrivi_tabella_normalizzata(destinazione, df_elaborato, df_date, colonne, formato_file)
+        return
+    
+    # Parquet e Feather sono già compressi
+    estensione = FORMATI_FILE_OUTPUT[formato_file][0]
+    compressione = zipfile.ZIP_DEFLATED if formato_file == 'csv' else zipfile.ZIP_STORED
+    with zipfile.ZipFile(destinazione, 'w', compression=compressione) as zip_fogli:
+        for nome_foglio in list(fogli):
+            df_elaborato, df_date = fogli.pop(nome_foglio) if rilascia else fogli[nome_foglio]
+            buffer = io.BytesIO()
+            scrivi_tabella_normalizzata(buffer, df_elaborato, df_date, colonne, formato_file)
+            zip_fogli.writestr(re.sub(r'[\\/:*?"<>|]', '_', str(nome_foglio)) + estensione, buffer.getvalue())
+
+def estensione_file_normalizzato(formato_file, tipo_file_letto, foglio_unico=False):
+    """
+    Estensione del file normalizzato di un file del tipo indicato: un file Excel, che può avere
+    più fogli, in CSV, Parquet o Feather diventa uno ZIP con un file per foglio, a meno che i
+    fogli non vengano uniti in uno solo (foglio_unico, vedi unisci_fogli_cronologici).
+    """
+    if formato_file != 'xlsx' and tipo_file_letto in ('xlsx', 'xls') and not foglio_unico:
+        return '.zip'
+    return FORMATI_FILE_OUTPUT[formato_file][0]
+
+def valori_non_convertiti(df, errori, nome_foglio=""):
+    """
+    Elenca i valori che non è stato possibile convertire, in ordine di riga.
+    
+    Args:
+        df: Il foglio originale
+        errori: MappaErrori del foglio (vedi normalizza_foglio)
+    
+    Returns:
+        DataFrame con colonne Foglio, Riga nel file, Colonna, Valore (come testo)
+    """
+    parti = []
+    for colonna in errori.colonne_con_errori():
+        valori = df[colonna].iloc[np.flatnonzero(errori.colonna(colonna))]
+        parti.append(pd.DataFrame({
+            'Foglio': nome_foglio,
+            'Riga nel file': valori.index,
+            'Colonna': colonna,
+            'Valore': valori.astype(str).to_numpy()
+        }))
+    if not parti:
+        return pd.DataFrame(columns=['Foglio', 'Riga nel file', 'Colonna', 'Valore'])
+    return pd.concat(parti, ignore_index=True)
+
+def raggruppa_valori(valori):
+    """
+    Raggruppa i valori non convertiti di una colonna: un valore distinto (come testo) per riga,
+    dal più frequente, con il numero di occorrenze e la prima riga in cui compare.
+    
+    Args:
+        valori: Serie dei valori non convertiti, con l'indice delle righe nel file
+    
+    Returns:
+        DataFrame con colonne Valore, Occorrenze, Prima riga nel file
+    """
+    codici, distinti = pd.factorize(valori.astype(str).to_numpy(), use_na_sentinel=False)
+    occorrenze = np.bincount(codici, minlength=len(distinti))
+    prime = np.full(len(distinti), len(codici))
+    np.minimum.at(prime, codici, np.arange(len(codici)))
+    ordine = np.argsort(-occorrenze, kind='stable')
+    return pd.DataFrame({
+        'Valore': np.asarray(distinti, dtype=object)[ordine],
+        'Occorrenze': occorrenze[ordine],
+        'Prima riga nel file': valori.index.to_numpy()[prime[ordine]] if len(codici) else []
+    })
+
+def normalizza_file(percorso, colonne, percorso_output, formato=FORMATI_OUTPUT["gg-mm-aaaa"], colonna_ordinamento=None,
+                    ordina_date=True, fogli=None, intervalli_numerici=None, motore=None, report_errori=False,
+                    cache_persistente=None, formato_file='xlsx', prestazioni=None, compatta=False, unisci_fogli=False,
+                    chiavi_secondarie=()):
+    """
+    Normalizza le colonne di date di un file e salva il risultato in un nuovo file.
+    
+    Ogni foglio letto viene rilasciato appena elaborato e ogni foglio elaborato appena
+    scritto, così in memoria non restano insieme tutte le versioni di tutti i fogli.
+    
+    Args:
+        percorso: file da leggere (.xlsx, .xls, CSV, Parquet o Feather, riconosciuto dal contenuto)
+        colonne: colonne da normalizzare; i fogli che non ne contengono nessuna vengono saltati
+        percorso_output: file da scrivere; in CSV, Parquet e Feather un percorso .zip riceve un
+                         file per foglio (vedi estensione_file_normalizzato)
+        formato: formato strftime delle date, usato anche come formato delle celle di data
+        colonna_ordinamento: colonna per l'ordinamento (se assente in un foglio, la prima presente)
+        ordina_date: se ordinare cronologicamente
+        fogli: nomi dei fogli da elaborare (default tutti)
+        intervalli_numerici: intervalli per interpretare i numeri (default INTERVALLI_NUMERICI)
+        motore: motore di lettura (default il più veloce installato, vedi scegli_motore)
+        report_errori: se True restituisce anche i valori non convertiti
+        cache_persistente: cache su disco delle date riconosciute valore per valore (vedi normalizza_cache)
+        formato_file: formato del file scritto (vedi FORMATI_FILE_OUTPUT)
+        prestazioni: se indicata, vi vengono registrate lettura, fasi di ogni foglio, export e
+                     picco di memoria (vedi Prestazioni)
+        compatta: se True, le colonne di testo con molti valori ripetuti vengono lette come
+                  categoriche (vedi compatta_stringhe)
+        unisci_fogli: se True i fogli elaborati vengono scritti in un unico foglio FOGLIO_CRONOLOGIA,
+                      in ordine cronologico se ordina_date (vedi unisci_fogli_cronologici),
+                      altrimenti uno dopo l'altro
+        chiavi_secondarie: colonne per ordinare le righe con la stessa data nel foglio unito
+    
+    Returns:
+        Se report_errori=False: dizionario nome del foglio -> statistiche di conversione per colonna
+        Se report_errori=True: tupla (statistiche, errori) dove errori è il DataFrame dei valori
+        non convertiti di tutti i fogli (vedi valori_non_convertiti)
+    
+    Raises:
+        FileNonValido: se nessun foglio contiene le colonne richieste, se un foglio richiesto non
+                       esiste o se più fogli vanno scritti in un unico file CSV, Parquet o Feather
+        ValueError: se manca la libreria per leggere o scrivere il tipo di file
+    """
+    if prestazioni is None:
+        prestazioni = Prestazioni()
+    memoria = CampionatoreMemoria().avvia()
+    try:
+        with prestazioni.misura('lettura'):
+            letti = leggi_fogli_file(percorso, fogli or None, motore, compatta=compatta)
+        
+        # I valori distinti già convertiti vengono riutilizzati tra tutti i fogli del file
+        cache_valori = {}
+        elaborati = {}
+        colonne_ordinamento = {}
+        statistiche = {}
+        errori = []
+        for nome_foglio in list(letti):
+            df = letti.pop(nome_foglio)
+            if not any(colonna in df.columns for colonna in colonne):
+                continue
+            ordinamento = colonna_ordinamento if colonna_ordinamento in df.columns else None
+            df_elaborato, statistiche[nome_foglio], df_date, errori_foglio = normalizza_dataframe(
+                df, colonne, formato, ordinamento, ordina_date, nome_foglio, cache_valori, intervalli_numerici, cache_persistente, prestazioni
+            )
+            elaborati[nome_foglio] = (df_elaborato, df_date)
+            colonne_ordinamento[nome_foglio] = ordinamento or next(colonna for colonna in colonne if colonna in df.columns)
+            if report_errori:
+                errori.append(valori_non_convertiti(df, errori_foglio, nome_foglio))
+        
+        if not elaborati:
+            raise FileNonValido(f"Nessuna delle colonne {', '.join(map(str, colonne))} trovata nei fogli del file")
+        # L'ultimo foglio resterebbe in memoria fino alla fine dell'export
+        del df, df_elaborato, df_date
+        
+        if unisci_fogli:
+            # Senza ordinamento i fogli vengono solo accodati, nel loro ordine
+            with prestazioni.misura('unione'):
+                if ordina_date:
+                    df_unito, df_date_unito, _ = unisci_fogli_cronologici(elaborati, colonne_ordinamento, chiavi_secondarie)
+                else:
+                    df_unito, df_date_unito, _ = unisci_fogli_cronologici(elaborati, None)
+            elaborati = {FOGLIO_CRONOLOGIA: (df_unito, df_date_unito)}
+            del df_unito, df_date_unito
+        
+        with prestazioni.misura('export'):
+            scrivi_file_normalizzato(percorso_output, elaborati, colonne, formato_file, FORMATI_EXCEL.get(formato, "dd/mm/yyyy"),
+                                     archivio=os.fspath(percorso_output).lower().endswith('.zip'), rilascia=True)
+        if report_errori:
+            return statistiche, pd.concat(errori, ignore_index=True)
+        return statistiche
+    finally:
+        memoria.ferma()
+        prestazioni.memoria = memoria.riepilogo()
+
+def tipo_file(contenuto):
+    """
+    Riconosce il formato dai primi byte del contenuto: i .xlsx sono archivi zip, i .xls documenti
+    OLE2, Parquet e Feather hanno una propria firma; tutto il resto viene letto come CSV
+    """
+    if contenuto.startswith(b'PK'):
+        return 'xlsx'
+    if contenuto.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'xls'
+    if contenuto.startswith(b'PAR1'):
+        return 'parquet'
+    if contenuto.startswith((b'ARROW1', b'FEA1')):
+        return 'feather'
+    return 'csv'
+
+def inizio_sorgente(sorgente, byte=8):
+    """Primi byte di un file indicato come percorso oppure come contenuto (bytes)"""
+    if isinstance(sorgente, bytes):
+        return sorgente[:byte]
+    with open(sorgente, 'rb') as f:
+        return f.read(byte)
+
+def opzioni_csv(campione):
+    """Codifica (UTF-8, altrimenti Windows-1252) e separatore di un CSV, riconosciuti dai primi byte"""
+    try:
+        # Il decodificatore incrementale non fallisce su un carattere troncato alla fine del campione
+        testo = codecs.getincrementaldecoder('utf-8-sig')().decode(campione)
+        codifica = 'utf-8'
+    except UnicodeDecodeError:
+        testo = campione.decode('cp1252', errors='replace')
+        codifica = 'cp1252'
+    # L'ultima riga del campione può essere troncata
+    righe = testo.splitlines()
+    try:
+        separatore = csv.Sniffer().sniff("\n".join(righe[:-1] or righe), delimiters=SEPARATORI_CSV).delimiter
+    except csv.Error:
+        separatore = ","
+    return codifica, separatore
+
+def leggi_tabella(sorgente, tipo, motore, righe=None):
+    """
+    Legge l'unico foglio di un file CSV, Parquet o Feather, solo le prime righe se indicate.
+    Il lettore CSV di pyarrow legge il file a blocchi con più thread, ma non si ferma dopo
+    poche righe: per le anteprime viene usato quello di pandas. Le colonne date32 dei Parquet
+    e Feather, come quelle dei file normalizzati, vengono lette come datetime64 e non come
+    oggetti date, che la normalizzazione non riconoscerebbe.
+    """
+    file = io.BytesIO(sorgente) if isinstance(sorgente, bytes) else sorgente
+    if tipo == 'csv':
+        codifica, separatore = opzioni_csv(inizio_sorgente(sorgente, BYTE_CAMPIONE_CSV))
+        if motore == 'pyarrow' and righe is None:
+            return pd.read_csv(file, sep=separatore, encoding=codifica, engine='pyarrow')
+        return pd.read_csv(file, sep=separatore, encoding=codifica, nrows=righe, engine='c')
+    if tipo == 'parquet':
+        if righe is None:
+            return pd.read_parquet(file, engine='pyarrow', to_pandas_kwargs={'date_as_object': False})
+        import pyarrow as pa
+        import pyarrow.parquet
+        parquet = pyarrow.parquet.ParquetFile(file)
+        lotti = list(itertools.islice(parquet.iter_batches(batch_size=max(righe, 1)), 1))
+        return pa.Table.from_batches(lotti, schema=parquet.schema_arrow).to_pandas(date_as_object=False).head(righe)
+    import pyarrow.feather
+    df = pyarrow.feather.read_table(file).to_pandas(date_as_object=False)
+    return df if righe is None else df.head(righe)
+
+def nomi_fogli_file(sorgente, motore=None):
+    """Nomi dei fogli di un file Excel, oppure l'unico foglio FOGLIO_TABELLA di CSV, Parquet e Feather"""
+    inizio = inizio_sorgente(sorgente)
+    if tipo_file(inizio) not in ('xlsx', 'xls'):
+        return [FOGLIO_TABELLA]
+    file = io.BytesIO(sorgente) if isinstance(sorgente, bytes) else sorgente
+    return pd.ExcelFile(file, engine=scegli_motore(inizio, motore)).sheet_names
+
+def compatta_stringhe(df, rapporto_massimo=RAPPORTO_MASSIMO_CATEGORIE):
+    """
+    Converte in categoriche le colonne di solo testo con pochi valori distinti (al più
+    rapporto_massimo × righe): ogni valore ripetuto viene tenuto una volta sola e le righe ne
+    contengono il codice. La conversione delle date, che fattorizza comunque le colonne, ne
+    riusa direttamente i codici.
+    
+    Returns:
+        il DataFrame stesso se nessuna colonna va compattata, altrimenti una copia superficiale
+        con le colonne compattate
+    """
+    compattato = None
+    for posizione in range(df.shape[1]):
+        serie = df.iloc[:, posizione]
+        if (not len(serie) or isinstance(serie.dtype, pd.CategoricalDtype)
+                or pd.api.types.infer_dtype(serie, skipna=True) != 'string'):
+            continue
+        codici, valori = pd.factorize(serie, use_na_sentinel=True)
+        if len(valori) > rapporto_massimo * len(serie):
+            continue
+        if compattato is None:
+            compattato = df.copy(deep=False)
+        compattato.isetitem(posizione, pd.Series(pd.Categorical.from_codes(codici, valori), index=df.index))
+    return df if compattato is None else compattato
+
+def leggi_fogli_file(sorgente, nomi_fogli=None, motore=None, righe=None, compatta=False):
+    """
+    Legge in un'unica passata i fogli indicati di un file Excel, CSV, Parquet o Feather.
+    
+    Args:
+        sorgente: percorso del file oppure il suo contenuto (bytes)
+        nomi_fogli: fogli da leggere (default tutti); CSV, Parquet e Feather hanno il solo FOGLIO_TABELLA
+        motore: motore di lettura (default il più veloce installato, vedi scegli_motore)
+        righe: se indicato, vengono lette solo le prime righe di ogni foglio
+        compatta: se True, le colonne di testo con molti valori ripetuti diventano categoriche
+                  (vedi compatta_stringhe)
+    
+    Returns:
+        dizionario nome del foglio -> DataFrame
+    
+    Raises:
+        ValueError: se manca un motore per il tipo di file
+        FileNonValido: se un foglio non esiste
+    """
+    inizio = inizio_sorgente(sorgente)
+    tipo = tipo_file(inizio)
+    motore = scegli_motore(inizio, motore)
+    if tipo in ('xlsx', 'xls'):
+        file = io.BytesIO(sorgente) if isinstance(sorgente, bytes) else sorgente
+        with pd.ExcelFile(file, engine=motore) as excel:
+            mancanti = [nome for nome in nomi_fogli or () if isinstance(nome, str) and nome not in excel.sheet_names]
+            if mancanti:
+                raise FileNonValido(f"Fogli {', '.join(mancanti)} non trovati nel file")
+            letti = pd.read_excel(excel, sheet_name=None if nomi_fogli is None else list(nomi_fogli), header=0, nrows=righe)
+    else:
+        mancanti = [nome for nome in nomi_fogli or () if nome != FOGLIO_TABELLA]
+        if mancanti:
+            raise FileNonValido(f"I file {tipo} hanno solo il foglio '{FOGLIO_TABELLA}': fogli {', '.join(map(str, mancanti))} non trovati")
+        letti = {FOGLIO_TABELLA: leggi_tabella(sorgente, tipo, motore, righe)}
+    if compatta:
+        letti = {nome: compatta_stringhe(df) for nome, df in letti.items()}
+    return letti
+
+def motori_disponibili(tipo_file):
+    """Motori installati che leggono il tipo di file indicato, in ordine di preferenza"""
+    return [nome for nome, (modulo, tipi) in MOTORI_LETTURA.items()
+            if tipo_file in tipi and importlib.util.find_spec(modulo) is not None]
+
+def scegli_motore(contenuto, preferito=None):
+    """
+    Sceglie il motore di lettura per il file: quello preferito se installato e adatto
+    al tipo di file, altrimenti il più veloce disponibile.
+    
+    Raises:
+        ValueError: se nessun motore installato legge questo tipo di file
+    """
+    tipo = tipo_file(contenuto)
+    disponibili = motori_disponibili(tipo)
+    if preferito in disponibili:
+        return preferito
+    if not disponibili:
+        moduli = ", ".join(modulo for modulo, tipi in MOTORI_LETTURA.values() if tipo in tipi)
+        raise ValueError(f"Nessun motore installato per leggere i file .{tipo} (installa uno tra: {moduli})")
+    return disponibili[0]
+
+def leggi_blocchi_foglio(contenuto, nome_foglio, righe_blocco=RIGHE_BLOCCO_STREAMING, motore=None):
+    """
+    Legge un foglio a blocchi di righe senza caricarlo tutto in memoria.
+    
+    I file .xlsx vengono letti riga per riga con openpyxl in sola lettura, i CSV a blocchi
+    con il lettore di pandas e i Parquet un gruppo di righe alla volta; i vecchi .xls e i
+    Feather vengono letti interi e poi suddivisi. Il primo blocco viene restituito sempre,
+    anche vuoto, perché contiene le intestazioni del foglio.
+    
+    Yields:
+        DataFrame con le righe del blocco, intestati con la prima riga del foglio
+    """
+    tipo = tipo_file(contenuto)
+    if tipo in ('csv', 'parquet'):
+        if nome_foglio != FOGLIO_TABELLA:
+            raise FileNonValido(f"I file {tipo} hanno solo il foglio '{FOGLIO_TABELLA}'")
+        if tipo == 'csv':
+            codifica, separatore = opzioni_csv(contenuto[:BYTE_CAMPIONE_CSV])
+            blocchi = pd.read_csv(io.BytesIO(contenuto), sep=separatore, encoding=codifica, chunksize=righe_blocco, engine='c')
+        else:
+            import pyarrow.parquet
+            blocchi = (lotto.to_pandas(date_as_object=False) for lotto in pyarrow.parquet.ParquetFile(io.BytesIO(contenuto)).iter_batches(batch_size=righe_blocco))
+        primo = True
+        for blocco in blocchi:
+            yield blocco
+            primo = False
+        if primo:
+            yield leggi_tabella(contenuto, tipo, motore, righe=0)
+        return
+    
+    if tipo != 'xlsx':
+        df = leggi_fogli_file(contenuto, [nome_foglio], motore)[nome_foglio]
+        yield df.iloc[:righe_blocco]
+        for inizio in range(righe_blocco, len(df), righe_blocco):
+            yield df.iloc[inizio:inizio + righe_blocco]
+        return
+    
+    import openpyxl
+    libro = openpyxl.load_workbook(io.BytesIO(contenuto), read_only=True, data_only=True)
+    try:
+        righe = libro[nome_foglio].iter_rows(values_only=True)
+        intestazione = next(righe, None) or ()
+        
+        # Intestazioni mancanti o ripetute rinominate come fa pandas
+        colonne = []
+        for i, nome in enumerate(intestazione):
+            nome = f"Unnamed: {i}" if nome is None else nome
+            nome_base, ripetizioni = nome, 0
+            while nome in colonne:
+                ripetizioni += 1
+                nome = f"{nome_base}.{ripetizioni}"
+            colonne.append(nome)
+        
+        # Le righe vuote vengono tenute solo se seguite da righe con valori (come in read_excel)
+        blocco, righe_vuote, primo = [], 0, True
+        for riga in righe:
+            if all(valore is None for valore in riga):
+                righe_vuote += 1
+                continue
+            blocco.extend([(None,) * len(colonne)] * righe_vuote)
+            righe_vuote = 0
+            blocco.append(riga[:len(colonne)])
+            if len(blocco) >= righe_blocco:
+                yield pd.DataFrame(blocco, columns=colonne)
+                blocco, primo = [], False
+        if blocco or primo:
+            yield pd.DataFrame(blocco, columns=colonne)
+    finally:
+        libro.close()
+
+def leggi_sequenza_ordinata(percorso):
+    """Rilegge una sequenza ordinata scritta su disco, un sotto-blocco alla volta"""
+    with open(percorso, 'rb') as f:
+        while True:
+            try:
+                sotto_blocco = pickle.load(f)
+            except EOFError:
+                return
+            yield from sotto_blocco
+
+def elabora_foglio_streaming(contenuto, nome_foglio, colonne_selezionate, colonna_ordinamento, ordina_date,
+                             libro, libro_errori, cache_valori=None, intervalli_numerici=None, avanzamento=None, motore=None,
+                             cache_persistente=None, prestazioni=None):
+    """
+    Normalizza un foglio a blocchi di righe, scrivendo il risultato direttamente su un
+    workbook xlsxwriter in modalità constant_memory: la memoria usata non dipende dal
+    numero di righe.
+    
+    Con l'ordinamento cronologico ogni blocco viene ordinato e scritto su disco come
+    sequenza; le sequenze vengono poi fuse (merge sort esterno) durante la scrittura.
+    
+    Args:
+        contenuto: contenuto del file Excel
+        nome_foglio: foglio da elaborare
+        colonne_selezionate: colonne da normalizzare
+        colonna_ordinamento: colonna da usare per l'ordinamento
+        ordina_date: se ordinare cronologicamente
+        libro: workbook xlsxwriter del file normalizzato
+        libro_errori: workbook xlsxwriter delle righe con date non convertite
+        cache_valori: dizionario valore -> data condiviso tra blocchi e fogli
+        intervalli_numerici: intervalli per i numeri da interpretare come date
+        avanzamento: funzione chiamata con il numero di righe elaborate dopo ogni blocco
+        motore: motore di lettura per i file .xls (i .xlsx vengono letti a blocchi con openpyxl)
+        cache_persistente: cache su disco delle date riconosciute valore per valore (vedi normalizza_cache)
+        prestazioni: se indicata, vi vengono registrate lettura, conversione e il resto
+                     dell'elaborazione (ordinamento e scrittura) del foglio (vedi Prestazioni)
+    
+    Returns:
+        statistiche di conversione per colonna (vuote se nessuna colonna esiste nel foglio),
+        con in più date minima/massima e numero di righe con errori
+    """
+    if cache_valori is None:
+        cache_valori = {}
+    inizio_foglio = time.perf_counter()
+    secondi_lettura = 0.0
+    
+    statistiche = {}
+    nome_sheet = nome_foglio[:31]
+    foglio = foglio_errori = None
+    righe_scritte = righe_errori = righe_elaborate = 0
+    
+    def scrivi(riga, originale):
+        nonlocal righe_scritte, righe_errori, foglio_errori
+        righe_scritte += 1
+        foglio.write_row(righe_scritte, 0, riga)
+        if originale is not None:
+            if foglio_errori is None:
+                foglio_errori = libro_errori.add_worksheet(f"Errori_{nome_foglio}"[:31])
+                foglio_errori.write_row(0, 0, colonne)
+            righe_errori += 1
+            foglio_errori.write_row(righe_errori, 0, originale)
+    
+    with tempfile.TemporaryDirectory() as cartella_sequenze:
+        sequenze = []
+        blocchi = leggi_blocchi_foglio(contenuto, nome_foglio, RIGHE_BLOCCO_STREAMING, motore)
+        while True:
+            # La lettura avviene a ogni blocco richiesto al generatore
+            inizio = time.perf_counter()
+            blocco = next(blocchi, None)
+            secondi_lettura += time.perf_counter() - inizio
+            if blocco is None:
+                break
+            if foglio is None:
+                colonne = list(blocco.columns)
+                colonne_esistenti = [colonna for colonna in colonne_selezionate if colonna in colonne]
+                if not colonne_esistenti:
+                    return statistiche
+                ordina = ordina_date and colonna_ordinamento in colonne_esistenti
+                foglio = libro.add_worksheet(nome_sheet)
+                foglio.write_row(0, 0, colonne)
+                for i, colonna in enumerate(colonne):
+                    if colonna in colonne_esistenti:
+                        foglio.set_column(i, i, 15)
+            
+            # Ricordare tutti i valori distinti di un file enorme annullerebbe il limite di memoria
+            if len(cache_valori) > MAX_VALORI_CACHE_STREAMING:
+                cache_valori.clear()
+            
+            # Valori originali (per le righe con errori) e valori da esportare, senza NaN
+            originali = blocco.astype(object).where(blocco.notna(), None)
+            export = originali.copy(deep=False)
+            errori = np.zeros(len(blocco), dtype=bool)
+            chiavi = None
+            
+            for colonna in colonne_esistenti:
+                date_convertite, convertite, info_formati = normalizza_colonna(blocco[colonna], cache_valori, intervalli_numerici,
+                                                                                cache_persistente=cache_persistente)
+                errori |= ~convertite.to_numpy()
+                export[colonna] = date_convertite.astype(object).where(convertite, None)
+                if colonna == colonna_ordinamento:
+                    chiavi = date_convertite.to_numpy().view('i8').copy()
+                    chiavi[date_convertite.isna().to_numpy()] = np.iinfo(np.int64).max  # date mancanti in fondo
+                
+                # Le statistiche si accumulano blocco per blocco
+                stats = statistiche.setdefault(colonna, {
+                    'convertiti': 0, 'totali': 0, 'foglio': nome_foglio, 'formati_inferiti': [],
+                    'convertiti_in_blocco': 0, 'valori_distinti': 0, 'valori_da_cache': 0, 'valori_da_cache_persistente': 0,
+                    'conversione_riutilizzata': False, 'data_minima': None, 'data_massima': None,
+                    'secondi_conversione': 0.0, 'percorsi': {}
+                })
+                stats['convertiti'] += int(convertite.sum())
+                stats['totali'] += len(blocco)
+                stats['formati_inferiti'] += [formato for formato in info_formati['formati_inferiti'] if formato not in stats['formati_inferiti']]
+                stats['convertiti_in_blocco'] += info_formati['convertiti_in_blocco']
+                stats['valori_distinti'] += info_formati['valori_distinti']
+                stats['valori_da_cache'] += info_formati['valori_da_cache']
+                stats['valori_da_cache_persistente'] += info_formati['valori_da_cache_persistente']
+                stats['secondi_conversione'] += info_formati['secondi']
+                for percorso, voce in info_formati['percorsi'].items():
+                    conta_percorso(stats['percorsi'], percorso, voce['valori'], voce['secondi'])
+                if convertite.any():
+                    minima, massima = date_convertite.min(), date_convertite.max()
+                    stats['data_minima'] = minima if stats['data_minima'] is None else min(stats['data_minima'], minima)
+                    stats['data_massima'] = massima if stats['data_massima'] is None else max(stats['data_massima'], massima)
+            
+            righe = export.itertuples(index=False, name=None)
+            righe_originali = (riga if errore else None for riga, errore in zip(originali.itertuples(index=False, name=None), errori))
+            if ordina:
+                # Blocco ordinato (in modo stabile) e salvato su disco a sotto-blocchi
+                ordine = np.argsort(chiavi, kind='stable')
+                elementi = list(zip(chiavi.tolist(), righe, righe_originali))
+                percorso = os.path.join(cartella_sequenze, f"sequenza_{len(sequenze)}.pkl")
+                with open(percorso, 'wb') as f:
+                    for inizio in range(0, len(ordine), RIGHE_BLOCCO_FUSIONE):
+                        pickle.dump([elementi[i] for i in ordine[inizio:inizio + RIGHE_BLOCCO_FUSIONE]], f, pickle.HIGHEST_PROTOCOL)
+                sequenze.append(percorso)
+                del elementi
+            else:
+                for riga, originale in zip(righe, righe_originali):
+                    scrivi(riga, originale)
+            
+            righe_elaborate += len(blocco)
+            if avanzamento is not None:
+                avanzamento(righe_elaborate)
+        
+        if ordina:
+            # Fusione delle sequenze: a parità di data vince la sequenza precedente, quindi resta stabile
+            for _, riga, originale in heapq.merge(*[leggi_sequenza_ordinata(percorso) for percorso in sequenze], key=itemgetter(0)):
+                scrivi(riga, originale)
+    
+    for stats in statistiche.values():
+        stats['percentuale'] = stats['convertiti'] / stats['totali'] * 100 if stats['totali'] else 100.0
+        stats['rapporto_distinti'] = stats['valori_distinti'] / stats['totali'] if stats['totali'] else 0.0
+        stats['righe_con_errori'] = righe_errori
+    
+    if prestazioni is not None and statistiche:
+        prestazioni.aggiungi('lettura', secondi_lettura, nome_foglio)
+        prestazioni.aggiungi_statistiche(statistiche)
+        secondi_conversione = sum(stats['secondi_conversione'] for stats in statistiche.values())
+        prestazioni.aggiungi('ordinamento e scrittura', time.perf_counter() - inizio_foglio - secondi_lettura - secondi_conversione,
+                             nome_foglio)
+    
+    return statistiche
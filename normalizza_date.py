@@ -1,236 +1,782 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-import io
 import numpy as np
-from dateutil import parser
+import io
+import hashlib
+import importlib.util
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+from normalizza_core import (
+    FORMATI_OUTPUT, FORMATI_FILE_OUTPUT, INTERVALLI_NUMERICI, MOTORI_LETTURA, RIGHE_BLOCCO_STREAMING, RAPPORTO_MASSIMO_CATEGORIE,
+    MAX_RIGHE_EXCEL, FOGLIO_CRONOLOGIA, COLONNA_FOGLIO_ORIGINE,
+    normalizza_colonna, normalizza_foglio, normalizza_file, inizializza_processo, prepara_foglio, senza_modulo_principale,
+    tipo_file, scegli_motore, elabora_foglio_streaming, rileva_colonne_date, raggruppa_valori,
+    nomi_fogli_file, leggi_fogli_file, scrivi_file_normalizzato, estensione_file_normalizzato, Prestazioni, CampionatoreMemoria,
+    unisci_fogli_cronologici, posizioni_unite
+)
+from normalizza_cache import CacheDatePersistente, PERCORSO_PREDEFINITO
+from normalizza_lavori import GestoreLavori, ServerOccupato, LavoroAnnullato, IN_CODA, ANNULLATO, FALLITO
+
+logger = logging.getLogger(__name__)
+
+# Righe lette per l'anteprima prima che l'utente confermi l'elaborazione
+RIGHE_ANTEPRIMA = 100
+
+# Memoria massima (in MB) occupata dai fogli letti e tenuti in cache tra un rerun e l'altro
+LIMITE_CACHE_FOGLI_MB = 512
+# Memoria massima (in MB) occupata dalle colonne di date già convertite
+LIMITE_CACHE_COLONNE_MB = 256
+
+# Righe per pagina delle tabelle lunghe (risultato, valori problematici, righe con errori):
+# al browser arriva solo la pagina richiesta, qualunque sia la dimensione della tabella
+RIGHE_PER_PAGINA = 50
+
+# File scaricabili (normalizzato e righe con errori) oltre i quali la scrittura passa dalla
+# memoria a un file temporaneo su disco
+MB_EXPORT_IN_MEMORIA = 64
+
+# Processi paralleli proposti di default per "Elabora tutti i fogli" e per più file
+PROCESSI_PREDEFINITI = min(4, os.cpu_count() or 1)
+
+# Lavori in background eseguiti insieme da tutto il server, lavori attivi (in esecuzione o
+# in coda) oltre i quali i nuovi vengono rifiutati, e intervallo (in secondi) tra due
+# aggiornamenti della barra di avanzamento
+LAVORI_SIMULTANEI = 2
+MAX_LAVORI_ATTIVI = 8
+INTERVALLO_AGGIORNAMENTO = 0.25
+
+# File e voci massime della cache persistente delle date (testo -> data), condivisa tra
+# sessioni e riavvii; oltre il massimo vengono scartate le voci usate meno di recente
+PERCORSO_CACHE_DATE = PERCORSO_PREDEFINITO
+MAX_VOCI_CACHE_DATE = 500000
 
 st.set_page_config(page_title="Normalizzazione Date in Excel", layout="wide")
 st.title("Normalizzazione Date in Excel")
-st.write("Carica un file Excel per convertire le date nel formato desiderato e ordinare i dati cronologicamente")
+st.write("Carica un file Excel (oppure CSV, Parquet o Feather) per convertire le date nel formato desiderato e ordinare i dati cronologicamente")
 st.write("✨ **Novità**: Puoi selezionare una o più colonne da normalizzare!")
 
-def normalizza_data(data, solo_formato=False):
+def chiave_colonna_cache(chiave_foglio, colonna, intervalli_numerici=None):
+    """Chiave di una colonna convertita nella cache delle colonne: le opzioni di parsing ne fanno parte"""
+    opzioni_parsing = tuple((intervalli_numerici if intervalli_numerici is not None else INTERVALLI_NUMERICI).items())
+    return (chiave_foglio, colonna, opzioni_parsing)
+
+def mostra_tabella_paginata(df, chiave, righe_per_pagina=RIGHE_PER_PAGINA, **opzioni):
     """
-    Funzione che normalizza le date in vari formati.
-    
-    Args:
-        data: Il valore da normalizzare
-        solo_formato: Se True, restituisce solo la stringa formattata. 
-                     Se False, restituisce anche l'oggetto datetime per l'ordinamento.
-    
-    Returns:
-        Se solo_formato=True: stringa in formato 'dd-mm-yyyy'
-        Se solo_formato=False: tupla (stringa formattata, oggetto datetime)
+    Mostra una tabella una pagina alla volta: il DataFrame viene tagliato qui e al browser arrivano
+    al più righe_per_pagina righe per rerun. chiave distingue il selettore di pagina di ogni tabella.
     """
-    try:
-        # Prova diverse interpretazioni della data
-        formati = [
-            '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', 
-            '%d-%m-%Y', '%m-%d-%Y', '%Y/%m/%d',
-            '%d.%m.%Y', '%m.%d.%Y', '%Y.%m.%d',
-            '%d %b %Y', '%d %B %Y', '%b %d, %Y', '%B %d, %Y',
-            '%Y%m%d', '%d-%b-%Y', '%d-%B-%Y',
-            '%a, %d %b %Y', '%A, %d %b %Y', '%A, %d %B %Y',
-            '%A %d %B %Y'  # Formato italiano: "giovedì 12 giugno 2025"
-        ]
-        
-        dt_obj = None
-        
-        # Se è già un datetime o timestamp pandas, lo usiamo direttamente
-        if isinstance(data, (pd.Timestamp, datetime)):
-            dt_obj = data
-            formatted = data.strftime('%d-%m-%Y')
-        
-        # Se è una stringa, proviamo a interpretarla
-        elif isinstance(data, str):
-            # Puliamo la stringa
-            data = data.strip()
-            
-            # Prima proviamo con formati specifici
-            for formato in formati:
-                try:
-                    dt_obj = datetime.strptime(data, formato)
-                    formatted = dt_obj.strftime('%d-%m-%Y')
-                    break
-                except ValueError:
-                    continue
-            
-            # Se non funziona, proviamo con dateutil.parser che è più flessibile
-            if dt_obj is None:
-                try:
-                    # Per i formati italiani, sostituiamo i nomi dei mesi in inglese
-                    data_temp = data
-                    mesi_it_to_en = {
-                        'gennaio': 'January', 'febbraio': 'February', 'marzo': 'March',
-                        'aprile': 'April', 'maggio': 'May', 'giugno': 'June',
-                        'luglio': 'July', 'agosto': 'August', 'settembre': 'September',
-                        'ottobre': 'October', 'novembre': 'November', 'dicembre': 'December'
-                    }
-                    giorni_it_to_en = {
-                        'lunedì': 'Monday', 'martedì': 'Tuesday', 'mercoledì': 'Wednesday',
-                        'giovedì': 'Thursday', 'venerdì': 'Friday', 'sabato': 'Saturday',
-                        'domenica': 'Sunday'
-                    }
-                    
-                    # Sostituiamo i nomi dei mesi italiani con quelli inglesi
-                    for mese_it, mese_en in mesi_it_to_en.items():
-                        if mese_it in data_temp.lower():
-                            data_temp = data_temp.lower().replace(mese_it, mese_en).capitalize()
-                            break
-                    
-                    # Sostituiamo i nomi dei giorni italiani con quelli inglesi
-                    for giorno_it, giorno_en in giorni_it_to_en.items():
-                        if giorno_it in data_temp.lower():
-                            data_temp = data_temp.lower().replace(giorno_it, giorno_en).capitalize()
-                            break
-                    
-                    # Proviamo prima con la data modificata se è stata fatta una sostituzione
-                    if data_temp != data:
-                        try:
-                            dt_obj = parser.parse(data_temp, dayfirst=True)
-                            formatted = dt_obj.strftime('%d-%m-%Y')
-                        except:
-                            # Se fallisce, proviamo con la data originale
-                            dt_obj = parser.parse(data, dayfirst=True)  # Assumiamo giorno prima del mese per ambiguità
-                            formatted = dt_obj.strftime('%d-%m-%Y')
-                    else:
-                        # Se non ci sono state sostituzioni, usiamo la data originale
-                        dt_obj = parser.parse(data, dayfirst=True)  # Assumiamo giorno prima del mese per ambiguità
-                        formatted = dt_obj.strftime('%d-%m-%Y')
-                except:
-                    pass
-        
-        # Se è un numero, potrebbe essere un timestamp Excel
-        elif isinstance(data, (int, float)) and not np.isnan(data):
-            try:
-                dt_obj = pd.Timestamp.fromordinal(pd.Timestamp('1899-12-30').to_ordinal() + int(data))
-                formatted = dt_obj.strftime('%d-%m-%Y')
-            except:
-                try:
-                    # Potrebbe essere un timestamp UNIX (in secondi)
-                    dt_obj = datetime.fromtimestamp(data)
-                    formatted = dt_obj.strftime('%d-%m-%Y')
-                except:
-                    pass
-        
-        # Se abbiamo trovato un oggetto datetime valido
-        if dt_obj is not None:
-            if solo_formato:
-                return formatted
-            else:
-                return formatted, dt_obj
-        
-        # Se non siamo riusciti a interpretare, restituiamo il valore originale
-        if solo_formato:
-            return data
-        else:
-            return data, None
-            
-    except Exception as e:
-        if solo_formato:
-            return data
-        else:
-            return data, None
+    pagine = max(1, -(-len(df) // righe_per_pagina))
+    pagina = 1
+    if pagine > 1:
+        # Con un numero di righe diverso il selettore riparte dalla prima pagina
+        pagina = st.number_input(f"Pagina (di {pagine})", min_value=1, max_value=pagine, value=1, step=1,
+                                 key=f"pagina_{chiave}_{len(df)}")
+    inizio = (pagina - 1) * righe_per_pagina
+    st.dataframe(df.iloc[inizio:inizio + righe_per_pagina], **opzioni)
+    if pagine > 1:
+        st.caption(f"Righe {inizio + 1}-{min(inizio + righe_per_pagina, len(df))} di {len(df)}")
+
+def contenuto_temporaneo(file):
+    """Contenuto di un file temporaneo appena scritto, da passare a st.download_button"""
+    file.seek(0)
+    return file.read()
+
+def registra_prestazioni(prestazioni, descrizione):
+    """Scrive nel log il riepilogo delle prestazioni come una riga JSON, per il monitoraggio"""
+    logger.info("Prestazioni %s: %s", descrizione, json.dumps(prestazioni.riepilogo(), ensure_ascii=False))
+
+def mostra_prestazioni(prestazioni):
+    """
+    Pannello "Prestazioni" dell'elaborazione appena eseguita: tempo per fase e foglio e, per la
+    conversione, valori e costo medio di ogni percorso (vedi Prestazioni), scaricabili in JSON
+    """
+    riepilogo = prestazioni.riepilogo()
+    totale = riepilogo['secondi_totali']
+    memoria = riepilogo['memoria']
+    picco = f", picco {memoria['picco_mb']:.0f} MB" if memoria else ""
+    with st.expander(f"⏱️ Prestazioni ({totale:.2f} s{picco})"):
+        if memoria:
+            st.caption(f"💾 Memoria del server: {memoria['iniziale_mb']:.0f} MB all'inizio, picco {memoria['picco_mb']:.0f} MB "
+                       f"(+{memoria['aumento_mb']:.0f} MB), comprese le altre sessioni attive ed esclusi i processi paralleli")
+        if not riepilogo['fasi']:
+            st.write("Nessuna fase eseguita: tutto è stato ripreso dalle cache.")
+            return
+        st.write("**Tempo per fase e foglio**")
+        fasi = pd.DataFrame(riepilogo['fasi'])
+        st.dataframe(pd.DataFrame({
+            'Fase': fasi['fase'],
+            'Foglio': fasi['foglio'].replace('', '—'),
+            'Secondi': fasi['secondi'].round(3),
+            'Quota': (fasi['secondi'] / totale).map('{:.1%}'.format) if totale > 0 else '',
+        }), hide_index=True)
+        if riepilogo['percorsi']:
+            st.write("**Percorsi di conversione** (valori distinti convertiti da ogni percorso, dal più costoso)")
+            percorsi = pd.DataFrame(riepilogo['percorsi'])
+            st.dataframe(pd.DataFrame({
+                'Percorso': percorsi['percorso'],
+                'Valori': percorsi['valori'],
+                'Secondi': percorsi['secondi'].round(4),
+                'µs per valore': percorsi['microsecondi_per_valore'].round(1),
+            }), hide_index=True)
+            st.caption("Le conversioni riprese dalla cache delle colonne non vengono ripetute e non compaiono qui. "
+                       "Per le colonne numeriche i valori sono tutti i numeri, non solo i distinti.")
+        st.download_button("📄 Scarica le prestazioni in JSON", data=json.dumps(riepilogo, indent=2, ensure_ascii=False),
+                           file_name="prestazioni.json", mime="application/json")
 
-def elabora_foglio(df, colonne_selezionate, colonna_ordinamento, ordina_date, formato_output, formati_output, nome_foglio=""):
+def elabora_foglio(df, colonne_selezionate, colonna_ordinamento, ordina_date, formato_output, formati_output, nome_foglio="", cache_valori=None, intervalli_numerici=None, cache_colonne=None, chiave_foglio=None, conversioni=None, cache_persistente=None, prestazioni=None):
     """
     Funzione per elaborare un singolo foglio di Excel
     
+    Args:
+        cache_valori: Dizionario dei valori già convertiti, condiviso tra colonne e fogli.
+                      Se None ne viene creato uno valido per il solo foglio.
+        intervalli_numerici: Intervalli per interpretare i numeri come date (default INTERVALLI_NUMERICI)
+        cache_colonne: CacheLRU delle colonne già convertite; se indicata insieme a chiave_foglio,
+                       un cambio di formato o di ordinamento non ripete la conversione
+        chiave_foglio: Identificativo del foglio nella cache (es. hash del file e nome del foglio)
+        conversioni: Colonne già convertite altrove (ad esempio da un processo parallelo),
+                     colonna -> (date, convertite, info); vengono salvate nella cache delle colonne
+        cache_persistente: Cache su disco delle date riconosciute valore per valore (vedi normalizza_cache)
+        prestazioni: Prestazioni in cui registrare le fasi del foglio (vedi normalizza_foglio)
+    
     Returns:
-        df_elaborato, statistiche_conversione, df_temp_con_oggetti_data
+        df_elaborato, statistiche_conversione, df_date, errori (vedi normalizza_foglio)
     """
-    # Creiamo una copia del dataframe per le modifiche
-    df_temp = df.copy()
-    
-    # Dizionario per memorizzare le statistiche di conversione per ogni colonna
-    statistiche_conversione = {}
+    # I valori distinti già convertiti vengono riutilizzati tra le colonne
+    if cache_valori is None:
+        cache_valori = {}
+    if conversioni is None:
+        conversioni = {}
     
     prefisso_nome = f" ({nome_foglio})" if nome_foglio else ""
+    formato_selezionato = formati_output[formato_output]
+    usa_cache = cache_colonne is not None and chiave_foglio is not None
     
-    # Normalizzazione per ogni colonna selezionata
+    # Conversione delle colonne: riutilizziamo quelle già convertite, le altre vengono
+    # convertite ora convertendo una sola volta ogni valore distinto
+    conversioni_foglio = {}
+    colonne_riutilizzate = set()
     for colonna_date in colonne_selezionate:
-        if colonna_date not in df_temp.columns:
+        if colonna_date not in df.columns:
             st.warning(f"⚠️ Colonna '{colonna_date}' non trovata nel foglio{prefisso_nome}. Saltata.")
             continue
-            
+        
+        chiave_colonna = chiave_colonna_cache(chiave_foglio, colonna_date, intervalli_numerici)
+        risultato = conversioni.get(colonna_date)
+        if risultato is None and usa_cache:
+            risultato = cache_colonne.get(chiave_colonna)
+            if risultato is not None:
+                colonne_riutilizzate.add(colonna_date)
+        if risultato is None:
+            risultato = normalizza_colonna(df[colonna_date], cache_valori, intervalli_numerici, cache_persistente=cache_persistente)
+        if usa_cache and colonna_date not in colonne_riutilizzate:
+            date_convertite, convertite, _ = risultato
+            cache_colonne.put(chiave_colonna, risultato, int(date_convertite.memory_usage() + convertite.memory_usage()))
+        conversioni_foglio[colonna_date] = risultato
+    
+    df_temp, statistiche_conversione, df_date, errori = normalizza_foglio(
+        df, conversioni_foglio, colonna_ordinamento, ordina_date, formato_selezionato, nome_foglio, colonne_riutilizzate, prestazioni
+    )
+    
+    # Esito della normalizzazione per ogni colonna
+    for colonna_date, (_, _, info_formati) in conversioni_foglio.items():
         if nome_foglio:
             st.write(f"### Normalizzazione colonna '{colonna_date}' - Foglio '{nome_foglio}'")
         else:
             st.write(f"### Normalizzazione colonna: '{colonna_date}'")
         
-        # Normalizzazione e conversione (solo sui dati, non sulle etichette)
-        risultati = df_temp[colonna_date].apply(normalizza_data)
+        if colonna_date in colonne_riutilizzate:
+            st.write(f"♻️ Conversione di '{colonna_date}'{prefisso_nome} riutilizzata: nessun nuovo parsing")
         
-        # Separiamo la stringa formattata e l'oggetto datetime
-        if len(df_temp) > 0 and isinstance(risultati.iloc[0], tuple):
-            df_temp[f'_data_formattata_{colonna_date}'] = risultati.apply(lambda x: x[0] if isinstance(x, tuple) else x)
-            df_temp[f'_data_oggetto_{colonna_date}'] = risultati.apply(lambda x: x[1] if isinstance(x, tuple) and x[1] is not None else pd.NaT)
-            
-            # Contiamo quanti valori sono stati convertiti correttamente
-            num_convertiti = (~df_temp[f'_data_oggetto_{colonna_date}'].isna()).sum()
-            perc_convertiti = (num_convertiti / len(df_temp)) * 100 if len(df_temp) > 0 else 0
-            
-            # Salviamo le statistiche
-            statistiche_conversione[colonna_date] = {
-                'convertiti': num_convertiti,
-                'totali': len(df_temp),
-                'percentuale': perc_convertiti,
-                'foglio': nome_foglio
-            }
-            
-            st.write(f"**Stato conversione per '{colonna_date}'{prefisso_nome}:** {num_convertiti} su {len(df_temp)} date convertite correttamente ({perc_convertiti:.1f}%)")
+        if len(df) == 0:
+            continue
+        
+        stats = statistiche_conversione[colonna_date]
+        num_convertiti, perc_convertiti = stats['convertiti'], stats['percentuale']
+        st.write(f"**Stato conversione per '{colonna_date}'{prefisso_nome}:** {num_convertiti} su {len(df)} date convertite correttamente ({perc_convertiti:.1f}%)")
+        if info_formati['formati_inferiti']:
+            st.write(f"**Formato rilevato per '{colonna_date}'{prefisso_nome}:** {', '.join(info_formati['formati_inferiti'])} "
+                     f"({info_formati['convertiti_in_blocco']} valori distinti convertiti in blocco)")
+        elif info_formati['valori_da_cache'] == info_formati['valori_distinti']:
+            st.write(f"**Formato rilevato per '{colonna_date}'{prefisso_nome}:** tutti i valori erano già stati convertiti in precedenza")
+        else:
+            st.write(f"**Formato rilevato per '{colonna_date}'{prefisso_nome}:** nessun formato dominante, conversione valore per valore")
+        st.write(f"**Valori distinti in '{colonna_date}'{prefisso_nome}:** {info_formati['valori_distinti']} su {len(df)} "
+                 f"({stats['rapporto_distinti']:.1%}), di cui {info_formati['valori_da_cache']} già convertiti in precedenza")
+        if info_formati['valori_da_cache_persistente']:
+            st.write(f"💾 {info_formati['valori_da_cache_persistente']} valori di '{colonna_date}'{prefisso_nome} "
+                     "ripresi dalla cache persistente delle date")
+        
+        if perc_convertiti < 100:
+            st.warning(f"Alcune date nella colonna '{colonna_date}'{prefisso_nome} ({len(df) - num_convertiti}) non sono state convertite correttamente.")
             
-            if perc_convertiti < 100:
-                st.warning(f"Alcune date nella colonna '{colonna_date}'{prefisso_nome} ({len(df_temp) - num_convertiti}) non sono state convertite correttamente.")
-                
-                # Mostriamo i valori problematici per questa colonna
-                problematici = df_temp[df_temp[f'_data_oggetto_{colonna_date}'].isna()][[colonna_date]]
-                if not problematici.empty:
-                    with st.expander(f"Mostra valori problematici per '{colonna_date}'{prefisso_nome} ({len(problematici)} record)"):
+            # Mostriamo i valori problematici per questa colonna, selezionati per posizione dalla mappa degli errori
+            problematici = df[colonna_date].iloc[np.flatnonzero(errori.colonna(colonna_date))]
+            if not problematici.empty:
+                with st.expander(f"Mostra valori problematici per '{colonna_date}'{prefisso_nome} ({len(problematici)} record)"):
+                    st.write(f"**Date non riconosciute nella colonna '{colonna_date}'{prefisso_nome}:**")
+                    chiave_tabella = f"problematici_{nome_foglio}_{colonna_date}"
+                    vista = st.radio("Vista", ["Righe", "Valori distinti"], horizontal=True, key=f"vista_{chiave_tabella}",
+                                     help="Valori distinti raggruppa le righe per valore, dal più frequente")
+                    if vista == "Valori distinti":
+                        mostra_tabella_paginata(raggruppa_valori(problematici), f"{chiave_tabella}_distinti", hide_index=True)
+                    else:
                         # Aggiunge un indice per identificare le righe problematiche
-                        problematici = problematici.reset_index().rename(columns={"index": "Riga nel file"})
-                        st.write(f"**Date non riconosciute nella colonna '{colonna_date}'{prefisso_nome}:**")
-                        st.dataframe(problematici)
-            
-            # Applichiamo il formato di output scelto per questa colonna
-            formato_selezionato = formati_output[formato_output]
-            
-            # Funzione helper per applicare il formato
-            def applica_formato(row):
-                data_obj = row[f'_data_oggetto_{colonna_date}']
-                data_formattata = row[f'_data_formattata_{colonna_date}']
-                
-                if pd.notna(data_obj):
-                    return data_obj.strftime(formato_selezionato)
+                        problematici = problematici.to_frame().reset_index().rename(columns={"index": "Riga nel file"})
+                        mostra_tabella_paginata(problematici, chiave_tabella, hide_index=True)
+    
+    if ordina_date and colonna_ordinamento in df_date.columns and statistiche_conversione[colonna_ordinamento]['percentuale'] > 0:
+        st.write(f"Ordinamento dati in ordine cronologico basato sulla colonna '{colonna_ordinamento}'{prefisso_nome}...")
+    
+    return df_temp, statistiche_conversione, df_date, errori
+
+class CacheLRU:
+    """
+    Cache LRU con un limite di memoria complessivo: quando la memoria occupata supera
+    il limite vengono scartati gli elementi usati meno di recente.
+    """
+    
+    def __init__(self, limite_mb):
+        self.limite_byte = limite_mb * 1024 * 1024
+        self.byte_usati = 0
+        self.elementi = OrderedDict()
+        self.hit = 0
+        self.miss = 0
+        self.lock = threading.Lock()
+    
+    def __contains__(self, chiave):
+        """Verifica la presenza di un elemento senza contarla come hit o miss"""
+        with self.lock:
+            return chiave in self.elementi
+    
+    def guarda(self, chiave):
+        """Restituisce l'elemento in cache oppure None, senza contarlo come hit o miss né segnarlo come usato"""
+        with self.lock:
+            elemento = self.elementi.get(chiave)
+            return None if elemento is None else elemento[0]
+    
+    def get(self, chiave):
+        """Restituisce l'elemento in cache (segnandolo come usato di recente) oppure None"""
+        with self.lock:
+            if chiave not in self.elementi:
+                self.miss += 1
+                return None
+            self.hit += 1
+            self.elementi.move_to_end(chiave)
+            return self.elementi[chiave][0]
+    
+    def put(self, chiave, valore, dimensione):
+        """Aggiunge un elemento di dimensione nota (in byte), scartando i meno recenti finché non si rientra nel limite"""
+        if dimensione > self.limite_byte:
+            return
+        with self.lock:
+            if chiave in self.elementi:
+                self.byte_usati -= self.elementi.pop(chiave)[1]
+            self.elementi[chiave] = (valore, dimensione)
+            self.byte_usati += dimensione
+            while self.byte_usati > self.limite_byte:
+                _, (_, dimensione_scartata) = self.elementi.popitem(last=False)
+                self.byte_usati -= dimensione_scartata
+
+@st.cache_resource
+def ottieni_cache_fogli():
+    """Cache dei fogli letti (hash del file, nome del foglio) -> DataFrame, condivisa tra rerun e sessioni"""
+    return CacheLRU(LIMITE_CACHE_FOGLI_MB)
+
+@st.cache_resource
+def ottieni_cache_colonne():
+    """Cache delle colonne convertite (hash del file, foglio, colonna, opzioni) -> risultato, condivisa tra rerun e sessioni"""
+    return CacheLRU(LIMITE_CACHE_COLONNE_MB)
+
+@st.cache_resource
+def ottieni_tempi_lettura():
+    """Tempi di lettura per motore: nome -> {'letture', 'secondi', 'celle'}, condivisi tra rerun e sessioni"""
+    return {}
+
+@st.cache_resource
+def ottieni_cache_date():
+    """Cache persistente delle date su disco, con una connessione condivisa tra rerun e sessioni"""
+    return CacheDatePersistente(PERCORSO_CACHE_DATE, MAX_VOCI_CACHE_DATE)
+
+@st.cache_resource
+def ottieni_gestore_lavori():
+    """Pool dei lavori in background, condiviso tra rerun e sessioni"""
+    return GestoreLavori(LAVORI_SIMULTANEI, MAX_LAVORI_ATTIVI)
+
+def registra_tempo_lettura(motore, secondi, fogli, tempi_lettura=None):
+    """
+    Registra (nel log e nelle statistiche per motore) il tempo impiegato per leggere i fogli.
+    I lavori in background ricevono tempi_lettura da chi li invia, perché fuori dall'esecuzione
+    dello script le funzioni in cache di Streamlit non vanno chiamate.
+    """
+    if tempi_lettura is None:
+        tempi_lettura = ottieni_tempi_lettura()
+    celle = sum(df.size for df in fogli)
+    tempi = tempi_lettura.setdefault(motore, {'letture': 0, 'secondi': 0.0, 'celle': 0})
+    tempi['letture'] += 1
+    tempi['secondi'] += secondi
+    tempi['celle'] += celle
+    logger.info("Lettura con %s: %d fogli, %d celle in %.3f s", motore, len(fogli), celle, secondi)
+
+@st.cache_data(max_entries=32)
+def leggi_nomi_fogli(hash_file, motore, _contenuto):
+    """Nomi dei fogli del file; il contenuto non viene hashato da Streamlit, la chiave è (hash_file, motore)"""
+    return nomi_fogli_file(_contenuto, motore)
+
+@st.cache_data(max_entries=32)
+def leggi_anteprima(hash_file, nome_foglio, righe, motore, _contenuto):
+    """Legge solo l'intestazione e le prime righe di un foglio; la chiave è (hash_file, nome_foglio, righe, motore)"""
+    return leggi_fogli_file(_contenuto, [nome_foglio], motore, righe)[nome_foglio]
+
+@st.cache_data(max_entries=32)
+def rileva_colonne(hash_file, nome_foglio, righe, motore, intervalli_numerici, _df):
+    """
+    Colonne di date proposte per un foglio (vedi rileva_colonne_date): colonna -> esito, solo le
+    probabili; la chiave è (hash_file, nome_foglio, righe lette, motore, intervalli_numerici)
+    """
+    return {colonna: esito for colonna, esito in rileva_colonne_date(_df, intervalli_numerici).items() if esito['probabile']}
+
+def descrivi_colonne_rilevate(colonne_rilevate):
+    """Didascalia delle colonne di date rilevate, con i formati principali e la quota di date nel campione"""
+    return "🔎 Colonne di date rilevate: " + ", ".join(
+        f"**{colonna}** ({', '.join(esito['formati'][:2])}; {esito['punteggio']:.0%})" for colonna, esito in colonne_rilevate.items()
+    )
+
+def leggi_fogli(cache, hash_file, contenuto, nomi_fogli, motore=None, tempi_lettura=None, prestazioni=None, compatta=False):
+    """
+    Restituisce i fogli richiesti, leggendo dal file in un'unica passata solo quelli non in cache.
+    Il tempo di lettura viene registrato anche in prestazioni, se indicata. Con compatta i fogli
+    letti ora tengono le colonne di testo ripetitive come categoriche (vedi compatta_stringhe);
+    quelli già in cache restano come sono stati letti.
+    
+    Returns:
+        tupla (fogli, esiti) dove fogli è un dizionario nome -> DataFrame (nell'ordine richiesto)
+        ed esiti un dizionario nome -> True se il foglio è stato trovato in cache
+    """
+    if motore is None:
+        motore = scegli_motore(contenuto)
+    
+    fogli = {nome: cache.get((hash_file, nome, motore)) for nome in nomi_fogli}
+    esiti = {nome: df is not None for nome, df in fogli.items()}
+    
+    mancanti = [nome for nome, df in fogli.items() if df is None]
+    if mancanti:
+        inizio = time.perf_counter()
+        letti = leggi_fogli_file(contenuto, mancanti, motore, compatta=compatta)
+        secondi = time.perf_counter() - inizio
+        registra_tempo_lettura(motore, secondi, letti.values(), tempi_lettura)
+        if prestazioni is not None:
+            prestazioni.aggiungi('lettura', secondi, ", ".join(mancanti))
+        for nome, df in letti.items():
+            cache.put((hash_file, nome, motore), df, int(df.memory_usage(deep=True).sum()))
+            fogli[nome] = df
+    
+    return fogli, esiti
+
+def prepara_fogli_in_parallelo(contenuto, motore, compiti, intervalli_numerici, processi, completato=None, cache_persistente=None,
+                               compatta=False):
+    """
+    Legge e converte più fogli in parallelo con un pool di processi (vedi prepara_foglio).
+    I processi non usano Streamlit: l'interfaccia viene aggiornata solo da chi chiama.
+    
+    Args:
+        compiti: dizionario nome del foglio -> (DataFrame già letto oppure None, colonne da convertire)
+        completato: funzione chiamata con (nome, risultato) appena un foglio è pronto; se solleva
+                    un'eccezione i fogli non ancora iniziati vengono scartati
+        cache_persistente: cache su disco delle date, a cui ogni processo apre una propria connessione
+        compatta: se i processi compattano le colonne di testo dei fogli letti (vedi compatta_stringhe)
+    
+    Returns:
+        dizionario nome -> (df_letto, conversioni, secondi_lettura), oppure l'eccezione sollevata
+        dal processo per quel foglio, nello stesso ordine di compiti
+    """
+    # "spawn" evita di duplicare con fork i thread del server di Streamlit
+    contesto = multiprocessing.get_context('spawn')
+    risultati = {}
+    pool = ProcessPoolExecutor(max_workers=processi, mp_context=contesto,
+                               initializer=inizializza_processo, initargs=(contenuto,))
+    try:
+        # I processi vengono avviati al momento dell'invio dei compiti
+        with senza_modulo_principale():
+            futuri = {pool.submit(prepara_foglio, nome, motore, df, colonne, intervalli_numerici, cache_persistente, compatta): nome
+                      for nome, (df, colonne) in compiti.items()}
+        for futuro in as_completed(futuri):
+            nome = futuri[futuro]
+            try:
+                risultati[nome] = futuro.result()
+            except Exception as e:
+                risultati[nome] = e
+            if completato is not None:
+                completato(nome, risultati[nome])
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return {nome: risultati[nome] for nome in compiti}
+
+def normalizza_file_in_parallelo(compiti, opzioni, processi):
+    """
+    Normalizza più file con normalizza_file, in parallelo se processi > 1.
+    
+    Args:
+        compiti: dizionario nome -> (percorso, percorso_output, fogli, motore)
+        opzioni: argomenti comuni di normalizza_file (colonne, formato, ordinamento, intervalli)
+    
+    Yields:
+        (nome, (statistiche, errori)) oppure (nome, eccezione), man mano che i file vengono completati
+    """
+    if processi == 1:
+        for nome, (percorso, percorso_output, fogli, motore) in compiti.items():
+            try:
+                yield nome, normalizza_file(percorso, percorso_output=percorso_output, fogli=fogli, motore=motore,
+                                            report_errori=True, **opzioni)
+            except Exception as e:
+                yield nome, e
+        return
+    
+    # Se chi consuma i risultati si ferma, i file non ancora iniziati vengono scartati
+    contesto = multiprocessing.get_context('spawn')
+    pool = ProcessPoolExecutor(max_workers=processi, mp_context=contesto)
+    try:
+        with senza_modulo_principale():
+            futuri = {pool.submit(normalizza_file, percorso, percorso_output=percorso_output, fogli=fogli, motore=motore,
+                                  report_errori=True, **opzioni): nome
+                      for nome, (percorso, percorso_output, fogli, motore) in compiti.items()}
+        for futuro in as_completed(futuri):
+            try:
+                yield futuri[futuro], futuro.result()
+            except Exception as e:
+                yield futuri[futuro], e
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def preparazione_necessaria(cache_fogli, cache_colonne, hash_file, motore, nomi_fogli, colonne, intervalli_numerici):
+    """Vero se qualche foglio non è in cache oppure qualche colonna presente nel foglio non è ancora convertita"""
+    for nome_foglio in nomi_fogli:
+        chiave_foglio = (hash_file, nome_foglio, motore)
+        df_foglio = cache_fogli.guarda(chiave_foglio)
+        if df_foglio is None:
+            return True
+        if any(colonna in df_foglio.columns and chiave_colonna_cache(chiave_foglio, colonna, intervalli_numerici) not in cache_colonne
+               for colonna in colonne):
+            return True
+    return False
+
+def prepara_fogli(lavoro, cache_fogli, cache_colonne, tempi_lettura, hash_file, contenuto, motore, nomi_fogli, colonne, intervalli_numerici, processi=1,
+                  cache_persistente=None, compatta=False):
+    """
+    Lavoro in background: legge i fogli non ancora in cache e converte le colonne non ancora
+    in cache, segnalando l'avanzamento per foglio e colonna. Con più processi e più fogli,
+    lettura e conversione avvengono nel pool di processi (vedi prepara_fogli_in_parallelo).
+    Non usa Streamlit: i messaggi vengono mostrati da elabora_foglio con il risultato.
+    
+    Returns:
+        dizionario con 'fogli' (nome -> DataFrame), 'esiti' (nome -> True se il foglio era in cache),
+        'conversioni' (nome -> colonne convertite, da passare a elabora_foglio), 'errori'
+        (nome -> eccezione), 'in_parallelo' (fogli preparati dal pool di processi), 'secondi'
+        (durata della preparazione in parallelo) e 'prestazioni' (tempi di lettura e picco di memoria,
+        vedi Prestazioni; la conversione viene registrata da normalizza_foglio con le statistiche)
+    """
+    memoria = CampionatoreMemoria().avvia()
+    try:
+        risultato = prepara_fogli_misurati(lavoro, cache_fogli, cache_colonne, tempi_lettura, hash_file, contenuto, motore, nomi_fogli,
+                                           colonne, intervalli_numerici, processi, cache_persistente, compatta)
+    finally:
+        memoria.ferma()
+    risultato['prestazioni'].aggiungi_memoria(memoria.riepilogo())
+    return risultato
+
+def prepara_fogli_misurati(lavoro, cache_fogli, cache_colonne, tempi_lettura, hash_file, contenuto, motore, nomi_fogli, colonne,
+                           intervalli_numerici, processi, cache_persistente, compatta):
+    """Corpo di prepara_fogli, senza la misura della memoria"""
+    fase_lettura = "Lettura dal file"
+    fasi_colonne = {(nome, colonna): f"{nome} · {colonna}" for nome in nomi_fogli for colonna in colonne}
+    mancanti = [nome for nome in nomi_fogli if (hash_file, nome, motore) not in cache_fogli]
+    lavoro.prevedi(([fase_lettura] if mancanti else []) + list(fasi_colonne.values()))
+    
+    fogli, esiti, conversioni, errori = {}, {}, {}, {}
+    prestazioni = Prestazioni()
+    
+    def completa_colonne(nome, df_foglio):
+        """Segna come completate le fasi delle colonne del foglio"""
+        for colonna in colonne:
+            righe = len(df_foglio) if df_foglio is not None and colonna in df_foglio.columns else 0
+            lavoro.aggiorna(fasi_colonne[(nome, colonna)], righe, righe)
+    
+    def da_convertire(nome, df_foglio):
+        """Colonne presenti nel foglio e non ancora in cache; le altre vengono segnate come completate"""
+        colonne_foglio = [colonna for colonna in colonne if colonna in df_foglio.columns
+                          and chiave_colonna_cache((hash_file, nome, motore), colonna, intervalli_numerici) not in cache_colonne]
+        for colonna in colonne:
+            if colonna not in colonne_foglio:
+                righe = len(df_foglio) if colonna in df_foglio.columns else 0
+                lavoro.aggiorna(fasi_colonne[(nome, colonna)], righe, righe)
+        return colonne_foglio
+    
+    if processi > 1 and len(nomi_fogli) > 1:
+        # I fogli non in cache vengono letti, e le colonne non in cache convertite, dai processi
+        compiti = {}
+        for nome in nomi_fogli:
+            df_foglio = cache_fogli.get((hash_file, nome, motore))
+            esiti[nome] = df_foglio is not None
+            if df_foglio is None:
+                compiti[nome] = (None, list(colonne))
+                continue
+            fogli[nome] = df_foglio
+            colonne_foglio = da_convertire(nome, df_foglio)
+            if colonne_foglio:
+                compiti[nome] = (df_foglio, colonne_foglio)
+        
+        def completato(nome, risultato):
+            if isinstance(risultato, Exception):
+                errori[nome] = risultato
+            else:
+                df_letto, conversioni[nome], secondi_lettura = risultato
+                if df_letto is not None:
+                    cache_fogli.put((hash_file, nome, motore), df_letto, int(df_letto.memory_usage(deep=True).sum()))
+                    registra_tempo_lettura(motore, secondi_lettura, [df_letto], tempi_lettura)
+                    prestazioni.aggiungi('lettura', secondi_lettura, nome)
+                    fogli[nome] = df_letto
+            completa_colonne(nome, fogli.get(nome))
+            if mancanti:
+                lavoro.aggiorna(fase_lettura, sum(1 for nome in mancanti if nome in fogli or nome in errori), len(mancanti))
+        
+        inizio = time.perf_counter()
+        if compiti:
+            lavoro.segnala(f"Lettura e conversione di {len(compiti)} fogli con {processi} processi...")
+            prepara_fogli_in_parallelo(contenuto, motore, compiti, intervalli_numerici, processi, completato, cache_persistente, compatta)
+        return {'fogli': {nome: fogli[nome] for nome in nomi_fogli if nome in fogli}, 'esiti': esiti,
+                'conversioni': conversioni, 'errori': errori, 'in_parallelo': list(compiti),
+                'secondi': time.perf_counter() - inizio, 'prestazioni': prestazioni}
+    
+    if mancanti:
+        lavoro.aggiorna(fase_lettura, 0, len(mancanti), f"Lettura di {len(mancanti)} fogli con {motore}...")
+    fogli, esiti = leggi_fogli(cache_fogli, hash_file, contenuto, nomi_fogli, motore, tempi_lettura, prestazioni, compatta)
+    if mancanti:
+        lavoro.aggiorna(fase_lettura, len(mancanti), len(mancanti))
+    
+    # I valori distinti già convertiti vengono riutilizzati tra tutti i fogli
+    cache_valori = {}
+    for nome, df_foglio in fogli.items():
+        try:
+            conversioni[nome] = {}
+            for colonna in da_convertire(nome, df_foglio):
+                fase = fasi_colonne[(nome, colonna)]
+                lavoro.aggiorna(fase, 0, len(df_foglio), f"Conversione della colonna '{colonna}' del foglio '{nome}'...")
+                conversioni[nome][colonna] = normalizza_colonna(df_foglio[colonna], cache_valori, intervalli_numerici,
+                                                                partial(lavoro.aggiorna, fase), cache_persistente)
+                lavoro.aggiorna(fase, len(df_foglio), len(df_foglio))
+        except LavoroAnnullato:
+            raise
+        except Exception as e:
+            errori[nome] = e
+    return {'fogli': fogli, 'esiti': esiti, 'conversioni': conversioni, 'errori': errori, 'in_parallelo': [],
+            'prestazioni': prestazioni}
+
+def elabora_streaming(lavoro, contenuto, nomi_fogli, colonne, colonna_ordinamento, ordina_date, intervalli_numerici, motore,
+                      cache_persistente=None):
+    """
+    Lavoro in background della modalità streaming: normalizza i fogli a blocchi, scrivendo il file
+    normalizzato e quello delle righe con date non convertite in due file temporanei.
+    
+    Returns:
+        dizionario con i percorsi dei due file, le statistiche per foglio, i fogli senza
+        nessuna delle colonne selezionate e le prestazioni (vedi Prestazioni)
+    """
+    import xlsxwriter
+    lavoro.prevedi(nomi_fogli)
+    descrittore, percorso = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descrittore)
+    descrittore, percorso_errori = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descrittore)
+    opzioni_libro = {'constant_memory': True, 'default_date_format': 'dd/mm/yyyy'}
+    
+    statistiche_fogli = {}
+    fogli_senza_colonne = []
+    cache_valori = {}
+    prestazioni = Prestazioni()
+    memoria = CampionatoreMemoria().avvia()
+    try:
+        libro = xlsxwriter.Workbook(percorso, opzioni_libro)
+        libro_errori = xlsxwriter.Workbook(percorso_errori, opzioni_libro)
+        try:
+            for nome_foglio in nomi_fogli:
+                lavoro.aggiorna(nome_foglio, 0, None, f"Foglio '{nome_foglio}': lettura a blocchi...")
+                stats = elabora_foglio_streaming(
+                    contenuto, nome_foglio, colonne, colonna_ordinamento, ordina_date,
+                    libro, libro_errori, cache_valori, intervalli_numerici,
+                    avanzamento=lambda righe, nome=nome_foglio: lavoro.aggiorna(nome, righe, None, f"Foglio '{nome}': {righe} righe elaborate..."),
+                    motore=motore, cache_persistente=cache_persistente, prestazioni=prestazioni
+                )
+                righe = next(iter(stats.values()))['totali'] if stats else 0
+                lavoro.aggiorna(nome_foglio, righe, righe)
+                if stats:
+                    statistiche_fogli[nome_foglio] = stats
+                else:
+                    fogli_senza_colonne.append(nome_foglio)
+        finally:
+            libro.close()
+            libro_errori.close()
+    except BaseException:
+        os.remove(percorso)
+        os.remove(percorso_errori)
+        raise
+    finally:
+        memoria.ferma()
+    prestazioni.aggiungi_memoria(memoria.riepilogo())
+    
+    return {'percorso': percorso, 'percorso_errori': percorso_errori, 'statistiche': statistiche_fogli,
+            'fogli_senza_colonne': fogli_senza_colonne, 'prestazioni': prestazioni}
+
+def elabora_batch(lavoro, file_da_elaborare, opzioni, processi):
+    """
+    Lavoro in background per più file: li normalizza con normalizza_file_in_parallelo e aggiunge
+    ogni file normalizzato allo ZIP (cancellandolo) appena è pronto, più un report unico dei
+    valori non convertiti.
+    
+    Args:
+        file_da_elaborare: dizionario nome -> (contenuto, fogli da elaborare oppure None per tutti, motore)
+        opzioni: argomenti comuni di normalizza_file (colonne, formato, ordinamento, intervalli,
+                 cache persistente delle date, formato del file normalizzato)
+    
+    Returns:
+        dizionario con la cartella temporanea, il percorso dello ZIP, il riepilogo per file e
+        il numero di valori non convertiti
+    """
+    lavoro.prevedi(file_da_elaborare)
+    
+    # I file caricati vengono scritti su disco, dove li leggono i processi
+    cartella = tempfile.mkdtemp(prefix='normalizza_date_')
+    try:
+        compiti = {}
+        for i, (nome, (contenuto, fogli, motore_file)) in enumerate(file_da_elaborare.items()):
+            percorso = os.path.join(cartella, f"originale_{i}{Path(nome).suffix}")
+            with open(percorso, 'wb') as f:
+                f.write(contenuto)
+            estensione = estensione_file_normalizzato(opzioni.get('formato_file', 'xlsx'), tipo_file(contenuto))
+            compiti[nome] = (percorso, os.path.join(cartella, f"normalizzato_{i}{estensione}"), fogli, motore_file)
+        lavoro.aggiorna(next(iter(compiti)), 0, 1, f"0/{len(compiti)} file elaborati")
+        
+        esiti = {}
+        errori = []
+        percorso_zip = os.path.join(cartella, "date_normalizzate.zip")
+        with zipfile.ZipFile(percorso_zip, 'w', compression=zipfile.ZIP_DEFLATED) as archivio:
+            for completati, (nome, esito) in enumerate(normalizza_file_in_parallelo(compiti, opzioni, processi), start=1):
+                percorso, percorso_output, _, _ = compiti[nome]
+                os.remove(percorso)
+                if isinstance(esito, Exception):
+                    esiti[nome] = {'Stato': '❌ Errore', 'Fogli': 0, 'Date convertite': 0, 'Date totali': 0, 'Dettagli': str(esito)}
                 else:
-                    # Se non abbiamo un oggetto datetime valido, usiamo la stringa formattata
-                    return data_formattata if pd.notna(data_formattata) else str(row[colonna_date])
+                    statistiche_file, errori_file = esito
+                    archivio.write(percorso_output, arcname=f"{Path(nome).stem}_normalizzato{Path(percorso_output).suffix}")
+                    os.remove(percorso_output)
+                    convertite = sum(stats['convertiti'] for stats_foglio in statistiche_file.values() for stats in stats_foglio.values())
+                    totali = sum(stats['totali'] for stats_foglio in statistiche_file.values() for stats in stats_foglio.values())
+                    esiti[nome] = {'Stato': '✅ Completo' if convertite == totali else '⚠️ Date non convertite',
+                                   'Fogli': len(statistiche_file), 'Date convertite': convertite, 'Date totali': totali,
+                                   'Dettagli': ', '.join(statistiche_file)}
+                    if not errori_file.empty:
+                        errori.append(errori_file.assign(File=nome))
+                lavoro.aggiorna(nome, 1, 1, f"{completati}/{len(compiti)} file elaborati")
             
-            df_temp[colonna_date] = df_temp.apply(applica_formato, axis=1)
-        else:
-            # Fallback alla vecchia logica
-            df_temp[colonna_date] = df_temp[colonna_date].apply(lambda x: normalizza_data(x, True))
-            statistiche_conversione[colonna_date] = {
-                'convertiti': len(df_temp),
-                'totali': len(df_temp),
-                'percentuale': 100.0,
-                'foglio': nome_foglio
-            }
+            # Report unico dei valori non convertiti di tutti i file
+            righe_errori = 0
+            if errori:
+                report = pd.concat(errori, ignore_index=True)[['File', 'Foglio', 'Riga nel file', 'Colonna', 'Valore']]
+                righe_errori = len(report)
+                percorso_report = os.path.join(cartella, "date_problematiche.xlsx")
+                report.iloc[:MAX_RIGHE_EXCEL - 1].to_excel(percorso_report, index=False, engine='xlsxwriter')
+                del report
+                archivio.write(percorso_report, arcname="date_problematiche.xlsx")
+                os.remove(percorso_report)
+    except BaseException:
+        shutil.rmtree(cartella, ignore_errors=True)
+        raise
+    
+    riepilogo = pd.DataFrame([{'File': nome, **esiti[nome]} for nome in compiti])
+    return {'cartella': cartella, 'percorso_zip': percorso_zip, 'riepilogo': riepilogo, 'righe_errori': righe_errori}
+
+def id_sessione():
+    """Identificativo della sessione, proprietaria dei propri lavori in background"""
+    return st.session_state.setdefault('id_sessione', uuid.uuid4().hex)
+
+def esegui_in_background(chiave, descrizione, funzione):
+    """
+    Esegue funzione(lavoro) nel pool dei lavori in background e ne mostra l'avanzamento, con un
+    pulsante per annullarlo, finché non termina. Il lavoro non dipende dall'esecuzione dello
+    script: se l'utente interagisce con l'interfaccia, al rerun con la stessa chiave si torna ad
+    attendere lo stesso lavoro invece di ripartire da capo.
+    
+    Returns:
+        il risultato del lavoro; se il lavoro è stato annullato lo script si ferma, se è fallito
+        ne viene sollevata l'eccezione
+    """
+    gestore = ottieni_gestore_lavori()
+    lavori_sessione = st.session_state.setdefault('lavori', {})
+    
+    def annullato():
+        st.warning(f"⏹️ {descrizione}: elaborazione annullata.")
+        if not st.button("🔄 Riavvia l'elaborazione", key=f"riavvia_{descrizione}"):
+            st.stop()
+        del lavori_sessione[chiave]
+    
+    if lavori_sessione.get(chiave) == ANNULLATO:
+        annullato()
     
-    # Ordinamento cronologico se richiesto (usa la colonna di ordinamento selezionata)
-    if ordina_date and colonna_ordinamento and colonna_ordinamento in df_temp.columns:
-        if f'_data_oggetto_{colonna_ordinamento}' in df_temp.columns:
-            perc_convertiti_ordinamento = statistiche_conversione.get(colonna_ordinamento, {}).get('percentuale', 0)
-            if perc_convertiti_ordinamento > 0:
-                st.write(f"Ordinamento dati in ordine cronologico basato sulla colonna '{colonna_ordinamento}'{prefisso_nome}...")
-                df_temp = df_temp.sort_values(by=f'_data_oggetto_{colonna_ordinamento}', na_position='last')
+    # Un lavoro annullato senza che l'utente lo chiedesse (da un lavoro più recente della
+    # stessa sessione) viene inviato di nuovo
+    lavoro = gestore.ottieni(lavori_sessione.get(chiave))
+    if lavoro is None or (lavoro.stato == ANNULLATO and lavori_sessione.get(chiave) != ANNULLATO):
+        try:
+            lavoro = gestore.invia(funzione, descrizione, id_sessione())
+        except ServerOccupato:
+            st.warning("⏳ Il server sta già elaborando troppi file: riprova tra qualche istante.")
+            st.stop()
+        for chiave_lavoro in [k for k, v in lavori_sessione.items() if v != ANNULLATO and gestore.ottieni(v) is None]:
+            del lavori_sessione[chiave_lavoro]
+        lavori_sessione[chiave] = lavoro.identificativo
+    
+    contenitore = st.empty()
+    with contenitore.container():
+        barra = st.progress(0.0, text=f"⏳ {descrizione}...")
+        dettagli = st.empty()
+        if st.button("⏹️ Annulla", key=f"annulla_{lavoro.identificativo}"):
+            lavoro.annulla()
+            lavori_sessione[chiave] = ANNULLATO
     
-    # Rimuoviamo le colonne temporanee per il dataframe finale
-    colonne_temp = [col for col in df_temp.columns if col.startswith('_data_formattata_') or col.startswith('_data_oggetto_')]
-    df_elaborato = df_temp.drop(columns=colonne_temp)
+    while lavoro.attivo:
+        if lavoro.evento_annullamento.is_set():
+            barra.progress(lavoro.frazione(), text=f"⏹️ {descrizione}: annullamento in corso...")
+        elif lavoro.stato == IN_CODA:
+            barra.progress(0.0, text=f"⏳ {descrizione}: in coda ({gestore.posizione_in_coda(lavoro)} lavori prima di questo)")
+        else:
+            barra.progress(lavoro.frazione(), text=f"⚙️ {descrizione}: {lavoro.messaggio}")
+            dettagli.caption(" · ".join(
+                f"{fase}: {elaborati:,}" + (f"/{totali:,}" if totali else "")
+                for fase, (elaborati, totali) in lavoro.avanzamento().items()
+            ))
+        time.sleep(INTERVALLO_AGGIORNAMENTO)
+    contenitore.empty()
+    gestore.ritira(lavoro.identificativo)
     
-    return df_elaborato, statistiche_conversione, df_temp
+    if lavoro.stato == ANNULLATO:
+        lavori_sessione[chiave] = ANNULLATO
+        annullato()
+    lavori_sessione.pop(chiave, None)
+    if lavoro.stato == FALLITO:
+        raise lavoro.errore
+    return lavoro.risultato
 
 # Sidebar per le opzioni
 with st.sidebar:
@@ -243,26 +789,237 @@ with st.sidebar:
     # Formato di output
     formato_output = st.selectbox(
         "Formato di visualizzazione delle date", 
-        options=["gg-mm-aaaa", "gg/mm/aaaa", "aaaa-mm-gg"],
+        options=list(FORMATI_OUTPUT),
         index=0,
         help="Scegli il formato di visualizzazione delle date (internamente saranno comunque normalizzate)"
     )
     
     # Mappatura formati
-    formati_output = {
-        "gg-mm-aaaa": "%d-%m-%Y",
-        "gg/mm/aaaa": "%d/%m/%Y",
-        "aaaa-mm-gg": "%Y-%m-%d"
-    }
+    formati_output = FORMATI_OUTPUT
+    
+    # Anteprima veloce: il file completo viene letto solo dopo la conferma
+    anteprima_veloce = st.checkbox(
+        "Anteprima veloce",
+        value=True,
+        help=f"Legge solo le prime {RIGHE_ANTEPRIMA} righe per scegliere foglio e colonne; "
+             "il file completo viene letto ed elaborato solo premendo 'Elabora'"
+    )
+    
+    # Streaming: per file troppo grandi per stare in memoria
+    modalita_streaming = st.checkbox(
+        "Modalità streaming (file molto grandi)",
+        value=False,
+        help=f"Legge ed elabora il file a blocchi di {RIGHE_BLOCCO_STREAMING} righe e scrive il risultato "
+             "direttamente su un file temporaneo: la memoria usata non dipende dal numero di righe. "
+             "Non mostra le tabelle complete, solo statistiche e download"
+    )
+    
+    # Motore di lettura: automatico (il più veloce installato) oppure scelto dall'utente
+    motore_lettura = st.selectbox(
+        "Motore di lettura",
+        options=["Automatico"] + list(MOTORI_LETTURA),
+        index=0,
+        format_func=lambda nome: nome if nome == "Automatico" or importlib.util.find_spec(MOTORI_LETTURA[nome][0]) else f"{nome} (non installato)",
+        help="In automatico viene usato il motore più veloce installato per il tipo di file: "
+             + ", ".join(f"{nome} ({'/'.join('.' + tipo for tipo in tipi)})" for nome, (_, tipi) in MOTORI_LETTURA.items())
+    )
+    
+    # Formato del file normalizzato da scaricare
+    formato_file = st.selectbox(
+        "Formato del file normalizzato",
+        options=list(FORMATI_FILE_OUTPUT),
+        index=0,
+        format_func=lambda nome: nome if FORMATI_FILE_OUTPUT[nome][2] is None or importlib.util.find_spec(FORMATI_FILE_OUTPUT[nome][2]) else f"{nome} (non installato)",
+        help="In Parquet e Feather le colonne normalizzate sono date native, in CSV testo nel formato scelto; "
+             "più fogli vengono scaricati in uno ZIP con un file per foglio. La modalità streaming scrive sempre .xlsx"
+    )
+    
+    # Processi paralleli per l'elaborazione di tutti i fogli
+    processi_paralleli = st.number_input(
+        "Processi paralleli",
+        min_value=1,
+        max_value=32,
+        value=PROCESSI_PREDEFINITI,
+        help="Con 'Elabora tutti i fogli', o caricando più file, fogli e file vengono elaborati in parallelo "
+             "da questo numero di processi; 1 li elabora uno dopo l'altro"
+    )
+    
+    # Colonne di testo ripetitive come categoriche: ogni valore distinto in memoria una volta sola
+    compatta_testo = st.checkbox(
+        "Compatta le colonne di testo ripetitive",
+        value=False,
+        help="Tiene in memoria ogni valore distinto una volta sola nelle colonne di testo con al più "
+             f"{RAPPORTO_MASSIMO_CATEGORIE:.0%} di valori distinti (colonne categoriche): meno memoria per i file "
+             "grandi e conversione più rapida. Vale per i fogli letti da questo momento"
+    )
+    
+    # Interpretazione dei valori numerici
+    tipi_numerici = st.multiselect(
+        "Numeri da interpretare come date",
+        options=list(INTERVALLI_NUMERICI),
+        default=list(INTERVALLI_NUMERICI),
+        help="Ogni numero viene convertito secondo il primo intervallo plausibile che lo contiene: "
+             + "; ".join(f"{nome}: da {minimo:g} a {massimo:g}" for nome, (_, _, minimo, massimo) in INTERVALLI_NUMERICI.items())
+    )
+    intervalli_numerici = {nome: INTERVALLI_NUMERICI[nome] for nome in tipi_numerici}
+    
+    # Cache persistente: i testi già interpretati in sessioni precedenti non vengono rianalizzati
+    usa_cache_date = st.checkbox(
+        "Cache persistente delle date",
+        value=False,
+        help="Ricorda su disco, tra sessioni e riavvii, le date riconosciute valore per valore (e i valori che "
+             f"non sono date), fino a {MAX_VOCI_CACHE_DATE:,} voci; i valori usati meno di recente vengono scartati"
+    )
+    cache_date = ottieni_cache_date() if usa_cache_date else None
+    riquadro_cache_date = st.empty()
+    if cache_date is not None and st.button("🗑️ Svuota la cache delle date"):
+        if not cache_date.svuota():
+            st.error(f"❌ Impossibile svuotare la cache delle date ({cache_date.percorso}): il file è bloccato o danneggiato")
+
+def mostra_cache_date():
+    """Voci, dimensione e percentuale di valori trovati della cache persistente delle date, nella sidebar"""
+    if cache_date is None:
+        return
+    stato = cache_date.statistiche()
+    with riquadro_cache_date.container():
+        if stato is None:
+            st.caption(f"💾 Cache delle date non disponibile ({PERCORSO_CACHE_DATE})")
+            return
+        # I valori cercati dai processi paralleli contano solo nei totali del database
+        trovati_server = (f"questo server {stato['trovati']:,} su {stato['richiesti']:,} ({stato['percentuale']:.1f}%) · "
+                          if stato['richiesti'] else "")
+        st.caption(f"💾 Cache delle date: {stato['voci_versione']:,}/{stato['max_voci']:,} voci ({stato['dimensione_mb']:.1f} MB) · "
+                   f"valori trovati: {trovati_server}tutte le sessioni {stato['trovati_totali']:,} su "
+                   f"{stato['richiesti_totali']:,} ({stato['percentuale_totale']:.1f}%)")
+
+mostra_cache_date()
 
-# Upload del file
-file = st.file_uploader("Carica un file Excel", type=["xlsx", "xls"])
+# Upload dei file: con un solo file l'elaborazione è interattiva, con più file in batch
+file_caricati = st.file_uploader("Carica uno o più file Excel, CSV, Parquet o Feather", type=["xlsx", "xls", "csv", "parquet", "feather"],
+                                 accept_multiple_files=True)
+file = file_caricati[0] if file_caricati and len(file_caricati) == 1 else None
+
+if file_caricati and len(file_caricati) > 1:
+    try:
+        st.write(f"### 📚 Elaborazione di {len(file_caricati)} file")
+        preferito = None if motore_lettura == "Automatico" else motore_lettura
+        
+        # Nomi dei fogli e prime righe del primo foglio di ogni file, su cui vengono rilevate le colonne di date
+        file_validi = {}
+        colonne_disponibili = []
+        colonne_rilevate = {}
+        for file_caricato in file_caricati:
+            contenuto = file_caricato.getvalue()
+            hash_contenuto = hashlib.sha256(contenuto).hexdigest()
+            try:
+                motore_file = scegli_motore(contenuto, preferito)
+                fogli_file = leggi_nomi_fogli(hash_contenuto, motore_file, contenuto)
+                intestazione = leggi_anteprima(hash_contenuto, fogli_file[0], RIGHE_ANTEPRIMA, motore_file, contenuto)
+            except Exception as e:
+                st.warning(f"⚠️ Il file '{file_caricato.name}' non è leggibile e verrà saltato: {e}")
+                continue
+            
+            # Nomi ripetuti resi unici, perché diventano i nomi dei file nello ZIP
+            nome, numero = file_caricato.name, 1
+            while nome in file_validi:
+                numero += 1
+                nome = f"{Path(file_caricato.name).stem} ({numero}){Path(file_caricato.name).suffix}"
+            file_validi[nome] = (file_caricato, hash_contenuto, motore_file, fogli_file)
+            colonne_disponibili += [colonna for colonna in intestazione.columns if colonna not in colonne_disponibili]
+            for colonna, esito in rileva_colonne(hash_contenuto, fogli_file[0], len(intestazione), motore_file,
+                                                 intervalli_numerici, intestazione).items():
+                colonne_rilevate.setdefault(colonna, esito)
+        
+        if not file_validi:
+            st.error("❌ Nessuno dei file caricati è leggibile.")
+            st.stop()
+        
+        # Le stesse opzioni valgono per tutti i file
+        if colonne_rilevate:
+            st.caption(descrivi_colonne_rilevate(colonne_rilevate))
+        colonne_selezionate = st.multiselect(
+            "Colonne da normalizzare in ogni file:",
+            options=colonne_disponibili,
+            default=list(colonne_rilevate) or colonne_disponibili[:1],
+            help="Colonne presenti nel primo foglio di almeno un file; nei fogli in cui mancano vengono saltate. "
+                 "Vengono proposte quelle in cui la maggior parte dei valori è una data"
+        )
+        if not colonne_selezionate:
+            st.warning("⚠️ Seleziona almeno una colonna da normalizzare per continuare.")
+            st.stop()
+        
+        colonna_ordinamento = colonne_selezionate[0]
+        if len(colonne_selezionate) > 1 and ordina_date:
+            colonna_ordinamento = st.selectbox("Colonna da usare per l'ordinamento cronologico:", options=colonne_selezionate, index=0)
+        tutti_i_fogli = st.checkbox("Elabora tutti i fogli di ogni file", value=False,
+                                    help="Altrimenti viene elaborato solo il primo foglio di ogni file")
+        
+        # Il risultato resta su disco tra i rerun finché non cambiano file o opzioni
+        chiave_batch = (tuple(hash_contenuto for _, hash_contenuto, _, _ in file_validi.values()), tuple(colonne_selezionate),
+                        colonna_ordinamento if ordina_date else None, formato_output, tutti_i_fogli,
+                        tuple(intervalli_numerici), preferito, formato_file)
+        if st.button(f"▶️ Elabora {len(file_validi)} file", type="primary"):
+            st.session_state['batch_confermato'] = chiave_batch
+        
+        risultato = st.session_state.get('risultato_batch')
+        if risultato is None or risultato['chiave'] != chiave_batch or not os.path.exists(risultato['percorso_zip']):
+            if st.session_state.get('batch_confermato') != chiave_batch:
+                st.info("👆 Premi **Elabora** per normalizzare tutti i file con le stesse opzioni.")
+                st.stop()
+            if risultato is not None:
+                shutil.rmtree(risultato['cartella'], ignore_errors=True)
+                del st.session_state['risultato_batch']
+            
+            file_da_elaborare = {nome: (file_caricato.getvalue(), None if tutti_i_fogli else fogli_file[:1], motore_file)
+                                 for nome, (file_caricato, _, motore_file, fogli_file) in file_validi.items()}
+            opzioni = {
+                'colonne': colonne_selezionate,
+                'formato': formati_output[formato_output],
+                'colonna_ordinamento': colonna_ordinamento,
+                'ordina_date': ordina_date,
+                'intervalli_numerici': intervalli_numerici,
+                'cache_persistente': cache_date,
+                'formato_file': formato_file,
+                'compatta': compatta_testo,
+            }
+            risultato = esegui_in_background(
+                ('batch',) + chiave_batch, f"Elaborazione di {len(file_da_elaborare)} file",
+                partial(elabora_batch, file_da_elaborare=file_da_elaborare, opzioni=opzioni, processi=processi_paralleli)
+            )
+            risultato['chiave'] = chiave_batch
+            st.session_state['risultato_batch'] = risultato
+            mostra_cache_date()
+        
+        st.write("### 📊 Riepilogo")
+        mostra_tabella_paginata(risultato['riepilogo'], "riepilogo_batch", hide_index=True)
+        if risultato['righe_errori']:
+            st.warning(f"⚠️ {risultato['righe_errori']} valori non convertiti: l'elenco completo è in 'date_problematiche.xlsx' nello ZIP.")
+        with open(risultato['percorso_zip'], 'rb') as f:
+            st.download_button(
+                label="🗜️ Scarica ZIP con i file normalizzati",
+                data=f,
+                file_name="date_normalizzate.zip",
+                mime="application/zip"
+            )
+    except Exception as e:
+        st.error(f"❌ Si è verificato un errore durante l'elaborazione dei file: {e}")
+    st.stop()
 
 if file is not None:
     try:
+        # Il contenuto del file identifica i fogli in cache tra un rerun e l'altro
+        contenuto_file = file.getvalue()
+        hash_file = hashlib.sha256(contenuto_file).hexdigest()
+        cache_fogli = ottieni_cache_fogli()
+        
+        # Motore di lettura per questo file
+        preferito = None if motore_lettura == "Automatico" else motore_lettura
+        motore = scegli_motore(contenuto_file, preferito)
+        if preferito is not None and motore != preferito:
+            st.warning(f"⚠️ Il motore '{preferito}' non è installato o non legge i file .{tipo_file(contenuto_file)}: uso '{motore}'.")
+        
         # Prima leggiamo i nomi dei fogli disponibili
-        excel_file = pd.ExcelFile(file)
-        fogli_disponibili = excel_file.sheet_names
+        fogli_disponibili = leggi_nomi_fogli(hash_file, motore, contenuto_file)
         
         st.write("### 📋 Seleziona il foglio di calcolo")
         st.write(f"**Fogli disponibili nel file:** {len(fogli_disponibili)}")
@@ -295,23 +1052,82 @@ if file is not None:
                     st.warning("⚠️ **Attenzione**: Questa opzione elaborerà TUTTI i fogli del file. Assicurati che le colonne selezionate esistano in tutti i fogli.")
                     st.write(f"**Fogli che verranno elaborati:** {', '.join(fogli_disponibili)}")
         
-        # Leggiamo il foglio selezionato (o il primo se elaboriamo tutti)
-        df = pd.read_excel(file, sheet_name=foglio_selezionato, header=0)
+        # In parallelo i fogli vengono letti dai processi; lo streaming resta sequenziale
+        in_parallelo = elabora_tutti_fogli and processi_paralleli > 1 and not modalita_streaming
+        
+        # Le colonne già convertite vengono riutilizzate se cambiano solo formato o ordinamento
+        cache_colonne = ottieni_cache_colonne()
+        
+        def prepara(nomi_fogli, colonne=(), processi=1):
+            """
+            Fogli letti e colonne convertite (vedi prepara_fogli): se qualcosa manca dalle cache
+            il lavoro viene eseguito in background, altrimenti i fogli vengono presi dalla cache.
+            """
+            if not preparazione_necessaria(cache_fogli, cache_colonne, hash_file, motore, nomi_fogli, colonne, intervalli_numerici):
+                fogli_letti, esiti_cache = leggi_fogli(cache_fogli, hash_file, contenuto_file, nomi_fogli, motore, compatta=compatta_testo)
+                return {'fogli': fogli_letti, 'esiti': esiti_cache, 'conversioni': {}, 'errori': {}, 'in_parallelo': [],
+                        'prestazioni': Prestazioni()}
+            chiave = ('preparazione', hash_file, motore, tuple(nomi_fogli), tuple(colonne), tuple(intervalli_numerici), processi, compatta_testo)
+            descrizione = "Lettura e conversione" if colonne else "Lettura del file"
+            return esegui_in_background(chiave, descrizione, partial(
+                prepara_fogli, cache_fogli=cache_fogli, cache_colonne=cache_colonne, tempi_lettura=ottieni_tempi_lettura(), hash_file=hash_file,
+                contenuto=contenuto_file, motore=motore, nomi_fogli=list(nomi_fogli), colonne=list(colonne),
+                intervalli_numerici=intervalli_numerici, processi=processi, cache_persistente=cache_date, compatta=compatta_testo
+            ))
+        
+        def mostra_stato_cache(esiti_cache):
+            """Esito della cache dei fogli e tempi medi di lettura per motore"""
+            fogli_in_cache = sum(esiti_cache.values())
+            indicatore_cache = "🟢 cache hit" if fogli_in_cache == len(esiti_cache) else f"🟡 cache miss (lettura dal file con {motore})"
+            st.caption(f"{indicatore_cache}: {fogli_in_cache}/{len(esiti_cache)} fogli già in memoria · "
+                       f"cache {cache_fogli.byte_usati / 1024 / 1024:.1f}/{LIMITE_CACHE_FOGLI_MB} MB · "
+                       f"{cache_fogli.hit} hit, {cache_fogli.miss} miss totali")
+            
+            # Tempi medi per motore, per confrontarli sui propri file
+            tempi_lettura = ottieni_tempi_lettura()
+            if tempi_lettura:
+                with st.sidebar.expander("⏱️ Tempi di lettura per motore"):
+                    for nome, tempi in tempi_lettura.items():
+                        celle_al_secondo = tempi['celle'] / tempi['secondi'] if tempi['secondi'] > 0 else 0
+                        st.write(f"**{nome}**: {tempi['letture']} letture, {tempi['secondi']:.2f} s totali, "
+                                 f"{celle_al_secondo:,.0f} celle/s")
+        
+        # In streaming il file completo non viene mai caricato: si parte sempre dall'anteprima
+        anteprima_veloce = anteprima_veloce or modalita_streaming
+        
+        if anteprima_veloce:
+            # Solo intestazione e prime righe: bastano per scegliere colonne e ordinamento
+            df = leggi_anteprima(hash_file, foglio_selezionato, RIGHE_ANTEPRIMA, motore, contenuto_file)
+        else:
+            # Il selezionato, oppure tutti i fogli in un'unica passata se li elaboriamo tutti
+            # (in parallelo gli altri fogli vengono letti dai processi)
+            lettura = prepara(fogli_disponibili if elabora_tutti_fogli and not in_parallelo else [foglio_selezionato])
+            mostra_stato_cache(lettura['esiti'])
+            df = lettura['fogli'][foglio_selezionato]
         
         st.write("### 📊 Anteprima del foglio selezionato:")
-        st.write(f"**Dimensioni:** {len(df)} righe × {len(df.columns)} colonne")
+        if anteprima_veloce:
+            st.write(f"**Anteprima:** prime {len(df)} righe × {len(df.columns)} colonne (il foglio completo verrà letto all'elaborazione)")
+        else:
+            st.write(f"**Dimensioni:** {len(df)} righe × {len(df.columns)} colonne")
         st.dataframe(df.head())
         
         # Selezione delle colonne da normalizzare
         st.write("### Seleziona le colonne da normalizzare")
         colonne_disponibili = df.columns.tolist()
         
+        # Le colonne di date vengono rilevate su un piccolo campione di ogni colonna e proposte
+        colonne_rilevate = rileva_colonne(hash_file, foglio_selezionato, len(df), motore, intervalli_numerici, df)
+        if colonne_rilevate:
+            st.caption(descrivi_colonne_rilevate(colonne_rilevate))
+        
         # Widget per selezionare multiple colonne
         colonne_selezionate = st.multiselect(
             "Scegli una o più colonne contenenti date da normalizzare:",
             options=colonne_disponibili,
-            default=[colonne_disponibili[0]] if colonne_disponibili else [],
-            help="Puoi selezionare più colonne se il tuo file contiene date in colonne diverse"
+            default=list(colonne_rilevate) or colonne_disponibili[:1],
+            help="Puoi selezionare più colonne se il tuo file contiene date in colonne diverse. "
+                 "Vengono proposte quelle in cui la maggior parte dei valori campionati è una data"
         )
         
         if not colonne_selezionate:
@@ -331,7 +1147,25 @@ if file is not None:
                 help="Quando hai selezionato più colonne, scegli quale usare come riferimento per l'ordinamento"
             )
             st.write(f"**Ordinamento basato su:** '{colonna_ordinamento}'")
-        
+
+        # Con più fogli ordinati, le righe possono finire in un unico foglio cronologico
+        unisci_fogli = False
+        chiavi_secondarie = []
+        if elabora_tutti_fogli and ordina_date:
+            unisci_fogli = st.checkbox(
+                "Unisci i fogli in un'unica sequenza cronologica",
+                value=False,
+                help=f"Tutte le righe finiscono nel foglio '{FOGLIO_CRONOLOGIA}', ordinate per '{colonna_ordinamento}', "
+                     f"con la colonna '{COLONNA_FOGLIO_ORIGINE}' che indica da quale foglio proviene ogni riga"
+            )
+            if unisci_fogli:
+                chiavi_secondarie = st.multiselect(
+                    "Colonne per ordinare le righe con la stessa data (facoltativo):",
+                    options=[col for col in colonne_disponibili if col != colonna_ordinamento],
+                    help="A parità di data le righe vengono ordinate per queste colonne, nell'ordine scelto; "
+                         "poi restano nell'ordine dei fogli"
+                )
+
         # Mostriamo alcune date prima della normalizzazione per ogni colonna selezionata
         for colonna in colonne_selezionate:
             if colonna in df.columns:
@@ -340,18 +1174,130 @@ if file is not None:
             else:
                 st.warning(f"⚠️ Colonna '{colonna}' non trovata nel foglio selezionato!")
         
+        if anteprima_veloce:
+            # L'elaborazione parte solo dopo la conferma e resta attiva finché non cambiano
+            # file, fogli o colonne; formato e ordinamento possono cambiare senza ripremere
+            chiave_conferma = (hash_file, foglio_selezionato, elabora_tutti_fogli, tuple(colonne_selezionate))
+            if st.button("▶️ Elabora", type="primary"):
+                st.session_state['elaborazione_confermata'] = chiave_conferma
+            if st.session_state.get('elaborazione_confermata') != chiave_conferma:
+                st.info("👆 Premi **Elabora** per leggere il file completo e normalizzare le colonne selezionate.")
+                st.stop()
+        
+        if modalita_streaming:
+            st.write("## 🌊 Elaborazione in streaming")
+            fogli_da_elaborare = fogli_disponibili if elabora_tutti_fogli else [foglio_selezionato]
+            
+            # Il risultato resta su disco tra un rerun e l'altro (ad esempio dopo un download)
+            # finché non cambiano file o opzioni che influiscono sul contenuto
+            chiave_risultato = (hash_file, tuple(fogli_da_elaborare), tuple(colonne_selezionate),
+                                colonna_ordinamento if ordina_date else None, tuple(intervalli_numerici), motore)
+            risultato = st.session_state.get('risultato_streaming')
+            if risultato is None or risultato['chiave'] != chiave_risultato or not os.path.exists(risultato['percorso']):
+                if risultato is not None:
+                    for percorso in (risultato['percorso'], risultato['percorso_errori']):
+                        if os.path.exists(percorso):
+                            os.remove(percorso)
+                    del st.session_state['risultato_streaming']
+                
+                risultato = esegui_in_background(
+                    ('streaming',) + chiave_risultato, "Elaborazione in streaming",
+                    partial(elabora_streaming, contenuto=contenuto_file, nomi_fogli=fogli_da_elaborare, colonne=colonne_selezionate,
+                            colonna_ordinamento=colonna_ordinamento, ordina_date=ordina_date,
+                            intervalli_numerici=intervalli_numerici, motore=motore, cache_persistente=cache_date)
+                )
+                risultato['chiave'] = chiave_risultato
+                st.session_state['risultato_streaming'] = risultato
+                registra_prestazioni(risultato['prestazioni'], "elaborazione in streaming")
+                mostra_cache_date()
+            
+            for nome_foglio in risultato['fogli_senza_colonne']:
+                st.error(f"❌ Nessuna delle colonne selezionate trovata nel foglio '{nome_foglio}'")
+            
+            statistiche_fogli = risultato['statistiche']
+            if not statistiche_fogli:
+                st.error("❌ Nessun foglio è stato elaborato con successo!")
+                st.stop()
+            
+            formato_selezionato = formati_output[formato_output]
+            for nome_foglio, stats_foglio in statistiche_fogli.items():
+                st.write(f"### 📄 Foglio '{nome_foglio}'")
+                for colonna, stats in stats_foglio.items():
+                    st.write(f"**Stato conversione per '{colonna}':** {stats['convertiti']} su {stats['totali']} date convertite correttamente ({stats['percentuale']:.1f}%)")
+                    if stats['formati_inferiti']:
+                        st.write(f"**Formato rilevato per '{colonna}':** {', '.join(stats['formati_inferiti'])}")
+                    if stats['data_minima'] is not None:
+                        st.write(f"**Intervallo date di '{colonna}':** dal {stats['data_minima'].strftime(formato_selezionato)} "
+                                 f"al {stats['data_massima'].strftime(formato_selezionato)}")
+                    if stats['percentuale'] < 100:
+                        st.warning(f"Alcune date nella colonna '{colonna}' ({stats['totali'] - stats['convertiti']}) non sono state convertite correttamente.")
+            
+            righe_con_errori = sum(next(iter(stats_foglio.values()))['righe_con_errori'] for stats_foglio in statistiche_fogli.values())
+            if ordina_date and colonna_ordinamento:
+                st.write(f"**Ordinamento:** Per data (colonna '{colonna_ordinamento}'), con merge sort esterno")
+            
+            with open(risultato['percorso'], 'rb') as f:
+                st.download_button(
+                    label="📊 Scarica Excel con date normalizzate",
+                    data=f,
+                    file_name="date_normalizzate_multifogli.xlsx" if elabora_tutti_fogli else "date_normalizzate.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+            if righe_con_errori:
+                with open(risultato['percorso_errori'], 'rb') as f:
+                    st.download_button(
+                        label=f"📋 Scarica righe con date problematiche ({righe_con_errori})",
+                        data=f,
+                        file_name="date_problematiche_dettagliate.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
+            mostra_prestazioni(risultato['prestazioni'])
+            st.stop()
+        
+        # Lettura dei fogli mancanti e conversione delle colonne mancanti, in background; in
+        # parallelo i fogli vengono letti e convertiti da un pool di processi, mentre
+        # formattazione, ordinamento e interfaccia restano qui
+        preparazione = prepara(fogli_disponibili if elabora_tutti_fogli else [foglio_selezionato], colonne_selezionate,
+                               processi_paralleli if in_parallelo else 1)
+        fogli_letti = preparazione['fogli']
+        conversioni_fogli = preparazione['conversioni']
+        errori_fogli = preparazione['errori']
+        
+        # Tempi di questo rerun: lettura dalla preparazione, poi le fasi di ogni foglio e l'export
+        prestazioni = Prestazioni()
+        prestazioni.unisci(preparazione['prestazioni'])
+        memoria = CampionatoreMemoria().avvia()
+        if anteprima_veloce:
+            esiti_cache = preparazione['esiti']
+            mostra_stato_cache(esiti_cache)
+        else:
+            # I fogli letti per l'anteprima non erano in cache, anche se ora lo sono
+            esiti_cache = {nome: esito and lettura['esiti'].get(nome, True) for nome, esito in preparazione['esiti'].items()}
+        if preparazione['in_parallelo']:
+            st.caption(f"⚡ {len(preparazione['in_parallelo'])} fogli letti e convertiti in parallelo con {processi_paralleli} processi "
+                       f"in {preparazione['secondi']:.1f} s")
+        
         # Variabili per raccogliere tutti i risultati
         tutti_df_elaborati = {}
         tutte_statistiche = {}
-        tutti_df_temp = {}
+        tutte_df_date = {}
+        tutte_mappe_errori = {}
+        colonne_ordinamento_fogli = {}
         
         if elabora_tutti_fogli:
             # Elaboriamo tutti i fogli
             st.write("## 🔄 Elaborazione di tutti i fogli")
+            
+            # I valori distinti già convertiti vengono riutilizzati tra tutti i fogli
+            cache_valori = {}
+            
             for nome_foglio in fogli_disponibili:
                 st.write(f"### 📄 Elaborazione foglio: {nome_foglio}")
                 try:
-                    df_foglio = pd.read_excel(file, sheet_name=nome_foglio, header=0)
+                    # Gli errori dei processi paralleli vengono riportati come quelli sequenziali
+                    if nome_foglio in errori_fogli:
+                        raise errori_fogli[nome_foglio]
+                    df_foglio = fogli_letti[nome_foglio]
                     
                     # Controlliamo se le colonne selezionate esistono in questo foglio
                     colonne_esistenti = [col for col in colonne_selezionate if col in df_foglio.columns]
@@ -364,14 +1310,18 @@ if file is not None:
                         # Elaboriamo solo le colonne che esistono
                         colonna_ord_foglio = colonna_ordinamento if colonna_ordinamento in colonne_esistenti else colonne_esistenti[0]
                         
-                        df_elaborato, stats, df_temp = elabora_foglio(
+                        df_elaborato, stats, df_date, mappa_errori = elabora_foglio(
                             df_foglio, colonne_esistenti, colonna_ord_foglio, 
-                            ordina_date, formato_output, formati_output, nome_foglio
+                            ordina_date, formato_output, formati_output, nome_foglio, cache_valori,
+                            intervalli_numerici, cache_colonne, (hash_file, nome_foglio, motore),
+                            conversioni_fogli.get(nome_foglio), cache_date, prestazioni
                         )
                         
                         tutti_df_elaborati[nome_foglio] = df_elaborato
+                        colonne_ordinamento_fogli[nome_foglio] = colonna_ord_foglio
                         tutte_statistiche.update({f"{k}_{nome_foglio}": v for k, v in stats.items()})
-                        tutti_df_temp[nome_foglio] = df_temp
+                        tutte_df_date[nome_foglio] = df_date
+                        tutte_mappe_errori[nome_foglio] = mappa_errori
                         
                         # Mostriamo alcune date dopo la normalizzazione
                         for colonna in colonne_esistenti:
@@ -387,16 +1337,32 @@ if file is not None:
             if tutti_df_elaborati:
                 df = tutti_df_elaborati[list(tutti_df_elaborati.keys())[0]]
                 statistiche_conversione = tutte_statistiche
-                df_temp = tutti_df_temp[list(tutti_df_temp.keys())[0]]
+                df_date = tutte_df_date[list(tutte_df_date.keys())[0]]
+                mappa_errori = tutte_mappe_errori[list(tutte_mappe_errori.keys())[0]]
+                if unisci_fogli:
+                    # Fogli fusi nella sequenza cronologica: diventa il risultato da mostrare ed esportare
+                    with prestazioni.misura('unione'):
+                        df, df_date, ordine_unione = unisci_fogli_cronologici(
+                            {nome_foglio: (df_elaborato, tutte_df_date[nome_foglio]) for nome_foglio, df_elaborato in tutti_df_elaborati.items()},
+                            colonne_ordinamento_fogli, chiavi_secondarie
+                        )
+                    st.success(f"🔗 {len(tutti_df_elaborati)} fogli uniti nel foglio '{FOGLIO_CRONOLOGIA}' ({len(df)} righe)")
             else:
                 st.error("❌ Nessun foglio è stato elaborato con successo!")
                 st.stop()
                 
         else:
             # Elaboriamo solo il foglio selezionato
-            df, statistiche_conversione, df_temp = elabora_foglio(
-                df, colonne_selezionate, colonna_ordinamento, 
-                ordina_date, formato_output, formati_output
+            if foglio_selezionato in errori_fogli:
+                raise errori_fogli[foglio_selezionato]
+            df, statistiche_conversione, df_date, mappa_errori = elabora_foglio(
+                fogli_letti[foglio_selezionato], colonne_selezionate, colonna_ordinamento, 
+                ordina_date, formato_output, formati_output,
+                intervalli_numerici=intervalli_numerici,
+                cache_colonne=cache_colonne, chiave_foglio=(hash_file, foglio_selezionato, motore),
+                conversioni=conversioni_fogli.get(foglio_selezionato),
+                cache_persistente=cache_date,
+                prestazioni=prestazioni
             )
             
             # Mostriamo alcune date dopo la normalizzazione per ogni colonna
@@ -405,9 +1371,20 @@ if file is not None:
                     st.write(f"**Esempi di date nella colonna '{colonna}' dopo la normalizzazione:**")
                     st.write(df[colonna].head().tolist())
         
-        # Visualizziamo il dataframe modificato
+        mostra_cache_date()
+        
+        # Riepilogo delle fasi riutilizzate e di quelle eseguite in questo rerun
+        colonne_riutilizzate = sum(1 for stats in statistiche_conversione.values() if stats.get('conversione_riutilizzata'))
+        st.info(
+            f"**Fasi di elaborazione** · Lettura: {'♻️ riutilizzata' if all(esiti_cache.values()) else '⚙️ eseguita'}"
+            f" · Conversione date: ♻️ {colonne_riutilizzate} colonne riutilizzate, ⚙️ {len(statistiche_conversione) - colonne_riutilizzate} convertite"
+            f" · Formattazione ({formato_output}): ⚙️ eseguita"
+            f" · Ordinamento: {'⚙️ eseguito' if ordina_date else 'non richiesto'}"
+        )
+        
+        # Visualizziamo il dataframe modificato, una pagina alla volta
         st.write("Anteprima del file con date normalizzate:")
-        st.dataframe(df.head(10))
+        mostra_tabella_paginata(df, "risultato")
         
         # Statistiche sulle colonne delle date
         with st.expander("Statistiche delle colonne normalizzate"):
@@ -446,6 +1423,7 @@ if file is not None:
                                 st.warning("⚠️ Parziale")
                             else:
                                 st.error("❌ Problemi")
+                        st.caption(f"Valori distinti: {stats['valori_distinti']} su {stats['totali']} ({stats['rapporto_distinti']:.1%})")
             else:
                 # Singolo foglio - visualizzazione normale
                 for colonna, stats in statistiche_conversione.items():
@@ -461,14 +1439,15 @@ if file is not None:
                             st.warning("⚠️ Parziale")
                         else:
                             st.error("❌ Problemi")
+                    st.caption(f"Valori distinti: {stats['valori_distinti']} su {stats['totali']} ({stats['rapporto_distinti']:.1%})")
             
             # Statistiche dettagliate per ogni colonna con date valide
             if elabora_tutti_fogli:
-                for nome_foglio, df_temp_foglio in tutti_df_temp.items():
+                for nome_foglio, df_date_foglio in tutte_df_date.items():
                     st.write(f"### 📄 Statistiche temporali - Foglio '{nome_foglio}'")
                     for colonna in colonne_selezionate:
-                        if f'_data_oggetto_{colonna}' in df_temp_foglio.columns:
-                            date_valide = df_temp_foglio[pd.notna(df_temp_foglio[f'_data_oggetto_{colonna}'])][f'_data_oggetto_{colonna}']
+                        if colonna in df_date_foglio.columns:
+                            date_valide = df_date_foglio[colonna].dropna()
                             
                             if not date_valide.empty:
                                 st.write(f"#### Colonna '{colonna}'")
@@ -490,8 +1469,8 @@ if file is not None:
             else:
                 # Singolo foglio
                 for colonna in colonne_selezionate:
-                    if f'_data_oggetto_{colonna}' in df_temp.columns:
-                        date_valide = df_temp[pd.notna(df_temp[f'_data_oggetto_{colonna}'])][f'_data_oggetto_{colonna}']
+                    if colonna in df_date.columns:
+                        date_valide = df_date[colonna].dropna()
                         
                         if not date_valide.empty:
                             st.write(f"### Statistiche temporali - Colonna '{colonna}'")
@@ -511,153 +1490,70 @@ if file is not None:
                         else:
                             st.write(f"### Colonna '{colonna}': Non ci sono date valide per calcolare le statistiche.")
         
+        # File normalizzato e file delle righe con date problematiche, scritti in un'unica
+        # passata sui dati; oltre MB_EXPORT_IN_MEMORIA finiscono in file temporanei su disco
+        inizio_export = time.perf_counter()
+        if unisci_fogli:
+            fogli_export = {FOGLIO_CRONOLOGIA: (df, df_date)}
+            mappe_export = tutte_mappe_errori
+        elif elabora_tutti_fogli:
+            fogli_export = {nome_foglio: (df_elaborato, tutte_df_date[nome_foglio]) for nome_foglio, df_elaborato in tutti_df_elaborati.items()}
+            mappe_export = tutte_mappe_errori
+        else:
+            fogli_export = {foglio_selezionato: (df, df_date)}
+            mappe_export = {foglio_selezionato: mappa_errori}
+        # Righe con almeno una data non convertita, per posizione nel foglio elaborato (ordinato)
+        colonne_errori_fogli = {nome_foglio: mappa.colonne_con_errori() for nome_foglio, mappa in mappe_export.items()}
+        righe_errori_fogli = {nome_foglio: mappe_export[nome_foglio].posizioni_elaborate(colonne_errori)
+                              for nome_foglio, colonne_errori in colonne_errori_fogli.items() if colonne_errori}
+        if unisci_fogli and righe_errori_fogli:
+            # Nel file degli errori le righe di tutti i fogli, nell'ordine della sequenza unita
+            righe_errori_fogli = {FOGLIO_CRONOLOGIA: posizioni_unite(
+                righe_errori_fogli, {nome_foglio: len(df_elaborato) for nome_foglio, df_elaborato in tutti_df_elaborati.items()}, ordine_unione
+            )}
+        output = tempfile.SpooledTemporaryFile(max_size=MB_EXPORT_IN_MEMORIA * 1024 * 1024)
+        output_errori = tempfile.SpooledTemporaryFile(max_size=MB_EXPORT_IN_MEMORIA * 1024 * 1024) if righe_errori_fogli else None
+        scrivi_file_normalizzato(output, fogli_export, colonne_selezionate, formato_file,
+                                 errori=righe_errori_fogli, destinazione_errori=output_errori)
+        prestazioni.aggiungi('export', time.perf_counter() - inizio_export)
+        
         # Opzione per scaricare file con errori (se ci sono)
         if elabora_tutti_fogli:
-            # Per più fogli, controlliamo tutti i fogli
-            fogli_con_errori = {}
-            for nome_foglio, df_temp_foglio in tutti_df_temp.items():
-                colonne_errori_foglio = []
-                for colonna in colonne_selezionate:
-                    if f'_data_oggetto_{colonna}' in df_temp_foglio.columns:
-                        errori_colonna = df_temp_foglio[df_temp_foglio[f'_data_oggetto_{colonna}'].isna()]
-                        if not errori_colonna.empty:
-                            colonne_errori_foglio.append(colonna)
-                
-                if colonne_errori_foglio:
-                    fogli_con_errori[nome_foglio] = colonne_errori_foglio
-            
-            if fogli_con_errori:
+            if righe_errori_fogli:
                 with st.expander(f"📥 Scarica file con date problematiche (Più fogli)"):
-                    for nome_foglio, colonne_errori in fogli_con_errori.items():
-                        st.write(f"**Foglio '{nome_foglio}'**: Problemi nelle colonne {', '.join(colonne_errori)}")
-                    
-                    # Creiamo un file Excel con tutti i fogli che hanno errori
-                    output_errori = io.BytesIO()
-                    with pd.ExcelWriter(output_errori, engine='xlsxwriter') as writer:
-                        for nome_foglio, colonne_errori in fogli_con_errori.items():
-                            df_temp_foglio = tutti_df_temp[nome_foglio]
-                            df_elaborato_foglio = tutti_df_elaborati[nome_foglio]
-                            
-                            # Creiamo una maschera per le righe con errori
-                            mask_errori = pd.Series([False] * len(df_temp_foglio))
-                            for colonna in colonne_errori:
-                                if f'_data_oggetto_{colonna}' in df_temp_foglio.columns:
-                                    mask_errori |= df_temp_foglio[f'_data_oggetto_{colonna}'].isna()
-                            
-                            df_errori_foglio = df_elaborato_foglio[mask_errori].copy()
-                            if not df_errori_foglio.empty:
-                                # Nome foglio limitato a 31 caratteri per Excel
-                                nome_sheet = f"Errori_{nome_foglio}"[:31]
-                                df_errori_foglio.to_excel(writer, sheet_name=nome_sheet, index=False)
+                    for nome_foglio, colonne_errori in colonne_errori_fogli.items():
+                        if colonne_errori:
+                            st.write(f"**Foglio '{nome_foglio}'**: Problemi nelle colonne {', '.join(colonne_errori)}")
                     
                     st.download_button(
                         label="📋 Scarica fogli con date problematiche",
-                        data=output_errori.getvalue(),
+                        data=contenuto_temporaneo(output_errori),
                         file_name="date_problematiche_multifogli.xlsx",
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                     )
         else:
             # Singolo foglio - logica originale
-            colonne_errori = []
-            for colonna in colonne_selezionate:
-                if f'_data_oggetto_{colonna}' in df_temp.columns:
-                    errori_colonna = df_temp[df_temp[f'_data_oggetto_{colonna}'].isna()]
-                    if not errori_colonna.empty:
-                        colonne_errori.append(colonna)
+            colonne_errori = colonne_errori_fogli[foglio_selezionato]
             
             if colonne_errori:
                 with st.expander(f"📥 Scarica file con date problematiche"):
                     st.write(f"Sono state trovate date problematiche in {len(colonne_errori)} colonna/e: {', '.join(colonne_errori)}")
                     
-                    # Creiamo un file con solo le righe problematiche
-                    mask_errori = pd.Series([False] * len(df_temp))
-                    for colonna in colonne_errori:
-                        if f'_data_oggetto_{colonna}' in df_temp.columns:
-                            mask_errori |= df_temp[f'_data_oggetto_{colonna}'].isna()
+                    # Solo le righe problematiche, selezionate per posizione nel foglio elaborato
+                    df_errori = df.iloc[righe_errori_fogli[foglio_selezionato]]
+                    st.write(f"Numero di righe con problemi: {len(df_errori)}")
+                    mostra_tabella_paginata(df_errori, "righe_problematiche")
                     
-                    df_errori = df[mask_errori].copy()
-                    
-                    if not df_errori.empty:
-                        st.write(f"Numero di righe con problemi: {len(df_errori)}")
-                        st.dataframe(df_errori.head())
-                        
-                        output_errori = io.BytesIO()
-                        with pd.ExcelWriter(output_errori, engine='xlsxwriter') as writer:
-                            df_errori.to_excel(writer, index=False)
-                        
-                        st.download_button(
-                            label="📋 Scarica righe con date problematiche",
-                            data=output_errori.getvalue(),
-                            file_name="date_problematiche_dettagliate.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                        )
+                    st.download_button(
+                        label="📋 Scarica righe con date problematiche",
+                        data=contenuto_temporaneo(output_errori),
+                        file_name="date_problematiche_dettagliate.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
         
-        # Opzione per scaricare il file modificato
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            
-            if elabora_tutti_fogli:
-                # Scriviamo tutti i fogli elaborati
-                for nome_foglio, df_elaborato in tutti_df_elaborati.items():
-                    df_export = df_elaborato.copy()
-                    df_temp_foglio = tutti_df_temp[nome_foglio]
-                    
-                    # Convertiamo le colonne selezionate in oggetti datetime per Excel
-                    for colonna in colonne_selezionate:
-                        if colonna in df_export.columns and f'_data_oggetto_{colonna}' in df_temp_foglio.columns:
-                            # Utilizziamo gli oggetti datetime che abbiamo già generato
-                            df_export[colonna] = df_temp_foglio[f'_data_oggetto_{colonna}']
-                        elif colonna in df_export.columns:
-                            # Tentiamo di convertire le stringhe di data in datetime
-                            try:
-                                df_export[colonna] = pd.to_datetime(df_export[colonna], dayfirst=True)
-                            except:
-                                pass  # Manteniamo il formato originale se la conversione fallisce
-                    
-                    # Salviamo il foglio con le date in formato Excel nativo
-                    # Nome foglio limitato a 31 caratteri per Excel
-                    nome_sheet = nome_foglio[:31]
-                    df_export.to_excel(writer, sheet_name=nome_sheet, index=False)
-                    
-                    # Otteniamo un riferimento al foglio di lavoro
-                    worksheet = writer.sheets[nome_sheet]
-                    
-                    # Formattazione specifica per le date nelle colonne selezionate
-                    date_format = writer.book.add_format({'num_format': 'dd/mm/yyyy'})
-                    
-                    # Applichiamo la formattazione alle colonne contenenti date
-                    for i, colonna in enumerate(df_export.columns):
-                        if colonna in colonne_selezionate:
-                            worksheet.set_column(i, i, 15, date_format)
-            else:
-                # Singolo foglio - logica originale
-                df_export = df.copy()
-                
-                # Convertiamo le colonne selezionate in oggetti datetime per Excel
-                for colonna in colonne_selezionate:
-                    if f'_data_oggetto_{colonna}' in df_temp:
-                        # Utilizziamo gli oggetti datetime che abbiamo già generato
-                        df_export[colonna] = df_temp[f'_data_oggetto_{colonna}']
-                    else:
-                        # Tentiamo di convertire le stringhe di data in datetime
-                        try:
-                            df_export[colonna] = pd.to_datetime(df_export[colonna], dayfirst=True)
-                        except:
-                            pass  # Manteniamo il formato originale se la conversione fallisce
-                    
-                # Salviamo il file con le date in formato Excel nativo
-                df_export.to_excel(writer, index=False)
-                
-                # Otteniamo un riferimento al foglio di lavoro
-                worksheet = writer.sheets['Sheet1']
-                
-                # Formattazione specifica per le date nelle colonne selezionate
-                date_format = writer.book.add_format({'num_format': 'dd/mm/yyyy'})
-                
-                # Applichiamo la formattazione alle colonne contenenti date
-                for i, colonna in enumerate(df_export.columns):
-                    if colonna in colonne_selezionate:
-                        worksheet.set_column(i, i, 15, date_format)
+        memoria.ferma()
+        prestazioni.aggiungi_memoria(memoria.riepilogo())
+        registra_prestazioni(prestazioni, f"di '{file.name}'")
         
         # Informazioni sul download
         st.write("### 📥 Download File Normalizzato")
@@ -672,6 +1568,9 @@ if file is not None:
                 st.write(f"**Foglio elaborato:** {foglio_selezionato}")
             if ordina_date and colonna_ordinamento:
                 st.write(f"**Ordinamento:** Per data (colonna '{colonna_ordinamento}')")
+            if unisci_fogli:
+                chiavi = f", poi per {', '.join(chiavi_secondarie)}" if chiavi_secondarie else ""
+                st.write(f"**Sequenza unica:** foglio '{FOGLIO_CRONOLOGIA}' ({len(df)} righe{chiavi})")
         
         with col2:
             # Calcola il tasso di successo totale
@@ -686,15 +1585,22 @@ if file is not None:
             else:
                 st.error(f"❌ {tasso_successo:.1f}% successo")
         
-        # Nome file personalizzato
-        nome_file = "date_normalizzate_multifogli.xlsx" if elabora_tutti_fogli else "date_normalizzate.xlsx"
+        # Nome file personalizzato: più fogli in CSV, Parquet o Feather vengono scaricati in uno ZIP
+        estensione, tipo_mime, _ = FORMATI_FILE_OUTPUT[formato_file]
+        if formato_file != 'xlsx' and len(fogli_export) > 1:
+            estensione, tipo_mime = '.zip', "application/zip"
+        nome_file = ("date_normalizzate_multifogli" if elabora_tutti_fogli else "date_normalizzate") + estensione
         
         st.download_button(
-            label="📊 Scarica Excel con date normalizzate",
-            data=output.getvalue(),
+            label="📊 Scarica Excel con date normalizzate" if formato_file == 'xlsx' else f"📊 Scarica {formato_file.upper()} con date normalizzate",
+            data=contenuto_temporaneo(output),
             file_name=nome_file,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mime=tipo_mime
         )
+        output.close()
+        if output_errori is not None:
+            output_errori.close()
+        mostra_prestazioni(prestazioni)
         
         # Aggiunge una nota informativa
         if elabora_tutti_fogli:
@@ -0,0 +1,199 @@
+"""
+Esecuzione in background dei lavori lunghi (lettura, conversione ed export), senza Streamlit.
+
+Un GestoreLavori esegue i lavori in un pool di thread di dimensione fissa, condiviso da tutte
+le sessioni: oltre i lavori simultanei i nuovi lavori restano in coda, oltre la lunghezza
+massima della coda vengono rifiutati, e ogni proprietario (la sessione dell'utente) ha al più
+un numero limitato di lavori attivi, così un solo utente non può occupare il server.
+
+Il lavoro è una funzione che riceve come unico argomento il proprio Lavoro, con cui segnala
+l'avanzamento per fase (ad esempio per foglio e colonna); a ogni segnalazione viene
+controllato l'annullamento, che interrompe il lavoro sollevando LavoroAnnullato:
+
+    gestore = GestoreLavori(lavori_simultanei=2)
+    lavoro = gestore.invia(lambda lavoro: converti(..., avanzamento=lavoro.aggiorna), "Conversione")
+    lavoro.frazione(), lavoro.stato, lavoro.risultato
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Stati di un lavoro
+IN_CODA = 'in coda'
+IN_ESECUZIONE = 'in esecuzione'
+COMPLETATO = 'completato'
+ANNULLATO = 'annullato'
+FALLITO = 'fallito'
+
+
+class LavoroAnnullato(Exception):
+    """Sollevata all'interno di un lavoro di cui è stato richiesto l'annullamento"""
+
+
+class ServerOccupato(Exception):
+    """Sollevata quando la coda dei lavori è piena"""
+
+
+class Lavoro:
+    """
+    Un lavoro in background: stato, avanzamento per fase, risultato oppure errore.
+
+    L'avanzamento è un dizionario fase -> (elaborati, totali); totali è None finché non è
+    noto. Solo il thread del lavoro scrive l'avanzamento, gli altri lo leggono.
+    """
+
+    def __init__(self, descrizione, proprietario=None):
+        self.identificativo = uuid.uuid4().hex
+        self.descrizione = descrizione
+        self.proprietario = proprietario
+        self.stato = IN_CODA
+        self.messaggio = ""
+        self.risultato = None
+        self.errore = None
+        self.inviato = time.time()
+        self.iniziato = self.terminato = None
+        self.futuro = None
+        self.fasi = {}
+        self.evento_annullamento = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def attivo(self):
+        return self.stato in (IN_CODA, IN_ESECUZIONE)
+
+    def controlla_annullamento(self):
+        """Solleva LavoroAnnullato se è stato richiesto l'annullamento"""
+        if self.evento_annullamento.is_set():
+            raise LavoroAnnullato(self.descrizione)
+
+    def prevedi(self, fasi):
+        """Registra in anticipo le fasi del lavoro, così la frazione completata non torna indietro"""
+        with self.lock:
+            for fase in fasi:
+                self.fasi.setdefault(fase, (0, None))
+
+    def aggiorna(self, fase, elaborati, totali=None, messaggio=None):
+        """Aggiorna l'avanzamento di una fase (e il messaggio); solleva LavoroAnnullato se richiesto"""
+        self.controlla_annullamento()
+        with self.lock:
+            self.fasi[fase] = (elaborati, totali)
+            if messaggio is not None:
+                self.messaggio = messaggio
+
+    def segnala(self, messaggio):
+        """Aggiorna solo il messaggio che descrive cosa sta facendo il lavoro; solleva LavoroAnnullato se richiesto"""
+        self.controlla_annullamento()
+        with self.lock:
+            self.messaggio = messaggio
+
+    def avanzamento(self):
+        """Copia dell'avanzamento per fase, da leggere mentre il lavoro prosegue"""
+        with self.lock:
+            return dict(self.fasi)
+
+    def frazione(self):
+        """Frazione completata: media delle fasi previste, ognuna elaborati / totali (0 se totali non è noto)"""
+        fasi = self.avanzamento()
+        if not fasi:
+            return 0.0
+        return sum(min(elaborati / totali, 1.0) if totali else float(totali == 0)
+                   for elaborati, totali in fasi.values()) / len(fasi)
+
+    def annulla(self):
+        """Richiede l'annullamento: un lavoro in coda non parte, uno in esecuzione si ferma al prossimo aggiornamento"""
+        self.evento_annullamento.set()
+        if self.futuro is not None and self.futuro.cancel():
+            self.termina(ANNULLATO)
+
+    def termina(self, stato):
+        self.stato = stato
+        self.terminato = time.time()
+
+
+class GestoreLavori:
+    """
+    Pool di thread limitato che esegue i lavori, condiviso tra sessioni.
+
+    Args:
+        lavori_simultanei: lavori eseguiti contemporaneamente, gli altri restano in coda
+        max_lavori_attivi: lavori in coda o in esecuzione oltre i quali invia solleva ServerOccupato
+        max_lavori_per_proprietario: lavori attivi per proprietario; un nuovo lavoro annulla il più vecchio
+        conserva_secondi: dopo quanto i lavori terminati e mai ritirati vengono dimenticati
+    """
+
+    def __init__(self, lavori_simultanei=2, max_lavori_attivi=8, max_lavori_per_proprietario=1, conserva_secondi=1800):
+        self.pool = ThreadPoolExecutor(max_workers=lavori_simultanei, thread_name_prefix='lavoro')
+        self.max_lavori_attivi = max_lavori_attivi
+        self.max_lavori_per_proprietario = max_lavori_per_proprietario
+        self.conserva_secondi = conserva_secondi
+        self.lavori = {}
+        self.lock = threading.Lock()
+
+    def invia(self, funzione, descrizione, proprietario=None):
+        """
+        Mette in coda funzione(lavoro) e restituisce subito il Lavoro.
+
+        Raises:
+            ServerOccupato: se i lavori attivi hanno raggiunto il massimo
+        """
+        with self.lock:
+            self.dimentica_scaduti()
+            attivi = [lavoro for lavoro in self.lavori.values() if lavoro.attivo]
+            if proprietario is not None:
+                del_proprietario = [lavoro for lavoro in attivi if lavoro.proprietario == proprietario]
+                while len(del_proprietario) >= self.max_lavori_per_proprietario:
+                    del_proprietario.pop(0).annulla()
+                attivi = [lavoro for lavoro in attivi if lavoro.attivo]
+            if len(attivi) >= self.max_lavori_attivi:
+                raise ServerOccupato(f"{len(attivi)} lavori già in corso o in coda")
+
+            lavoro = Lavoro(descrizione, proprietario)
+            self.lavori[lavoro.identificativo] = lavoro
+            lavoro.futuro = self.pool.submit(self.esegui, lavoro, funzione)
+        logger.info("Lavoro %s inviato: %s", lavoro.identificativo, descrizione)
+        return lavoro
+
+    def esegui(self, lavoro, funzione):
+        if lavoro.evento_annullamento.is_set():
+            lavoro.termina(ANNULLATO)
+            return
+        lavoro.stato = IN_ESECUZIONE
+        lavoro.iniziato = time.time()
+        try:
+            lavoro.risultato = funzione(lavoro)
+        except LavoroAnnullato:
+            lavoro.termina(ANNULLATO)
+            logger.info("Lavoro %s annullato dopo %.1f s", lavoro.identificativo, lavoro.terminato - lavoro.iniziato)
+        except Exception as e:
+            lavoro.errore = e
+            lavoro.termina(FALLITO)
+            logger.exception("Lavoro %s fallito: %s", lavoro.identificativo, lavoro.descrizione)
+        else:
+            lavoro.termina(COMPLETATO)
+            logger.info("Lavoro %s completato in %.1f s", lavoro.identificativo, lavoro.terminato - lavoro.iniziato)
+
+    def ottieni(self, identificativo):
+        """Il lavoro con questo identificativo, oppure None se non esiste (più)"""
+        with self.lock:
+            return self.lavori.get(identificativo)
+
+    def ritira(self, identificativo):
+        """Rimuove un lavoro terminato, di cui chi l'ha inviato ha già usato il risultato"""
+        with self.lock:
+            self.lavori.pop(identificativo, None)
+
+    def posizione_in_coda(self, lavoro):
+        """Numero di lavori in coda inviati prima di questo (0 se è il prossimo a partire)"""
+        with self.lock:
+            return sum(1 for altro in self.lavori.values() if altro.stato == IN_CODA and altro.inviato < lavoro.inviato)
+
+    def dimentica_scaduti(self):
+        """Dimentica i lavori terminati da più di conserva_secondi (chiamata con il lock acquisito)"""
+        limite = time.time() - self.conserva_secondi
+        for identificativo in [identificativo for identificativo, lavoro in self.lavori.items()
+                               if not lavoro.attivo and lavoro.terminato < limite]:
+            del self.lavori[identificativo]
@@ -0,0 +1,454 @@
+"""
+Servizio HTTP locale per normalizzare date da altri programmi, senza Streamlit.
+
+Uso:
+    python normalizza_servizio.py [--host 127.0.0.1] [--porta 8765] [--processi 2]
+
+Endpoint:
+    POST /valori   corpo JSON {"valori": [...], "numeri": ["seriale_excel", ...]} (numeri facoltativo)
+                   -> {"risultati": [{"valore": ..., "data": "aaaa-mm-gg" oppure null, "convertita": bool}],
+                       "convertiti": n, "totali": n}
+    POST /file     corpo: il file (Excel, CSV, Parquet o Feather); parametri nella query: colonne (ripetibile,
+                   obbligatorio), formato, ordina_per, ordina (0/1), foglio (ripetibile), numeri (ripetibile),
+                   motore, formato_file (xlsx, csv, parquet, feather; un file Excel in CSV, Parquet o
+                   Feather diventa uno ZIP con un file per foglio)
+                   -> il file normalizzato; le statistiche sono nell'intestazione X-Statistiche
+    GET  /stato    -> stato del servizio
+
+Esempi:
+    curl -d '{"valori": ["12/03/2024", "3 marzo 2024", 45000]}' http://127.0.0.1:8765/valori
+    curl --data-binary @vendite.xlsx "http://127.0.0.1:8765/file?colonne=Data" -o vendite_normalizzato.xlsx
+
+I valori vengono interpretati con le stesse regole di normalizza_data. Le richieste di valori che
+arrivano insieme vengono raggruppate in un unico lotto, così ogni valore distinto viene convertito
+una volta sola; lotti e file vengono elaborati da un pool di processi di dimensione fissa.
+ClientNormalizzazione chiama il servizio da Python (solo libreria standard).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from normalizza_core import (
+    FORMATI_FILE_OUTPUT, FORMATI_OUTPUT, INTERVALLI_NUMERICI, MOTORI_LETTURA, FileNonValido, estensione_file_normalizzato,
+    normalizza_colonna, normalizza_file, tipo_file
+)
+
+logger = logging.getLogger(__name__)
+
+PORTA_PREDEFINITA = 8765
+
+# Attesa massima (in secondi) per raccogliere altre richieste nello stesso lotto, e valori
+# massimi per lotto: un lotto parte appena raggiunge uno dei due limiti
+ATTESA_LOTTO = 0.005
+MAX_VALORI_LOTTO = 50000
+
+# Limiti di una singola richiesta
+MAX_VALORI_RICHIESTA = 1000000
+MAX_DIMENSIONE_RICHIESTA_MB = 200
+
+
+def converti_lotto(valori, numeri=None):
+    """
+    Converte un lotto di valori (eseguito nei processi del pool) con normalizza_colonna:
+    stesse regole di normalizza_data, una sola conversione per ogni valore distinto.
+
+    Returns:
+        lista di date ISO (aaaa-mm-gg), None per i valori non convertiti
+    """
+    intervalli_numerici = None if numeri is None else {nome: INTERVALLI_NUMERICI[nome] for nome in numeri}
+    date, convertite, _ = normalizza_colonna(pd.Series(valori, dtype=object), {}, intervalli_numerici)
+    return date.dt.strftime('%Y-%m-%d').astype(object).where(convertite, None).tolist()
+
+
+def normalizza_contenuto(contenuto, opzioni):
+    """
+    Normalizza un file ricevuto come bytes (eseguito nei processi del pool) con normalizza_file.
+
+    Returns:
+        tupla (contenuto del file normalizzato, statistiche per foglio e colonna)
+    """
+    with tempfile.TemporaryDirectory(prefix='normalizza_servizio_') as cartella:
+        tipo = tipo_file(contenuto)
+        percorso = os.path.join(cartella, f"originale.{tipo}")
+        percorso_output = os.path.join(cartella, "normalizzato" + estensione_file_normalizzato(opzioni.get('formato_file', 'xlsx'), tipo))
+        with open(percorso, 'wb') as f:
+            f.write(contenuto)
+        statistiche = normalizza_file(percorso, percorso_output=percorso_output, **opzioni)
+        with open(percorso_output, 'rb') as f:
+            return f.read(), statistiche
+
+
+class RaggruppatoreValori:
+    """
+    Raggruppa in lotti le richieste di conversione che arrivano insieme: un thread raccoglie le
+    richieste per al più ATTESA_LOTTO secondi (o MAX_VALORI_LOTTO valori), invia al pool un lotto
+    per ogni combinazione di opzioni e restituisce a ogni richiesta la propria parte del risultato.
+
+    invia è la funzione che manda un lavoro al pool e ne restituisce il Future (vedi ServizioNormalizzazione.invia).
+    """
+
+    def __init__(self, invia, attesa=ATTESA_LOTTO, max_valori=MAX_VALORI_LOTTO):
+        self.invia = invia
+        self.attesa = attesa
+        self.max_valori = max_valori
+        self.coda = queue.Queue()
+        self.lotti = 0
+        self.richieste = 0
+        self.thread = threading.Thread(target=self.raccogli, name='raggruppatore', daemon=True)
+        self.thread.start()
+
+    def converti(self, valori, numeri=None):
+        """Converte i valori di una richiesta insieme a quelli delle richieste contemporanee; vedi converti_lotto"""
+        futuro = Future()
+        self.coda.put((list(valori), None if numeri is None else tuple(numeri), futuro))
+        return futuro.result()
+
+    def chiudi(self):
+        self.coda.put(None)
+        self.thread.join()
+
+    def raccogli(self):
+        while True:
+            richiesta = self.coda.get()
+            if richiesta is None:
+                return
+            lotto = [richiesta]
+            valori_lotto = len(richiesta[0])
+            scadenza = time.monotonic() + self.attesa
+            while valori_lotto < self.max_valori:
+                try:
+                    richiesta = self.coda.get(timeout=max(scadenza - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if richiesta is None:
+                    self.coda.put(None)
+                    break
+                lotto.append(richiesta)
+                valori_lotto += len(richiesta[0])
+
+            # Un lotto per ogni combinazione di opzioni
+            gruppi = {}
+            for valori, numeri, futuro in lotto:
+                gruppi.setdefault(numeri, []).append((valori, futuro))
+            for numeri, richieste in gruppi.items():
+                self.lotti += 1
+                self.richieste += len(richieste)
+                try:
+                    futuro_lotto = self.invia(converti_lotto, [valore for valori, _ in richieste for valore in valori], numeri)
+                except Exception as e:
+                    for _, futuro in richieste:
+                        futuro.set_exception(e)
+                    continue
+                futuro_lotto.add_done_callback(lambda futuro_lotto, richieste=richieste: self.distribuisci(futuro_lotto, richieste))
+
+    @staticmethod
+    def distribuisci(futuro_lotto, richieste):
+        """Restituisce a ogni richiesta del lotto la propria parte del risultato (o l'errore)"""
+        # Un lotto annullato dalla chiusura del pool non ha né risultato né eccezione
+        if futuro_lotto.cancelled():
+            errore = RuntimeError("Servizio in chiusura: conversione annullata")
+        else:
+            errore = futuro_lotto.exception()
+        if errore is not None:
+            for _, futuro in richieste:
+                futuro.set_exception(errore)
+            return
+        risultato = futuro_lotto.result()
+        inizio = 0
+        for valori, futuro in richieste:
+            futuro.set_result(risultato[inizio:inizio + len(valori)])
+            inizio += len(valori)
+
+
+class ServizioNormalizzazione:
+    """Pool di processi e raggruppatore dei valori condivisi da tutte le richieste del server"""
+
+    def __init__(self, processi=None):
+        self.processi = processi or min(4, os.cpu_count() or 1)
+        self.blocco_pool = threading.Lock()
+        self.pool = self.crea_pool()
+        self.pool_ricreati = 0
+        self.chiuso = False
+        self.raggruppatore = RaggruppatoreValori(self.invia)
+        self.file_elaborati = 0
+
+    def crea_pool(self):
+        # "spawn" evita di duplicare con fork i thread del server
+        return ProcessPoolExecutor(max_workers=self.processi, mp_context=multiprocessing.get_context('spawn'))
+
+    def invia(self, funzione, *argomenti):
+        """
+        Manda un lavoro al pool e ne restituisce il Future. Se un processo del pool è terminato
+        all'improvviso (ad esempio per mancanza di memoria) il pool è rotto e rifiuta nuovi lavori:
+        viene sostituito con uno nuovo. I lavori in corso in quel momento falliscono con BrokenProcessPool.
+        """
+        pool = self.pool
+        try:
+            return pool.submit(funzione, *argomenti)
+        except BrokenProcessPool:
+            return self.ricrea_pool(pool).submit(funzione, *argomenti)
+
+    def ricrea_pool(self, pool_rotto):
+        """Sostituisce il pool rotto, una volta sola anche se più richieste se ne accorgono insieme"""
+        with self.blocco_pool:
+            if self.pool is pool_rotto and not self.chiuso:
+                logger.warning("Un processo del pool è terminato: il pool viene ricreato")
+                pool_rotto.shutdown(wait=False, cancel_futures=True)
+                self.pool = self.crea_pool()
+                self.pool_ricreati += 1
+            return self.pool
+
+    def converti_valori(self, valori, numeri=None):
+        return self.raggruppatore.converti(valori, numeri)
+
+    def normalizza_file(self, contenuto, opzioni):
+        risultato = self.invia(normalizza_contenuto, contenuto, opzioni).result()
+        self.file_elaborati += 1
+        return risultato
+
+    def stato(self):
+        return {'stato': 'ok', 'processi': self.processi, 'lotti': self.raggruppatore.lotti,
+                'richieste_valori': self.raggruppatore.richieste, 'file_elaborati': self.file_elaborati,
+                'pool_ricreati': self.pool_ricreati}
+
+    def chiudi(self):
+        self.raggruppatore.chiudi()
+        with self.blocco_pool:
+            self.chiuso = True
+            self.pool.shutdown(cancel_futures=True)
+
+
+class RichiestaNonValida(ValueError):
+    """Errore nei dati della richiesta: il servizio risponde 400"""
+
+
+def leggi_numeri(numeri):
+    """Valida i nomi degli intervalli numerici richiesti (None: tutti)"""
+    if numeri is None:
+        return None
+    if not isinstance(numeri, list) or any(nome not in INTERVALLI_NUMERICI for nome in numeri):
+        raise RichiestaNonValida(f"'numeri' deve essere una lista tra: {', '.join(INTERVALLI_NUMERICI)}")
+    return numeri
+
+
+def opzioni_file(query):
+    """Opzioni di normalizza_file dai parametri della query di /file"""
+    parametri = urllib.parse.parse_qs(query, keep_blank_values=True)
+    colonne = [colonna for colonna in parametri.get('colonne', []) if colonna]
+    if not colonne:
+        raise RichiestaNonValida("Indica almeno una colonna con il parametro 'colonne'")
+    formato = parametri.get('formato', ["gg-mm-aaaa"])[-1]
+    if formato not in FORMATI_OUTPUT:
+        raise RichiestaNonValida(f"'formato' deve essere uno tra: {', '.join(FORMATI_OUTPUT)}")
+    motore = parametri.get('motore', [None])[-1] or None
+    if motore is not None and motore not in MOTORI_LETTURA:
+        raise RichiestaNonValida(f"'motore' deve essere uno tra: {', '.join(MOTORI_LETTURA)}")
+    formato_file = parametri.get('formato_file', ['xlsx'])[-1]
+    if formato_file not in FORMATI_FILE_OUTPUT:
+        raise RichiestaNonValida(f"'formato_file' deve essere uno tra: {', '.join(FORMATI_FILE_OUTPUT)}")
+    # numeri assente: tutti gli intervalli; numeri vuoto: nessuno
+    numeri = parametri.get('numeri')
+    if numeri is not None:
+        numeri = leggi_numeri([nome for nome in numeri if nome])
+    return {
+        'colonne': colonne,
+        'formato': FORMATI_OUTPUT[formato],
+        'colonna_ordinamento': parametri.get('ordina_per', [colonne[0]])[-1],
+        'ordina_date': parametri.get('ordina', ['1'])[-1] not in ('0', 'false', 'no'),
+        'fogli': parametri.get('foglio') or None,
+        'intervalli_numerici': None if numeri is None else {nome: INTERVALLI_NUMERICI[nome] for nome in numeri},
+        'motore': motore,
+        'formato_file': formato_file,
+    }
+
+
+class GestoreRichieste(BaseHTTPRequestHandler):
+    """Gestore HTTP: ogni richiesta è servita in un proprio thread, il lavoro avviene nel pool del servizio"""
+
+    server_version = "NormalizzaDate/1.0"
+
+    def log_message(self, formato, *argomenti):
+        logger.info("%s - %s", self.address_string(), formato % argomenti)
+
+    def rispondi(self, codice, corpo, tipo="application/json", intestazioni=None):
+        if not isinstance(corpo, bytes):
+            corpo = json.dumps(corpo, ensure_ascii=False, default=str).encode('utf-8')
+            tipo = "application/json; charset=utf-8"
+        self.send_response(codice)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valore in (intestazioni or {}).items():
+            self.send_header(nome, valore)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def leggi_corpo(self):
+        lunghezza = int(self.headers.get('Content-Length') or 0)
+        if lunghezza > MAX_DIMENSIONE_RICHIESTA_MB * 1024 * 1024:
+            raise RichiestaNonValida(f"Richiesta oltre {MAX_DIMENSIONE_RICHIESTA_MB} MB")
+        return self.rfile.read(lunghezza)
+
+    def do_GET(self):
+        if urllib.parse.urlsplit(self.path).path == '/stato':
+            self.rispondi(200, self.server.servizio.stato())
+        else:
+            self.rispondi(404, {'errore': f"Percorso sconosciuto: {self.path}"})
+
+    def do_POST(self):
+        indirizzo = urllib.parse.urlsplit(self.path)
+        try:
+            if indirizzo.path == '/valori':
+                self.valori()
+            elif indirizzo.path == '/file':
+                self.file(indirizzo.query)
+            else:
+                self.rispondi(404, {'errore': f"Percorso sconosciuto: {indirizzo.path}"})
+        # Solo gli errori nei dati della richiesta sono del client: il resto è un errore del servizio
+        except (RichiestaNonValida, FileNonValido) as e:
+            self.rispondi(400, {'errore': str(e)})
+        except Exception as e:
+            logger.exception("Errore nella richiesta %s", self.path)
+            self.rispondi(500, {'errore': str(e)})
+
+    def valori(self):
+        try:
+            richiesta = json.loads(self.leggi_corpo() or b'{}')
+        except json.JSONDecodeError as e:
+            raise RichiestaNonValida(f"JSON non valido: {e}")
+        valori = richiesta.get('valori') if isinstance(richiesta, dict) else None
+        if not isinstance(valori, list):
+            raise RichiestaNonValida("Il corpo deve contenere 'valori', una lista di testi o numeri")
+        if len(valori) > MAX_VALORI_RICHIESTA:
+            raise RichiestaNonValida(f"Al più {MAX_VALORI_RICHIESTA} valori per richiesta")
+        if any(isinstance(valore, (list, dict)) for valore in valori):
+            raise RichiestaNonValida("I valori devono essere testi, numeri o null")
+
+        date = self.server.servizio.converti_valori(valori, leggi_numeri(richiesta.get('numeri')))
+        convertiti = sum(data is not None for data in date)
+        self.rispondi(200, {
+            'risultati': [{'valore': valore, 'data': data, 'convertita': data is not None} for valore, data in zip(valori, date)],
+            'convertiti': convertiti,
+            'totali': len(valori)
+        })
+
+    def file(self, query):
+        opzioni = opzioni_file(query)
+        contenuto = self.leggi_corpo()
+        if not contenuto:
+            raise RichiestaNonValida("Il corpo della richiesta deve contenere il file da normalizzare")
+        contenuto_output, statistiche = self.server.servizio.normalizza_file(contenuto, opzioni)
+        convertite = sum(stats['convertiti'] for stats_foglio in statistiche.values() for stats in stats_foglio.values())
+        totali = sum(stats['totali'] for stats_foglio in statistiche.values() for stats in stats_foglio.values())
+        estensione = estensione_file_normalizzato(opzioni['formato_file'], tipo_file(contenuto))
+        tipo = "application/zip" if estensione == '.zip' else FORMATI_FILE_OUTPUT[opzioni['formato_file']][1]
+        self.rispondi(200, contenuto_output, tipo, {
+            'Content-Disposition': f'attachment; filename="date_normalizzate{estensione}"',
+            'X-Date-Convertite': str(convertite),
+            'X-Date-Totali': str(totali),
+            'X-Statistiche': json.dumps(statistiche, default=str),
+        })
+
+
+def crea_server(host="127.0.0.1", porta=PORTA_PREDEFINITA, processi=None):
+    """
+    Crea il server (non ancora avviato) con il proprio servizio; con porta 0 viene scelta una
+    porta libera, leggibile da server.server_address. Va chiuso con chiudi_server.
+    """
+    server = ThreadingHTTPServer((host, porta), GestoreRichieste)
+    server.daemon_threads = True
+    server.servizio = ServizioNormalizzazione(processi)
+    return server
+
+
+def chiudi_server(server):
+    server.shutdown()
+    server.server_close()
+    server.servizio.chiudi()
+
+
+class ClientNormalizzazione:
+    """
+    Client del servizio con la sola libreria standard:
+
+        client = ClientNormalizzazione("http://127.0.0.1:8765")
+        client.normalizza_valori(["12/03/2024", "3 marzo 2024"])
+        contenuto, statistiche = client.normalizza_file(open("vendite.xlsx", "rb").read(), ["Data"])
+    """
+
+    def __init__(self, indirizzo=f"http://127.0.0.1:{PORTA_PREDEFINITA}", timeout=600):
+        self.indirizzo = indirizzo.rstrip('/')
+        self.timeout = timeout
+
+    def chiama(self, percorso, corpo=None, tipo="application/json"):
+        richiesta = urllib.request.Request(self.indirizzo + percorso, data=corpo, headers={"Content-Type": tipo})
+        try:
+            with urllib.request.urlopen(richiesta, timeout=self.timeout) as risposta:
+                return risposta.read(), risposta.headers
+        except urllib.error.HTTPError as e:
+            raise ValueError(json.loads(e.read()).get('errore', str(e))) from None
+
+    def stato(self):
+        return json.loads(self.chiama('/stato')[0])
+
+    def normalizza_valori(self, valori, numeri=None):
+        """Restituisce la lista dei risultati per valore: {'valore', 'data', 'convertita'}"""
+        richiesta = {'valori': list(valori)}
+        if numeri is not None:
+            richiesta['numeri'] = list(numeri)
+        return json.loads(self.chiama('/valori', json.dumps(richiesta).encode('utf-8'))[0])['risultati']
+
+    def normalizza_file(self, contenuto, colonne, formato=None, colonna_ordinamento=None, ordina_date=True,
+                        fogli=None, numeri=None, motore=None, formato_file=None):
+        """Restituisce (contenuto del file normalizzato, statistiche per foglio e colonna)"""
+        parametri = [('colonne', colonna) for colonna in colonne] + [('foglio', foglio) for foglio in fogli or []]
+        if formato is not None:
+            parametri.append(('formato', formato))
+        if colonna_ordinamento is not None:
+            parametri.append(('ordina_per', colonna_ordinamento))
+        if not ordina_date:
+            parametri.append(('ordina', '0'))
+        if numeri is not None:
+            parametri += [('numeri', nome) for nome in numeri] or [('numeri', '')]
+        if motore is not None:
+            parametri.append(('motore', motore))
+        if formato_file is not None:
+            parametri.append(('formato_file', formato_file))
+        corpo, intestazioni = self.chiama('/file?' + urllib.parse.urlencode(parametri), contenuto, "application/octet-stream")
+        return corpo, json.loads(intestazioni['X-Statistiche'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servizio HTTP locale per la normalizzazione delle date.")
+    parser.add_argument('--host', default="127.0.0.1", help="Indirizzo di ascolto (default: %(default)s)")
+    parser.add_argument('--porta', type=int, default=PORTA_PREDEFINITA, help="Porta di ascolto (default: %(default)s)")
+    parser.add_argument('--processi', type=int, default=min(4, os.cpu_count() or 1),
+                        help="Processi che convertono lotti e file (default: %(default)s)")
+    argomenti = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = crea_server(argomenti.host, argomenti.porta, argomenti.processi)
+    logger.info("Servizio in ascolto su http://%s:%d con %d processi", *server.server_address[:2], argomenti.processi)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        chiudi_server(server)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+"""Configurazione dei test: i moduli normalizza_* sono nella cartella principale del progetto"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,77 @@
+"""Test dell'elaborazione a blocchi (elabora_foglio_streaming) rispetto all'elaborazione in memoria"""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+import xlsxwriter
+
+import normalizza_core
+from normalizza_core import elabora_foglio_streaming, normalizza_dataframe, scrivi_excel_normalizzato
+
+COLONNE = ['Data', 'Altra']
+
+
+@pytest.fixture
+def blocchi_piccoli(monkeypatch):
+    """Blocchi di poche righe, così anche un foglio piccolo viene diviso in più sequenze da fondere"""
+    monkeypatch.setattr(normalizza_core, 'RIGHE_BLOCCO_STREAMING', 4)
+    monkeypatch.setattr(normalizza_core, 'RIGHE_BLOCCO_FUSIONE', 3)
+
+
+def contenuto_excel(seme=0):
+    """Foglio con molte date uguali in blocchi diversi, valori non convertibili e celle vuote"""
+    casuale = np.random.default_rng(seme)
+    date = casuale.choice(['2020-01-02', '01/01/2020', '3 marzo 2019', '2021-05-05', 'ciao', 'xx', None], size=37)
+    altra = casuale.choice(['12/03/2024', 'boh', None], size=len(date))
+    buffer = io.BytesIO()
+    pd.DataFrame({'Id': range(len(date)), 'Data': date, 'Altra': altra}).to_excel(buffer, index=False, sheet_name='F')
+    return buffer.getvalue()
+
+
+def streaming(contenuto, ordina_date):
+    normalizzato, errori = io.BytesIO(), io.BytesIO()
+    opzioni = {'constant_memory': True, 'default_date_format': 'dd/mm/yyyy'}
+    libro, libro_errori = xlsxwriter.Workbook(normalizzato, opzioni), xlsxwriter.Workbook(errori, opzioni)
+    statistiche = elabora_foglio_streaming(contenuto, 'F', COLONNE, 'Data', ordina_date, libro, libro_errori)
+    libro.close()
+    libro_errori.close()
+    return statistiche, normalizzato.getvalue(), errori.getvalue()
+
+
+def in_memoria(contenuto, ordina_date):
+    df = pd.read_excel(io.BytesIO(contenuto), sheet_name='F')
+    df_elaborato, statistiche, df_date, errori = normalizza_dataframe(df, COLONNE, '%d/%m/%Y', 'Data', ordina_date, 'F')
+    normalizzato, file_errori = io.BytesIO(), io.BytesIO()
+    scrivi_excel_normalizzato(normalizzato, {'F': (df_elaborato, df_date)}, COLONNE, 'dd/mm/yyyy',
+                              errori={'F': errori.posizioni_elaborate()}, destinazione_errori=file_errori)
+    return statistiche, normalizzato.getvalue(), file_errori.getvalue()
+
+
+@pytest.mark.parametrize('ordina_date', [True, False])
+@pytest.mark.parametrize('seme', [0, 1])
+def test_streaming_come_in_memoria(blocchi_piccoli, seme, ordina_date):
+    contenuto = contenuto_excel(seme)
+    statistiche, normalizzato, errori = streaming(contenuto, ordina_date)
+    statistiche_attese, normalizzato_atteso, errori_attesi = in_memoria(contenuto, ordina_date)
+
+    risultato = pd.read_excel(io.BytesIO(normalizzato))
+    pd.testing.assert_frame_equal(risultato, pd.read_excel(io.BytesIO(normalizzato_atteso)))
+    if ordina_date:
+        # A parità di data (e per le date mancanti, in fondo) resta l'ordine delle righe originali
+        date = risultato['Data'].fillna(pd.Timestamp.max)
+        assert (date.diff().dropna() >= pd.Timedelta(0)).all()
+        for _, gruppo in risultato.groupby(date, sort=False):
+            assert gruppo['Id'].is_monotonic_increasing
+    for colonna in COLONNE:
+        assert statistiche[colonna]['convertiti'] == statistiche_attese[colonna]['convertiti']
+
+    # Stesse righe nello stesso ordine; i valori non convertiti sono quelli originali. Le date
+    # convertite della stessa riga restano come nel file originale in streaming, formattate in memoria.
+    foglio_errori = pd.read_excel(io.BytesIO(errori), sheet_name='Errori_F')
+    foglio_errori_atteso = pd.read_excel(io.BytesIO(errori_attesi), sheet_name='Errori_F')
+    assert foglio_errori['Id'].tolist() == foglio_errori_atteso['Id'].tolist()
+    assert statistiche['Data']['righe_con_errori'] == len(foglio_errori_atteso)
+    for colonna in COLONNE:
+        non_convertite = risultato.set_index('Id').loc[foglio_errori['Id'], colonna].isna().to_numpy()
+        pd.testing.assert_series_equal(foglio_errori[colonna][non_convertite], foglio_errori_atteso[colonna][non_convertite])
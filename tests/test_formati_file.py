@@ -0,0 +1,112 @@
+"""Test della lettura e scrittura dei file CSV, Parquet e Feather (normalizza_file, leggi_tabella)"""
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from normalizza_core import FOGLIO_TABELLA, leggi_fogli_file, leggi_tabella, normalizza_file
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.feather  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+
+def scrivi_csv(percorso, righe, separatore=',', codifica='utf-8'):
+    percorso.write_bytes("\n".join(separatore.join(riga) for riga in righe).encode(codifica))
+    return percorso
+
+
+def leggi_arrow(percorso, formato_file):
+    if formato_file == 'parquet':
+        return pyarrow.parquet.read_table(percorso)
+    return pyarrow.feather.read_table(percorso)
+
+
+@pytest.mark.parametrize('formato_file', ['parquet', 'feather'])
+def test_date_native(tmp_path, formato_file):
+    ingresso = scrivi_csv(tmp_path / 'date.csv', [
+        ['Data', 'Importo', 'Nota'],
+        ['12/03/2024', '1', 'a'],
+        ['ciao', '2', 'b'],
+        ['3 marzo 2024', '3', 'c'],
+    ])
+    uscita = tmp_path / f'date.{formato_file}'
+    statistiche = normalizza_file(ingresso, ['Data'], uscita, formato_file=formato_file, ordina_date=False)
+
+    assert statistiche[FOGLIO_TABELLA]['Data']['convertiti'] == 2
+    tabella = leggi_arrow(uscita, formato_file)
+    # Le date sono date native, vuote dove il valore non è stato convertito; le altre colonne non cambiano
+    assert tabella.schema.field('Data').type == pa.date32()
+    assert tabella.schema.field('Importo').type == pa.int64()
+    assert tabella.column('Data').to_pylist() == [pd.Timestamp('2024-03-12').date(), None, pd.Timestamp('2024-03-03').date()]
+    assert tabella.column('Nota').to_pylist() == ['a', 'b', 'c']
+
+
+@pytest.mark.parametrize('formato_file', ['parquet', 'feather'])
+def test_date_con_orario(tmp_path, formato_file):
+    ingresso = tmp_path / 'orari.parquet'
+    pd.DataFrame({'Data': ['12/03/2024 10:30', '01/01/2020']}).to_parquet(ingresso)
+    uscita = tmp_path / f'orari.{formato_file}'
+    normalizza_file(ingresso, ['Data'], uscita, formato_file=formato_file, ordina_date=False)
+
+    tabella = leggi_arrow(uscita, formato_file)
+    assert pa.types.is_timestamp(tabella.schema.field('Data').type)
+    assert tabella.column('Data').to_pandas().tolist() == [pd.Timestamp('2024-03-12 10:30'), pd.Timestamp('2020-01-01')]
+
+
+@pytest.mark.parametrize('formato_file', ['parquet', 'feather'])
+def test_file_normalizzato_riletto(tmp_path, formato_file):
+    # Un file già normalizzato, con le date native, riletto dà le stesse date
+    ingresso = scrivi_csv(tmp_path / 'date.csv', [['Data'], ['01/01/2020'], ['12/03/2024'], ['boh']])
+    primo, secondo = tmp_path / f'primo.{formato_file}', tmp_path / f'secondo.{formato_file}'
+    normalizza_file(ingresso, ['Data'], primo, formato_file=formato_file)
+    statistiche = normalizza_file(primo, ['Data'], secondo, formato_file=formato_file)
+
+    assert statistiche[FOGLIO_TABELLA]['Data']['convertiti'] == 2
+    assert leggi_arrow(secondo, formato_file).equals(leggi_arrow(primo, formato_file))
+
+
+def test_csv_resta_testo(tmp_path):
+    ingresso = scrivi_csv(tmp_path / 'date.csv', [['Data', 'Città'], ['12/03/2024', 'Forlì'], ['ciao', 'Cantù']],
+                          separatore=';', codifica='cp1252')
+    uscita = tmp_path / 'normalizzato.csv'
+    normalizza_file(ingresso, ['Data'], uscita, formato='%Y-%m-%d', formato_file='csv', ordina_date=False)
+
+    # Il CSV scritto è in UTF-8 con la virgola, le date nel formato scelto e i valori non convertiti invariati
+    risultato = pd.read_csv(uscita)
+    assert risultato['Data'].tolist() == ['2024-03-12', 'ciao']
+    assert risultato['Città'].tolist() == ['Forlì', 'Cantù']
+
+
+def test_excel_con_piu_fogli_in_zip(tmp_path):
+    ingresso = tmp_path / 'fogli.xlsx'
+    with pd.ExcelWriter(ingresso) as writer:
+        pd.DataFrame({'Data': ['12/03/2024', 'ciao']}).to_excel(writer, sheet_name='A|B', index=False)
+        pd.DataFrame({'Data': ['01/01/2020']}).to_excel(writer, sheet_name='C', index=False)
+    uscita = tmp_path / 'fogli.zip'
+    normalizza_file(ingresso, ['Data'], uscita, formato_file='parquet', ordina_date=False)
+
+    with zipfile.ZipFile(uscita) as archivio:
+        assert sorted(archivio.namelist()) == ['A_B.parquet', 'C.parquet']
+        tabella = pyarrow.parquet.read_table(io.BytesIO(archivio.read('A_B.parquet')))
+    assert tabella.schema.field('Data').type == pa.date32()
+    assert tabella.column('Data').null_count == 1
+
+
+@pytest.mark.parametrize('formato_file', ['csv', 'parquet', 'feather'])
+def test_anteprima_prime_righe(tmp_path, formato_file):
+    df = pd.DataFrame({'Data': [f'{giorno:02d}/01/2020' for giorno in range(1, 21)], 'Numero': range(20)})
+    percorso = tmp_path / f'tabella.{formato_file}'
+    if formato_file == 'csv':
+        df.to_csv(percorso, sep=';', index=False)
+    elif formato_file == 'parquet':
+        df.to_parquet(percorso)
+    else:
+        df.to_feather(percorso)
+
+    for motore in (None, 'pyarrow'):
+        completo = leggi_tabella(str(percorso), formato_file, motore)
+        pd.testing.assert_frame_equal(completo, df, check_dtype=False)
+        pd.testing.assert_frame_equal(leggi_tabella(str(percorso), formato_file, motore, righe=5), completo.head(5))
+    assert list(leggi_fogli_file(percorso.read_bytes())) == [FOGLIO_TABELLA]
@@ -0,0 +1,58 @@
+"""Test della cache persistente delle date (normalizza_cache)"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import normalizza_core
+from normalizza_cache import CacheDatePersistente
+from normalizza_core import dipende_da_oggi, normalizza_colonna
+
+
+def test_date_completate_con_oggi_non_memorizzate(tmp_path):
+    cache = CacheDatePersistente(tmp_path / "date.sqlite3")
+    normalizza_colonna(pd.Series(['12/06', 'June 2020', 'giugno 2020', 'June 12, 2020 10:00', 'garbage']), {},
+                       cache_persistente=cache)
+    memorizzati = cache.cerca(['12/06', 'June 2020', 'giugno 2020', 'June 12, 2020 10:00', 'garbage'])
+    assert sorted(memorizzati) == ['June 12, 2020 10:00', 'garbage']
+    assert memorizzati['June 12, 2020 10:00'] == pd.Timestamp(2020, 6, 12, 10)
+    assert pd.isna(memorizzati['garbage'])
+    cache.chiudi()
+
+
+@pytest.mark.parametrize('testo, atteso', [
+    ('12/06', True), ('June 2020', True), ('giugno 2020', True), ('venerdì', True), ('10:30', True), (' 2020 ', True),
+    ('June 12, 2020 10:00', False), ('3 marzo 2024', False), ('giovedì 12 giugno 2025', False), ('garbage', False), ('', False),
+])
+def test_dipende_da_oggi(testo, atteso):
+    assert dipende_da_oggi(testo) is atteso
+
+
+def test_dipende_da_oggi_analizza_il_testo_una_volta(monkeypatch):
+    chiamate = []
+    analizza = normalizza_core.PARSER_DATEUTIL._parse
+    monkeypatch.setattr(normalizza_core.PARSER_DATEUTIL, '_parse', lambda testo, **opzioni: chiamate.append(testo) or analizza(testo, **opzioni))
+    assert dipende_da_oggi('12 June')
+    assert chiamate == ['12 June']
+
+
+def test_svuota_database_danneggiato(tmp_path):
+    percorso = tmp_path / "date.sqlite3"
+    percorso.write_bytes(b"non un database SQLite" * 100)
+    cache = CacheDatePersistente(percorso)
+    assert cache.svuota() is False
+    cache.chiudi()
+
+
+@pytest.mark.parametrize('errore', [sqlite3.OperationalError("disk I/O error"), UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')])
+def test_errori_del_database_non_interrompono(tmp_path, monkeypatch, errore):
+    # Tutti i metodi gestiscono gli stessi errori: la cache è un'ottimizzazione, non deve fermare l'elaborazione
+    cache = CacheDatePersistente(tmp_path / "date.sqlite3")
+
+    def connetti():
+        raise errore
+    monkeypatch.setattr(cache, 'connetti', connetti)
+    assert cache.cerca(['12/06/2024']) == {}
+    cache.salva(['12/06/2024'], [pd.Timestamp(2024, 6, 12)])
+    assert cache.statistiche() is None
+    assert cache.svuota() is False
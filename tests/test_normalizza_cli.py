@@ -0,0 +1,41 @@
+"""Test della riga di comando (normalizza_cli): codici di uscita e file scritti"""
+import pandas as pd
+
+from normalizza_cli import main
+
+
+def scrivi_csv(percorso, date):
+    pd.DataFrame({'Data': date, 'N': range(len(date))}).to_csv(percorso, index=False)
+    return percorso
+
+
+def test_tutte_le_date_convertite(tmp_path, capsys):
+    percorso = scrivi_csv(tmp_path / "completo.csv", ['03/01/2020', '2020-01-01', '2 gennaio 2020'])
+    assert main([str(percorso), '-c', 'Data', '-j', '1']) == 0
+    assert "OK" in capsys.readouterr().out
+    normalizzato = pd.read_excel(tmp_path / "completo_normalizzato.xlsx")
+    assert normalizzato['N'].tolist() == [1, 2, 0]
+
+
+def test_date_non_convertite(tmp_path):
+    percorso = scrivi_csv(tmp_path / "incompleto.csv", ['03/01/2020', 'n/d'])
+    assert main([str(percorso), '-c', 'Data', '-j', '1']) == 1
+    assert (tmp_path / "incompleto_normalizzato.xlsx").exists()
+
+
+def test_errori_di_elaborazione(tmp_path, capsys):
+    # Colonna assente: il file non viene elaborato
+    percorso = scrivi_csv(tmp_path / "senza_colonna.csv", ['03/01/2020'])
+    assert main([str(percorso), '-c', 'Scadenza', '-j', '1']) == 2
+    assert "ERRORE" in capsys.readouterr().err
+
+
+def test_nessun_file(tmp_path):
+    assert main([str(tmp_path / "vuota"), '-c', 'Data']) == 2
+
+
+def test_errore_prevale_sulle_date_non_convertite(tmp_path):
+    incompleto = scrivi_csv(tmp_path / "incompleto.csv", ['03/01/2020', 'n/d'])
+    senza_colonna = tmp_path / "senza_colonna.csv"
+    senza_colonna.write_text("Altro\n1\n")
+    assert main([str(incompleto), str(senza_colonna), '-c', 'Data', '-j', '1']) == 2
@@ -0,0 +1,298 @@
+"""Test della logica di normalizzazione (normalizza_core)"""
+import calendar
+import math
+import random
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from normalizza_core import (
+    FORMATI_DATA, FORMATI_DATA_IT, INTERVALLI_NUMERICI, MESI_EN, MESI_IT, MESI_IT_ABBR, GIORNI_EN, GIORNI_IT, GIORNI_IT_ABBR,
+    MappaErrori, converti_numeri, date_ns, date_plausibili, normalizza_colonna, normalizza_data, normalizza_dataframe,
+    riconosci_data, rileva_colonne_date
+)
+
+
+def valori_misti(numero, seme):
+    """Valori come quelli dei fogli reali: date in tutti i formati, nomi italiani, numeri, testi e vuoti"""
+    casuale = random.Random(seme)
+    valori = []
+    for _ in range(numero):
+        data = datetime(1950, 1, 1) + timedelta(days=casuale.randrange(40000))
+        tipo = casuale.random()
+        if tipo < 0.6:
+            valori.append(data.strftime(casuale.choice(FORMATI_DATA)))
+        elif tipo < 0.7:
+            valori.append(f"{GIORNI_IT[data.weekday()]} {data.day} {MESI_IT[data.month - 1]} {data.year}")
+        elif tipo < 0.8:
+            valori.append(casuale.choice([float(casuale.randrange(1, 60000)), casuale.randrange(10**9, 2 * 10**9), 12.5, -3]))
+        elif tipo < 0.9:
+            valori.append(casuale.choice(['', 'n/d', 'garbage', '31/02/2020', '2020-13-01', '  01/02/2003  ', 'June 2020',
+                                          '12/06', '2020-06-12T10:30:00', 'Mar 3 2001', None, True, data]))
+        else:
+            valori.append(data.strftime(casuale.choice(FORMATI_DATA)).upper())
+    return valori
+
+
+def riconosci_con_strptime(testo, formati=FORMATI_DATA):
+    """Riferimento: i formati provati in ordine con strptime, il primo che non solleva eccezioni vince"""
+    for formato in formati:
+        try:
+            return datetime.strptime(testo, formato)
+        except ValueError:
+            continue
+    return None
+
+
+def componi_data(formato, anno, mese, giorno, nome_mese, nome_giorno, zeri=True):
+    """Testo di una data nel formato, anche inesistente (es. 30 febbraio), con i nomi indicati"""
+    sostituzioni = {
+        '%Y': f"{anno:04d}", '%m': f"{mese:02d}" if zeri else str(mese), '%d': f"{giorno:02d}" if zeri else str(giorno),
+        '%b': nome_mese[:3], '%B': nome_mese, '%a': nome_giorno[:3], '%A': nome_giorno,
+    }
+    return re.sub(r'%.', lambda direttiva: sostituzioni[direttiva.group(0)], formato)
+
+
+def date_di_prova():
+    """Date distribuite su più secoli, più giorni e mesi a una cifra, fine mese e 29 febbraio"""
+    date = [(d.year, d.month, d.day) for d in (datetime(1901, 1, 1) + timedelta(days=401 * i) for i in range(120))]
+    return date + [(2024, 2, 29), (2000, 2, 29), (1999, 12, 31), (2001, 1, 9), (2012, 12, 13), (1, 1, 1)]
+
+
+# Date inesistenti: giorno oltre la fine del mese, 29 febbraio non bisestile, mese 13
+DATE_INESISTENTI = [(2024, 2, 30), (2023, 2, 29), (2024, 4, 31), (1900, 2, 29), (2024, 13, 1), (2024, 1, 32)]
+
+
+def test_riconoscitore_come_strptime():
+    valori = []
+    for formato in FORMATI_DATA:
+        for anno, mese, giorno in date_di_prova() + DATE_INESISTENTI:
+            nome_mese = MESI_EN[(mese - 1) % 12].capitalize()
+            nome_giorno = GIORNI_EN[(anno + mese + giorno) % 7].capitalize()
+            testo = componi_data(formato, anno, mese, giorno, nome_mese, nome_giorno)
+            valori += [testo, testo.upper(), testo.lower(), componi_data(formato, anno, mese, giorno, nome_mese, nome_giorno, zeri=False)]
+    # Numeri compatti ambigui e testi che non sono date
+    valori += ['2024123', '202411', '20240230', '1/2/3', '2024-1-1', '12 Juni 2024', 'June 2020', '', 'n/d', '31.12.99']
+
+    differenze = [(valore, riconosci_data(valore), riconosci_con_strptime(valore))
+                  for valore in valori if riconosci_data(valore) != riconosci_con_strptime(valore)]
+    assert not differenze, differenze[:5]
+
+    # Il formato restituito è quello che produce la data
+    for valore in valori:
+        data, indice = riconosci_data(valore, con_formato=True)
+        assert data == riconosci_data(valore)
+        assert (indice is None if data is None else datetime.strptime(valore, FORMATI_DATA[indice]) == data), valore
+
+
+@pytest.mark.parametrize('giorni', [GIORNI_IT, [giorno.replace('ì', 'i') for giorno in GIORNI_IT], GIORNI_IT_ABBR])
+@pytest.mark.parametrize('mesi', [MESI_IT, MESI_IT_ABBR])
+def test_riconoscitore_nomi_italiani(mesi, giorni):
+    # Riferimento: lo stesso testo con i nomi inglesi, letto con strptime
+    valori, attesi, inglesi = [], [], []
+    for formato in FORMATI_DATA_IT:
+        for anno, mese, giorno in date_di_prova() + DATE_INESISTENTI[:4]:
+            indice_giorno = calendar.weekday(anno, mese, min(giorno, 28))
+            testo = componi_data(formato, anno, mese, giorno, mesi[mese - 1], giorni[indice_giorno])
+            inglese = componi_data(formato, anno, mese, giorno, MESI_EN[mese - 1], GIORNI_EN[indice_giorno])
+            valori += [testo, testo.upper(), testo.capitalize()]
+            attesi += [riconosci_con_strptime(inglese, FORMATI_DATA_IT)] * 3
+            inglesi += [inglese] * 3
+
+    differenze = [(valore, riconosci_data(valore), atteso) for valore, atteso in zip(valori, attesi)
+                  if riconosci_data(valore) != atteso]
+    assert not differenze, differenze[:5]
+
+    # Il formato restituito, con i nomi inglesi, legge la stessa data ("mar" è anche l'inglese "Mar")
+    formati = FORMATI_DATA + FORMATI_DATA_IT
+    for valore, inglese, atteso in zip(valori, inglesi, attesi):
+        data, indice = riconosci_data(valore, con_formato=True)
+        if data is not None:
+            assert datetime.strptime(valore if indice < len(FORMATI_DATA) else inglese, formati[indice]) == data, valore
+    assert sum(atteso is None for atteso in attesi) == 3 * len(FORMATI_DATA_IT) * 4
+
+
+@pytest.mark.parametrize('seme', [0, 1, 2])
+def test_conversione_in_blocco_come_normalizza_data(seme):
+    # La conversione per colonna deve dare, valore per valore, la stessa data di normalizza_data
+    valori = valori_misti(2000, seme)
+    date, convertite, _ = normalizza_colonna(pd.Series(valori, dtype=object))
+    for valore, data, convertita in zip(valori, date, convertite):
+        attesa = normalizza_data(valore)[1] if valore is not None else None
+        if attesa is None:
+            assert not convertita, valore
+        else:
+            assert convertita and data == pd.Timestamp(attesa).tz_localize(None), valore
+
+
+def test_date_fuori_intervallo_ns_non_convertite():
+    # pandas 3 restituisce date in microsecondi: il 31/12/9999 non deve diventare una data del 1816
+    valori = pd.Series(['9999-12-31', '0001-01-01', '31/12/9999', datetime(9999, 12, 31), '2020-01-05', '1700-01-01'])
+    date, convertite, _ = normalizza_colonna(valori)
+    assert convertite.tolist() == [False, False, False, False, True, True]
+    assert date.isna().tolist() == [True, True, True, True, False, False]
+    assert date[4] == pd.Timestamp(2020, 1, 5)
+    assert date[5] == pd.Timestamp(1700, 1, 1)
+
+
+def test_date_ns_ai_limiti():
+    date = np.array(['1677-09-21T00:12:43.145224', '1677-09-21T00:12:43.145225',
+                     '2262-04-11T23:47:16.854775', '2262-04-11T23:47:16.854776', 'NaT'], dtype='datetime64[us]')
+    risultato = date_ns(date)
+    assert risultato.dtype == np.dtype('datetime64[ns]')
+    assert np.isnat(risultato).tolist() == [True, False, False, True, True]
+    assert risultato[1] == date[1]
+    assert risultato[2] == date[2]
+
+
+# Numeri ai limiti degli intervalli (minimo incluso, massimo escluso) e dell'intervallo in
+# nanosecondi: l'ultimo seriale Excel rappresentabile è il 2262-04-11, i secondi e i millisecondi
+# oltre il 2262-04-11 23:47:16.854775807 non sono date
+LIMITI_NUMERICI = [
+    0, 0.5, 0.999999, 1, 1.5, 60, 61, 45000, 45000.25, 132320, 132320.5, 132321, 2958465, 2958465.999,
+    2958466, 2958466.5, 1700000000, 9223372036, 9223372036.5, 9223372037, 99999999999, 99999999999.5,
+    1e11, 1e11 + 1, 1700000000000, 9223372036854, 9223372036855, 1e14 - 1, 1e14,
+    -1, -86400, -1e12, float('nan'), float('inf'), float('-inf'),
+]
+
+
+def data_attesa(numero, intervalli=INTERVALLI_NUMERICI):
+    """Riferimento con l'aritmetica di datetime: il primo intervallo che contiene il numero, se la data sta in datetime64[ns]"""
+    if not math.isfinite(numero):
+        return None
+    for unita, origine, minimo, massimo in intervalli.values():
+        if minimo <= numero < massimo:
+            argomento = {'D': 'days', 's': 'seconds', 'ms': 'milliseconds'}[unita]
+            try:
+                data = datetime.fromisoformat(origine) + timedelta(**{argomento: numero})
+            except OverflowError:
+                return None
+            return data if pd.Timestamp.min <= data <= pd.Timestamp.max else None
+    return None
+
+
+def test_converti_numeri_ai_limiti():
+    date, tipi = converti_numeri(np.array(LIMITI_NUMERICI, dtype='float64'))
+    assert tipi == list(INTERVALLI_NUMERICI)
+    for numero, data in zip(LIMITI_NUMERICI, date):
+        attesa = data_attesa(numero)
+        assert (np.isnat(data) if attesa is None else data == np.datetime64(attesa, 'ns')), numero
+    assert data_attesa(132320.5) is not None and data_attesa(132321) is None
+    assert data_attesa(9223372036.5) is not None and data_attesa(9223372037) is None
+
+
+@pytest.mark.parametrize('nome_intervallo', [None, 'seriale Excel', 'UNIX secondi', 'UNIX millisecondi'])
+def test_converti_numeri_con_un_solo_intervallo(nome_intervallo):
+    intervalli = INTERVALLI_NUMERICI if nome_intervallo is None else {nome_intervallo: INTERVALLI_NUMERICI[nome_intervallo]}
+    date, tipi = converti_numeri(np.array(LIMITI_NUMERICI, dtype='float64'), intervalli)
+    assert tipi == list(intervalli)
+    assert [None if np.isnat(data) else data for data in date] == \
+        [None if data_attesa(numero, intervalli) is None else np.datetime64(data_attesa(numero, intervalli), 'ns')
+         for numero in LIMITI_NUMERICI]
+
+
+def test_date_plausibili_contate_per_intervallo():
+    numeri = [45000.0] * 3 + [1700000000.0] * 5 + [1700000000000.0] * 2 + [12.0, 1e15, float('nan')]
+    plausibili, conteggi = date_plausibili(np.array(numeri))
+    assert plausibili.tolist() == [True] * 10 + [False] * 3
+    assert conteggi == {'seriale Excel': 3, 'UNIX secondi': 5, 'UNIX millisecondi': 2}
+
+
+def test_rilevamento_formati_per_frequenza():
+    # Ogni formato e intervallo viene contato solo per i propri valori, così i più frequenti vengono prima
+    df = pd.DataFrame({
+        'Numeri': [45000, 1700000000, 1700000001, 1700000002, 'testo'],
+        'Data': [45000.0, 1700000000.0, 1700000001.0, 1700000002.0, np.nan],
+        'Testi': ['12/03/2024', '2024-03-12', '2024-03-13', '2024-03-14', 'Mar 5, 2021'],
+    })
+    rilevate = rileva_colonne_date(df)
+    assert rilevate['Numeri']['formati'] == ['UNIX secondi', 'seriale Excel']
+    assert rilevate['Data']['formati'] == ['UNIX secondi', 'seriale Excel']
+    assert rilevate['Testi']['formati'] == ['%Y-%m-%d', '%d/%m/%Y', '%b %d, %Y']
+
+
+@pytest.mark.parametrize('seme', [0, 1])
+def test_numeri_in_colonne_miste_come_normalizza_data(seme):
+    # Il sottoinsieme numerico di una colonna di oggetti (int, float, tipi numpy, NaN e infiniti
+    # tra testi, date e vuoti) e la stessa colonna come float64 danno le date di normalizza_data
+    casuale = random.Random(seme)
+    numeri = []
+    for numero in LIMITI_NUMERICI:
+        tipo = casuale.choice([int, float, np.float64, np.int64])
+        if tipo in (int, np.int64) and not float(numero).is_integer():
+            tipo = float
+        numeri.append(tipo(numero))
+    valori = numeri + ['12/03/2024', 'ciao', None, '45000', True, datetime(2020, 1, 5)]
+    casuale.shuffle(valori)
+
+    date, convertite, info = normalizza_colonna(pd.Series(valori, dtype=object))
+    for valore, data, convertita in zip(valori, date, convertite):
+        attesa = normalizza_data(valore)[1] if valore is not None else None
+        if attesa is None:
+            assert not convertita and pd.isna(data), valore
+        else:
+            assert convertita and data == pd.Timestamp(attesa), valore
+        if isinstance(valore, (int, float, np.number)) and not isinstance(valore, bool):
+            attesa_numero = data_attesa(float(valore))
+            assert (pd.isna(data) if attesa_numero is None else data == pd.Timestamp(attesa_numero)), valore
+    assert set(info['formati_inferiti']) >= set(INTERVALLI_NUMERICI)
+
+    float_numeri = pd.Series(numeri, dtype='float64')
+    date_float, convertite_float, _ = normalizza_colonna(float_numeri)
+    date_oggetti, convertite_oggetti, _ = normalizza_colonna(float_numeri.astype(object))
+    pd.testing.assert_series_equal(date_float, date_oggetti)
+    assert convertite_float.tolist() == convertite_oggetti.tolist()
+
+
+def test_booleani_non_condividono_la_data_dei_numeri():
+    # True == 1 e False == 0: né nella stessa colonna né attraverso cache_valori un booleano
+    # deve prendere la data del seriale Excel 1 (o cedergli la propria)
+    date, convertite, _ = normalizza_colonna(pd.Series([True, 1, False, 40000.0], dtype=object))
+    assert convertite.tolist() == [False, True, False, True]
+    assert date[1] == pd.Timestamp(1899, 12, 31)
+
+    cache_valori = {}
+    normalizza_colonna(pd.Series([1, 'x'], dtype=object), cache_valori)
+    _, convertite, _ = normalizza_colonna(pd.Series([True, 'x'], dtype=object), cache_valori)
+    assert not convertite.any()
+    cache_valori = {}
+    normalizza_colonna(pd.Series([True, 'y'], dtype=object), cache_valori)
+    _, convertite, _ = normalizza_colonna(pd.Series([1, 'y'], dtype=object), cache_valori)
+    assert convertite.tolist() == [True, False]
+
+
+def test_mappa_errori_bit_per_colonna():
+    # Più di 8 colonne: i bit occupano due byte per riga
+    casuale = np.random.default_rng(0)
+    maschere = {f"C{i}": casuale.random(50) < 0.2 for i in range(10)}
+    errori = MappaErrori.da_maschere(maschere, 50)
+    assert errori.bit.shape == (50, 2)
+    assert np.array_equal(errori.matrice(), np.column_stack(list(maschere.values())))
+    for colonna, maschera in maschere.items():
+        assert np.array_equal(errori.colonna(colonna), maschera)
+    assert np.array_equal(errori.righe_con_errori(), np.logical_or.reduce(list(maschere.values())))
+    assert np.array_equal(errori.righe_con_errori(['C1', 'C9']), maschere['C1'] | maschere['C9'])
+    assert errori.conteggi() == {colonna: int(maschera.sum()) for colonna, maschera in maschere.items()}
+    assert errori.colonne_con_errori() == [colonna for colonna, maschera in maschere.items() if maschera.any()]
+
+
+def test_mappa_errori_dopo_ordinamento():
+    # Le righe con errori stanno in mezzo al foglio; dopo l'ordinamento cronologico le posizioni
+    # usate per il file degli errori devono indicare ancora le righe originali
+    df = pd.DataFrame({
+        'Id': range(8),
+        'Data': ['2020-03-01', 'boh', '2020-01-01', '2020-02-01', None, '2019-12-31', 'xx', '2020-01-15'],
+        'Altra': ['01/01/2020', '01/01/2020', 'no', '01/01/2020', '01/01/2020', 'no', '01/01/2020', '01/01/2020'],
+    })
+    df_elaborato, _, _, errori = normalizza_dataframe(df, ['Data', 'Altra'], colonna_ordinamento='Data')
+
+    assert df_elaborato['Id'].tolist() == [5, 2, 7, 3, 0, 1, 4, 6]
+    assert errori.ordine.tolist() == df_elaborato['Id'].tolist()
+    assert np.flatnonzero(errori.colonna('Data')).tolist() == [1, 4, 6]
+    assert np.flatnonzero(errori.colonna('Altra')).tolist() == [2, 5]
+    # Le righe nel file degli errori seguono l'ordine del foglio elaborato
+    assert df_elaborato['Id'].iloc[errori.posizioni_elaborate()].tolist() == [5, 2, 1, 4, 6]
+    assert df_elaborato['Id'].iloc[errori.posizioni_elaborate(['Altra'])].tolist() == [5, 2]
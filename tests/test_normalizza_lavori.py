@@ -0,0 +1,129 @@
+"""Test dei lavori in background (normalizza_lavori): coda limitata, annullamento, stati"""
+import threading
+
+import pytest
+
+from normalizza_lavori import (
+    ANNULLATO, COMPLETATO, FALLITO, IN_CODA, IN_ESECUZIONE, GestoreLavori, Lavoro, ServerOccupato
+)
+
+ATTESA = 30
+
+
+@pytest.fixture
+def libera():
+    """Evento che sblocca tutti i lavori in attesa, impostato comunque alla fine del test"""
+    evento = threading.Event()
+    yield evento
+    evento.set()
+
+
+@pytest.fixture
+def gestore(libera):
+    gestore = GestoreLavori(lavori_simultanei=1, max_lavori_attivi=3, max_lavori_per_proprietario=1)
+    yield gestore
+    libera.set()
+    gestore.pool.shutdown(wait=True)
+
+
+def in_attesa(libera, partito=None):
+    """Lavoro che segnala la partenza e aspetta libera, controllando l'annullamento a ogni giro"""
+    def funzione(lavoro):
+        if partito is not None:
+            partito.set()
+        while not libera.wait(0.01):
+            lavoro.aggiorna('attesa', 0, 1)
+        return lavoro.descrizione
+    return funzione
+
+
+def avvia(gestore, libera, descrizione='in esecuzione', proprietario=None):
+    """Invia un lavoro e aspetta che sia partito, così i successivi restano in coda"""
+    partito = threading.Event()
+    lavoro = gestore.invia(in_attesa(libera, partito), descrizione, proprietario)
+    assert partito.wait(ATTESA)
+    return lavoro
+
+
+def test_completato(gestore, libera):
+    libera.set()
+    lavoro = gestore.invia(in_attesa(libera), 'veloce')
+    lavoro.futuro.result(ATTESA)
+    assert lavoro.stato == COMPLETATO
+    assert lavoro.risultato == 'veloce'
+    assert gestore.ottieni(lavoro.identificativo) is lavoro
+    gestore.ritira(lavoro.identificativo)
+    assert gestore.ottieni(lavoro.identificativo) is None
+
+
+def test_fallito_conserva_errore(gestore):
+    def fallisce(lavoro):
+        raise KeyError('colonna')
+    lavoro = gestore.invia(fallisce, 'errore')
+    lavoro.futuro.result(ATTESA)
+    assert lavoro.stato == FALLITO
+    assert isinstance(lavoro.errore, KeyError)
+
+
+def test_coda_piena(gestore, libera):
+    primo = avvia(gestore, libera)
+    in_coda = [gestore.invia(in_attesa(libera), f'in coda {numero}') for numero in range(2)]
+    assert primo.stato == IN_ESECUZIONE
+    assert [lavoro.stato for lavoro in in_coda] == [IN_CODA, IN_CODA]
+    assert [gestore.posizione_in_coda(lavoro) for lavoro in in_coda] == [0, 1]
+    with pytest.raises(ServerOccupato):
+        gestore.invia(in_attesa(libera), 'di troppo')
+
+    # Terminati i lavori attivi la coda si libera
+    libera.set()
+    for lavoro in [primo] + in_coda:
+        lavoro.futuro.result(ATTESA)
+    dopo = gestore.invia(in_attesa(libera), 'dopo')
+    dopo.futuro.result(ATTESA)
+    assert dopo.risultato == 'dopo'
+
+
+def test_annullamento_in_esecuzione(gestore, libera):
+    lavoro = avvia(gestore, libera)
+    lavoro.annulla()
+    lavoro.futuro.result(ATTESA)
+    assert lavoro.stato == ANNULLATO
+    assert lavoro.risultato is None
+
+
+def test_annullamento_in_coda(gestore, libera):
+    avvia(gestore, libera)
+    partito = threading.Event()
+    lavoro = gestore.invia(in_attesa(libera, partito), 'in coda')
+    lavoro.annulla()
+    assert lavoro.stato == ANNULLATO
+    assert lavoro.futuro.cancelled()
+    assert not partito.is_set()
+
+
+def test_nuovo_lavoro_annulla_il_precedente_dello_stesso_proprietario(gestore, libera):
+    vecchio = avvia(gestore, libera, 'vecchio', proprietario='sessione')
+    altro = gestore.invia(in_attesa(libera), 'altro', proprietario='altra sessione')
+    nuovo = gestore.invia(in_attesa(libera), 'nuovo', proprietario='sessione')
+
+    vecchio.futuro.result(ATTESA)
+    assert vecchio.stato == ANNULLATO
+    assert altro.attivo and nuovo.attivo
+    libera.set()
+    altro.futuro.result(ATTESA)
+    nuovo.futuro.result(ATTESA)
+    assert (altro.stato, nuovo.stato) == (COMPLETATO, COMPLETATO)
+    assert nuovo.risultato == 'nuovo'
+
+
+def test_frazione_con_fasi_previste():
+    lavoro = Lavoro('fasi')
+    assert lavoro.frazione() == 0.0
+    lavoro.prevedi(['lettura', 'conversione', 'export'])
+    lavoro.aggiorna('lettura', 1, 1)
+    lavoro.aggiorna('conversione', 5, 10, messaggio='Colonna Data')
+    assert lavoro.frazione() == pytest.approx(0.5)
+    assert lavoro.messaggio == 'Colonna Data'
+    # Le fasi senza elementi da elaborare contano come completate
+    lavoro.aggiorna('export', 0, 0)
+    assert lavoro.frazione() == pytest.approx(2.5 / 3)
@@ -0,0 +1,138 @@
+"""Test del servizio HTTP locale (normalizza_servizio), interamente offline su una porta libera"""
+import io
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+from normalizza_core import FOGLIO_TABELLA, normalizza_data
+from normalizza_servizio import ClientNormalizzazione, RaggruppatoreValori, chiudi_server, crea_server
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = crea_server(porta=0, processi=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    chiudi_server(server)
+    thread.join()
+
+
+@pytest.fixture
+def client(server):
+    return ClientNormalizzazione("http://%s:%d" % server.server_address[:2], timeout=120)
+
+
+def codice_risposta(server, percorso, corpo):
+    """Codice HTTP e messaggio di errore di una richiesta fatta senza il client"""
+    richiesta = urllib.request.Request("http://%s:%d%s" % (*server.server_address[:2], percorso), data=corpo)
+    try:
+        with urllib.request.urlopen(richiesta, timeout=120) as risposta:
+            return risposta.status, None
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())['errore']
+
+
+def excel(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def test_valori_come_normalizza_data(client):
+    valori = ['12/03/2024', '3 marzo 2024', 'giovedì 12 giugno 2025', 'Mar 5, 2021', '2024-02-30', 'ciao', '',
+              45000, 45000.5, 1700000000, 1700000000000, -5, None, True, False, '12/03/2024', 45000]
+    risultati = client.normalizza_valori(valori)
+
+    attesi = []
+    for valore in valori:
+        data = normalizza_data(valore)[1]
+        attesi.append(None if data is None else data.strftime('%Y-%m-%d'))
+    assert [risultato['data'] for risultato in risultati] == attesi
+    assert [risultato['valore'] for risultato in risultati] == valori
+    assert [risultato['convertita'] for risultato in risultati] == [data is not None for data in attesi]
+
+
+def test_valori_senza_intervalli_numerici(client):
+    risultati = client.normalizza_valori([45000, '12/03/2024'], numeri=[])
+    assert [risultato['data'] for risultato in risultati] == [None, '2024-03-12']
+
+
+def test_file_andata_e_ritorno(client):
+    df = pd.DataFrame({'Data': ['12/03/2024', '01/01/2020', 'ciao', '3 marzo 2024'], 'Importo': [1, 2, 3, 4]})
+    contenuto, statistiche = client.normalizza_file(excel(df), ['Data'], formato='aaaa-mm-gg')
+
+    assert statistiche['Sheet1']['Data']['convertiti'] == 3
+    assert statistiche['Sheet1']['Data']['totali'] == 4
+    normalizzato = pd.read_excel(io.BytesIO(contenuto))
+    # Ordinato per data, le date non convertite in fondo
+    assert normalizzato['Importo'].tolist() == [2, 4, 1, 3]
+    assert pd.to_datetime(normalizzato['Data'].iloc[:3]).dt.strftime('%Y-%m-%d').tolist() == \
+        ['2020-01-01', '2024-03-03', '2024-03-12']
+
+
+def test_file_intestazione_statistiche(server):
+    richiesta = urllib.request.Request("http://%s:%d/file?colonne=Data&formato_file=csv" % server.server_address[:2],
+                                       data="Data\n12/03/2024\nciao\n".encode())
+    with urllib.request.urlopen(richiesta, timeout=120) as risposta:
+        assert json.loads(risposta.headers['X-Statistiche'])[FOGLIO_TABELLA]['Data']['convertiti'] == 1
+        assert risposta.headers['X-Date-Convertite'] == '1'
+        assert risposta.headers['X-Date-Totali'] == '2'
+        assert risposta.headers['Content-Type'].startswith('text/csv')
+        assert pd.read_csv(io.BytesIO(risposta.read()))['Data'].tolist() == ['12-03-2024', 'ciao']
+
+
+@pytest.mark.parametrize('percorso, corpo', [
+    ('/valori', b'{non json'),
+    ('/valori', b'{"valori": "12/03/2024"}'),
+    ('/valori', b'{"valori": [["12/03/2024"]]}'),
+    ('/valori', b'{"valori": [1], "numeri": ["sconosciuto"]}'),
+    ('/file', b'contenuto'),
+    ('/file?colonne=Data&formato=mm-gg', b'contenuto'),
+    ('/file?colonne=Data', b''),
+])
+def test_richieste_non_valide(server, percorso, corpo):
+    assert codice_risposta(server, percorso, corpo)[0] == 400
+
+
+def test_file_non_valido(server):
+    df = pd.DataFrame({'Altro': ['12/03/2024']})
+    codice, errore = codice_risposta(server, '/file?colonne=Data', excel(df))
+    assert codice == 400
+    assert 'Data' in errore
+    codice, errore = codice_risposta(server, '/file?colonne=Data&foglio=Mancante', excel(df))
+    assert codice == 400
+    assert 'Mancante' in errore
+
+
+def test_errore_interno(server):
+    # Un .xlsx illeggibile non è un errore di validazione: il servizio risponde 500
+    assert codice_risposta(server, '/file?colonne=Data', b'PK non un archivio zip')[0] == 500
+
+
+def test_percorso_sconosciuto(server):
+    assert codice_risposta(server, '/sconosciuto', b'{}')[0] == 404
+
+
+def test_pool_ricreato_dopo_un_processo_terminato(server, client):
+    servizio = server.servizio
+    with pytest.raises(BrokenProcessPool):
+        servizio.invia(os._exit, 1).result()
+    assert client.normalizza_valori(['12/03/2024'])[0]['data'] == '2024-03-12'
+    assert client.stato()['pool_ricreati'] == 1
+
+
+def test_lotto_annullato():
+    futuro_lotto = Future()
+    futuro_lotto.cancel()
+    richieste = [(['12/03/2024'], Future()), ([45000, None], Future())]
+    RaggruppatoreValori.distribuisci(futuro_lotto, richieste)
+    for _, futuro in richieste:
+        assert isinstance(futuro.exception(timeout=0), RuntimeError)
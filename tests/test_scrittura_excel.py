@@ -0,0 +1,117 @@
+"""Test della scrittura diretta dei file Excel con xlsxwriter (scrivi_excel_normalizzato, seriali_excel)"""
+import io
+import re
+import zipfile
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+import normalizza_core
+from normalizza_core import FileNonValido, converti_numeri, scrivi_excel_normalizzato, seriali_excel
+
+
+def foglio(date, **altre):
+    """Foglio normalizzato: Data come testo in df_elaborato e come datetime64 in df_date"""
+    date = pd.Series(pd.to_datetime(date), dtype='datetime64[ns]')
+    testo = date.dt.strftime('%d/%m/%Y').where(date.notna(), 'non è una data')
+    return pd.DataFrame({'Data': testo, **altre}), pd.DataFrame({'Data': date})
+
+
+def formati_celle(contenuto):
+    """Numero dei formati di cella (cellXfs) nello styles.xml di un .xlsx"""
+    with zipfile.ZipFile(io.BytesIO(contenuto)) as archivio:
+        stili = archivio.read('xl/styles.xml').decode()
+    return int(re.search(r'<cellXfs count="(\d+)"', stili).group(1))
+
+
+@pytest.mark.parametrize('data, seriale', [
+    ('1900-01-01', 1),
+    ('1900-02-28', 59),
+    # Excel conta un 29/02/1900 inesistente: dal 01/03/1900 i seriali sono avanti di un giorno
+    ('1900-03-01', 61),
+    ('2023-03-15', 45000),
+    ('2023-03-15 12:00', 45000.5),
+])
+def test_seriali_excel(data, seriale):
+    assert seriali_excel(np.array([data], dtype='datetime64[ns]'))[0] == seriale
+
+
+def test_seriali_excel_andata_e_ritorno():
+    date = np.array(['1900-03-01', '1950-06-15T06:00', '2024-02-29', 'NaT'], dtype='datetime64[ns]')
+    seriali = seriali_excel(date)
+    assert np.isnan(seriali[-1])
+    # converti_numeri interpreta i seriali con l'origine 30/12/1899, che assorbe il giorno in più
+    riconvertite, _ = converti_numeri(seriali[:-1])
+    assert np.array_equal(riconvertite, date[:-1])
+
+
+def test_tipi_delle_celle():
+    df_elaborato, df_date = foglio(['2024-03-12', None],
+                                   Testo=['=SOMMA(A1:A2)', 'http://esempio.it'], Numero=[1.5, np.inf],
+                                   Misto=['a', 2], Intero=[1, 2])
+    buffer = io.BytesIO()
+    scrivi_excel_normalizzato(buffer, {'F': (df_elaborato, df_date)}, ['Data'])
+
+    risultato = pd.read_excel(io.BytesIO(buffer.getvalue()))
+    assert risultato['Data'].dtype.kind == 'M'
+    assert risultato['Data'].iloc[0] == pd.Timestamp('2024-03-12')
+    assert pd.isna(risultato['Data'].iloc[1])
+    assert risultato['Intero'].tolist() == [1, 2]
+    # Le formule e gli indirizzi restano testo, gli infiniti diventano 'inf' come con pandas
+    # (che rileggendo il file trasformerebbe di nuovo il testo in numero)
+    celle = openpyxl.load_workbook(io.BytesIO(buffer.getvalue()))['F']
+    valori = {colonna[0].value: [(cella.value, cella.data_type) for cella in colonna[1:]] for colonna in celle.iter_cols()}
+    assert valori['Testo'] == [('=SOMMA(A1:A2)', 's'), ('http://esempio.it', 's')]
+    assert valori['Numero'] == [(1.5, 'n'), ('inf', 's')]
+    assert valori['Misto'] == [('a', 's'), (2, 'n')]
+
+
+def test_formati_condivisi_tra_fogli():
+    contenuti = []
+    for numero_fogli in (1, 6):
+        fogli = {f'F{numero}': foglio(['2024-03-12', '2020-01-01'], Valore=[1, 2]) for numero in range(numero_fogli)}
+        buffer = io.BytesIO()
+        scrivi_excel_normalizzato(buffer, fogli, ['Data'], 'yyyy-mm-dd')
+        contenuti.append(buffer.getvalue())
+    assert formati_celle(contenuti[0]) == formati_celle(contenuti[1])
+
+
+def test_file_degli_errori_nella_stessa_passata():
+    fogli = {
+        'A': foglio(['2024-03-12', None, '2020-01-01', None], Id=[1, 2, 3, 4]),
+        'B': foglio(['2021-01-01'], Id=[5]),
+    }
+    errori = {'A': np.array([1, 3]), 'B': np.array([], dtype=int)}
+    normalizzato, file_errori = io.BytesIO(), io.BytesIO()
+    scrivi_excel_normalizzato(normalizzato, fogli, ['Data'], errori=errori, destinazione_errori=file_errori)
+
+    # Nel file degli errori i valori del foglio elaborato, solo per i fogli che hanno errori
+    fogli_errori = pd.read_excel(io.BytesIO(file_errori.getvalue()), sheet_name=None)
+    assert list(fogli_errori) == ['Errori_A']
+    atteso = fogli['A'][0].iloc[errori['A']].reset_index(drop=True)
+    pd.testing.assert_frame_equal(fogli_errori['Errori_A'], atteso)
+    assert list(pd.read_excel(io.BytesIO(normalizzato.getvalue()), sheet_name=None)) == ['A', 'B']
+
+
+def test_solo_il_file_degli_errori():
+    fogli = {'A': foglio(['2024-03-12', None], Id=[1, 2])}
+    file_errori = io.BytesIO()
+    scrivi_excel_normalizzato(None, fogli, ['Data'], errori={'A': np.array([1])}, destinazione_errori=file_errori)
+    assert pd.read_excel(io.BytesIO(file_errori.getvalue()))['Id'].tolist() == [2]
+
+
+def test_rilascia_fogli():
+    fogli = {'A': foglio(['2024-03-12'], Id=[1]), 'B': foglio(['2020-01-01'], Id=[2])}
+    buffer = io.BytesIO()
+    scrivi_excel_normalizzato(buffer, fogli, ['Data'], rilascia=True)
+    assert fogli == {}
+    assert list(pd.read_excel(io.BytesIO(buffer.getvalue()), sheet_name=None)) == ['A', 'B']
+
+
+def test_troppe_righe(monkeypatch):
+    monkeypatch.setattr(normalizza_core, 'MAX_RIGHE_EXCEL', 3)
+    fogli = {'Lungo': foglio(['2024-03-12', '2020-01-01', '2021-01-01'], Id=[1, 2, 3])}
+    with pytest.raises(FileNonValido, match='Lungo'):
+        scrivi_excel_normalizzato(io.BytesIO(), fogli, ['Data'])
@@ -0,0 +1,108 @@
+"""Test dell'unione dei fogli in un'unica sequenza cronologica (unisci_fogli_cronologici)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from normalizza_core import (
+    COLONNA_FOGLIO_ORIGINE, FOGLIO_CRONOLOGIA, fondi_sequenze_ordinate, normalizza_file, posizioni_unite,
+    unisci_fogli_cronologici
+)
+
+
+def foglio(date, **altre):
+    """Foglio già normalizzato: df_elaborato con le colonne indicate e df_date con la colonna Data"""
+    date = pd.Series(pd.to_datetime(date), dtype='datetime64[ns]')
+    return pd.DataFrame({'Data': date.dt.strftime('%d-%m-%Y'), **altre}), pd.DataFrame({'Data': date})
+
+
+def riferimento(fogli, colonne):
+    """Stesso ordine con sort_values: date e chiavi crescenti, mancanti in fondo, poi foglio e riga"""
+    parti = []
+    for numero, (nome, (df_elaborato, df_date)) in enumerate(fogli.items()):
+        parte = df_elaborato.assign(Data=df_date['Data'], _foglio=numero, _riga=np.arange(len(df_elaborato)))
+        parti.append(parte.assign(**{COLONNA_FOGLIO_ORIGINE: nome}))
+    unito = pd.concat(parti, ignore_index=True)
+    return unito.sort_values(colonne + ['_foglio', '_riga'], kind='stable', na_position='last')
+
+
+def test_fondi_sequenze_ordinate_stabile():
+    casuale = np.random.default_rng(0)
+    sequenze = [np.sort(casuale.integers(0, 20, size=n)) for n in (0, 7, 30, 1, 12)]
+    posizioni = fondi_sequenze_ordinate(sequenze)
+    assert np.array_equal(posizioni, np.argsort(np.concatenate(sequenze), kind='stable'))
+
+
+def test_ordine_per_data_e_chiavi_secondarie():
+    fogli = {
+        'A': foglio(['2020-01-02', '2020-01-01', None, '2020-01-02'], Cliente=['b', 'a', 'c', 'a'], Importo=[1, 2, 3, 4]),
+        'B': foglio(['2020-01-02', '2019-12-31', '2020-01-02'], Cliente=['a', None, 'b'], Importo=[5, 6, 7]),
+        'C': foglio(['2020-01-01'], Cliente=['a'], Importo=[8]),
+    }
+    df_unito, df_date_unito, ordine = unisci_fogli_cronologici(fogli, 'Data', ['Cliente'])
+    atteso = riferimento(fogli, ['Data', 'Cliente'])
+
+    assert df_unito.columns[0] == COLONNA_FOGLIO_ORIGINE
+    assert df_unito['Importo'].tolist() == atteso['Importo'].tolist()
+    assert df_unito[COLONNA_FOGLIO_ORIGINE].astype(str).tolist() == atteso[COLONNA_FOGLIO_ORIGINE].tolist()
+    assert df_date_unito['Data'].equals(atteso['Data'].reset_index(drop=True))
+    assert df_unito.index.equals(pd.RangeIndex(8))
+    # Le posizioni restituite ritrovano le righe nella concatenazione dei fogli
+    concatenati = pd.concat([df_elaborato for df_elaborato, _ in fogli.values()], ignore_index=True)
+    assert concatenati['Importo'].iloc[ordine].tolist() == df_unito['Importo'].tolist()
+
+
+def test_chiavi_secondarie_grandi_casuali():
+    casuale = np.random.default_rng(1)
+    fogli = {}
+    for nome, righe in (('A', 3000), ('B', 500), ('C', 2000)):
+        date = pd.Timestamp('2020-01-01') + pd.to_timedelta(casuale.integers(0, 30, size=righe), unit='D')
+        date = date.where(casuale.random(righe) > 0.05)
+        fogli[nome] = foglio(date, Codice=casuale.integers(0, 50, size=righe), Nota=casuale.choice(['x', 'y', None], size=righe),
+                             Importo=np.arange(righe))
+    df_unito, _, _ = unisci_fogli_cronologici(fogli, 'Data', ['Codice', 'Nota'])
+    atteso = riferimento(fogli, ['Data', 'Codice', 'Nota'])
+    assert df_unito[COLONNA_FOGLIO_ORIGINE].astype(str).tolist() == atteso[COLONNA_FOGLIO_ORIGINE].tolist()
+    assert df_unito['Importo'].tolist() == atteso['Importo'].tolist()
+
+
+def test_senza_colonna_di_ordinamento_fogli_accodati():
+    fogli = {'A': foglio(['2020-01-02', '2020-01-01'], N=[1, 2]), 'B': foglio(['2019-01-01'], N=[3])}
+    df_unito, _, _ = unisci_fogli_cronologici(fogli, None)
+    assert df_unito['N'].tolist() == [1, 2, 3]
+
+
+def test_colonna_di_ordinamento_per_foglio():
+    fogli = {'A': foglio(['2020-01-03', '2020-01-01'], N=[1, 2]), 'B': foglio(['2020-01-02'], N=[3])}
+    df_b, date_b = fogli['B']
+    fogli['B'] = (df_b.rename(columns={'Data': 'Altra'}), date_b.rename(columns={'Data': 'Altra'}))
+    df_unito, _, _ = unisci_fogli_cronologici(fogli, {'A': 'Data', 'B': 'Altra'})
+    assert df_unito['N'].tolist() == [2, 3, 1]
+
+
+def test_colonna_foglio_gia_presente():
+    with pytest.raises(ValueError):
+        unisci_fogli_cronologici({'A': foglio(['2020-01-01'], **{COLONNA_FOGLIO_ORIGINE: ['x']})}, 'Data')
+
+
+def test_posizioni_unite():
+    fogli = {'A': foglio(['2020-01-03', '2020-01-01']), 'B': foglio(['2020-01-02', None])}
+    _, df_date_unito, ordine = unisci_fogli_cronologici(fogli, 'Data')
+    # La seconda riga di B (senza data) è in fondo al foglio unito
+    assert posizioni_unite({'B': [1]}, {'A': 2, 'B': 2}, ordine).tolist() == [3]
+    assert posizioni_unite({'A': [0], 'B': [0]}, {'A': 2, 'B': 2}, ordine).tolist() == [1, 2]
+
+
+def test_normalizza_file_unisci_fogli(tmp_path):
+    percorso = tmp_path / "vendite.xlsx"
+    with pd.ExcelWriter(percorso) as scrittore:
+        pd.DataFrame({'Data': ['03/01/2020', '01/01/2020'], 'N': [1, 2]}).to_excel(scrittore, sheet_name='Gennaio', index=False)
+        pd.DataFrame({'Data': ['02/01/2020', 'n/d'], 'N': [3, 4]}).to_excel(scrittore, sheet_name='Febbraio', index=False)
+    output = tmp_path / "cronologia.xlsx"
+
+    normalizza_file(percorso, ['Data'], output, unisci_fogli=True)
+    letti = pd.read_excel(output, sheet_name=None)
+    assert list(letti) == [FOGLIO_CRONOLOGIA]
+    assert letti[FOGLIO_CRONOLOGIA]['N'].tolist() == [2, 3, 1, 4]
+
+    normalizza_file(percorso, ['Data'], output, ordina_date=False, unisci_fogli=True)
+    assert pd.read_excel(output)['N'].tolist() == [1, 2, 3, 4]